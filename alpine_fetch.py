@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import argparse
+import math
+import os
+import pwd
+import shutil
+import subprocess
+import sys
+import time
+
+# 预渲染的figlet横幅缓存，登录时直接读取，不再调用figlet
+CACHE_DIR = os.environ.get("INIT_SCRIPTS_CACHE_DIR", "/var/cache/init_scripts")
+BANNER_CACHE = os.path.join(CACHE_DIR, "alpine-fetch.banner")
+BANNER_TEXT = "Alpine Linux"
+
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"
+SEPARATOR = "\033[1;34m════════════════════════════════════════════════\033[0m"
+
+def read_file(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def read_meminfo():
+    """读取 /proc/meminfo，单位为字节"""
+    info = {}
+    for line in read_file("/proc/meminfo").splitlines():
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if fields:
+            info[key] = int(fields[0]) * 1024
+    return info
+
+def format_free_size(size):
+    """与 `free -h` 相同的格式：数值加单位不超过4个字符时保留一位小数"""
+    value = float(size)
+    for unit in "KMGTP":
+        value /= 1024
+        text = f"{value:.1f}{unit}"
+        if len(text) <= 4:
+            return f"{text}i"
+        text = f"{int(value)}{unit}"
+        if len(text) <= 4:
+            return f"{text}i"
+    return f"{int(value)}Pi"
+
+def format_df_size(size):
+    """与 `df -h` 相同的格式：向上取整，小于10时保留一位小数"""
+    if size < 1024:
+        return str(size)
+    value = float(size)
+    for unit in "KMGTPE":
+        value /= 1024
+        if value < 1024 or unit == "E":
+            break
+    tenths = math.ceil(value * 10) / 10
+    if tenths < 10:
+        return f"{tenths:.1f}{unit}"
+    return f"{math.ceil(value)}{unit}"
+
+def get_uptime():
+    """与 `uptime -p` 相同的格式（去掉前缀 up）"""
+    try:
+        seconds = int(float(read_file("/proc/uptime").split()[0]))
+    except (IndexError, ValueError):
+        return "unknown"
+
+    minutes_total = seconds // 60
+    years, rest = divmod(minutes_total, 60 * 24 * 365)
+    weeks, rest = divmod(rest, 60 * 24 * 7)
+    days, rest = divmod(rest, 60 * 24)
+    hours, minutes = divmod(rest, 60)
+
+    parts = []
+    for count, name in ((years, "year"), (weeks, "week"), (days, "day"), (hours, "hour")):
+        if count:
+            parts.append(f"{count} {name}{'s' if count != 1 else ''}")
+    if minutes or not parts:
+        parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    return ", ".join(parts)
+
+def get_memory():
+    info = read_meminfo()
+    total = info.get("MemTotal", 0)
+    if "MemAvailable" in info:
+        used = total - info["MemAvailable"]
+    else:
+        used = total - info.get("MemFree", 0) - info.get("Buffers", 0) - info.get("Cached", 0) - info.get("SReclaimable", 0)
+    return f"{format_free_size(used)}/{format_free_size(total)}"
+
+def get_disk():
+    try:
+        st = os.statvfs("/")
+    except OSError:
+        return "unknown"
+    size = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    return f"{format_df_size(used)}/{format_df_size(size)}"
+
+# ARM的 /proc/cpuinfo 只有 CPU implementer/CPU part 编号，与 lscpu 一样按下表换算为厂商和核心名称（只收录常见型号）
+ARM_IMPLEMENTERS = {
+    0x41: "ARM", 0x42: "Broadcom", 0x43: "Cavium", 0x46: "Fujitsu", 0x48: "HiSilicon",
+    0x4e: "NVIDIA", 0x51: "Qualcomm", 0x61: "Apple", 0x70: "Phytium", 0xc0: "Ampere",
+}
+ARM_PARTS = {
+    0x41: {
+        0xb76: "ARM1176", 0xc07: "Cortex-A7", 0xc08: "Cortex-A8", 0xc09: "Cortex-A9", 0xc0d: "Cortex-A12",
+        0xc0f: "Cortex-A15", 0xc0e: "Cortex-A17", 0xd01: "Cortex-A32", 0xd03: "Cortex-A53", 0xd04: "Cortex-A35",
+        0xd05: "Cortex-A55", 0xd07: "Cortex-A57", 0xd08: "Cortex-A72", 0xd09: "Cortex-A73", 0xd0a: "Cortex-A75",
+        0xd0b: "Cortex-A76", 0xd0c: "Neoverse-N1", 0xd0d: "Cortex-A77", 0xd40: "Neoverse-V1", 0xd41: "Cortex-A78",
+        0xd44: "Cortex-X1", 0xd46: "Cortex-A510", 0xd47: "Cortex-A710", 0xd48: "Cortex-X2", 0xd49: "Neoverse-N2",
+        0xd4d: "Cortex-A715", 0xd4e: "Cortex-X3", 0xd4f: "Neoverse-V2", 0xd80: "Cortex-A520", 0xd81: "Cortex-A720",
+        0xd82: "Cortex-X4",
+    },
+    0x43: {0x0a1: "ThunderX", 0x0af: "ThunderX2"},
+    0x46: {0x001: "A64FX"},
+    0x48: {0xd01: "TaiShan-v110", 0xd02: "TaiShan-v120"},
+    0x4e: {0x004: "Carmel"},
+    0x51: {0x800: "Kryo-2XX-Gold", 0x801: "Kryo-2XX-Silver", 0x802: "Kryo-3XX-Gold", 0x803: "Kryo-3XX-Silver",
+           0x804: "Kryo-4XX-Gold", 0x805: "Kryo-4XX-Silver", 0xc00: "Falkor"},
+    0x70: {0x660: "FTC660", 0x661: "FTC661", 0x662: "FTC662", 0x663: "FTC663", 0x664: "FTC664"},
+    0xc0: {0xac3: "Ampere-1", 0xac4: "Ampere-1a"},
+}
+
+def arm_core_names(cpuinfo):
+    """按出现顺序返回各类核心的名称，big.LITTLE 会有多个；编号不在表中时返回空列表"""
+    names = []
+    implementer = None
+    for line in cpuinfo.splitlines():
+        key, _, value = line.partition(":")
+        key = key.strip()
+        try:
+            if key == "CPU implementer":
+                implementer = int(value, 16)
+            elif key == "CPU part" and implementer is not None:
+                part = ARM_PARTS.get(implementer, {}).get(int(value, 16))
+                if not part:
+                    return []
+                name = f"{ARM_IMPLEMENTERS.get(implementer, '')} {part}".strip()
+                if name not in names:
+                    names.append(name)
+        except ValueError:
+            return []
+    return names
+
+def get_cpu():
+    """从 /proc/cpuinfo 读取CPU型号，ARM按 CPU implementer/part 换算核心名称，未知型号回退到 Hardware/Model 字段"""
+    cpuinfo = read_file("/proc/cpuinfo")
+    fields = {}
+    for line in cpuinfo.splitlines():
+        key, sep, value = line.partition(":")
+        key = key.strip()
+        if sep and key not in fields and value.strip():
+            fields[key] = value.strip()
+    cores = arm_core_names(cpuinfo) if "CPU implementer" in fields else []
+    # ARM内核的 model name 通常只是 "ARMv7 Processor rev 4 (v7l)"，核心名称更准确
+    cpu = (" + ".join(cores) or fields.get("model name") or fields.get("Hardware")
+           or fields.get("Model") or fields.get("cpu model", ""))
+    cpu = cpu.replace("(R)", "").replace("(TM)", "")
+    return " ".join(cpu.split())
+
+def get_user():
+    try:
+        return pwd.getpwuid(os.geteuid()).pw_name
+    except KeyError:
+        return str(os.geteuid())
+
+def read_banner():
+    banner = read_file(BANNER_CACHE)
+    if banner:
+        return banner
+    return f"\n\033[1;36m{BANNER_TEXT}\033[0m\n\n"
+
+def render_banner():
+    """安装时调用一次figlet生成横幅缓存"""
+    figlet = shutil.which("figlet")
+    if not figlet:
+        print("未找到figlet，登录时将使用纯文本横幅")
+        return False
+    result = subprocess.run([figlet, BANNER_TEXT], stdout=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print("figlet执行失败，登录时将使用纯文本横幅")
+        return False
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{BANNER_CACHE}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(result.stdout)
+    os.replace(tmp_path, BANNER_CACHE)
+    print(f"横幅已缓存: {BANNER_CACHE}")
+    return True
+
+def build_output():
+    uname = os.uname()
+    rows = [
+        ("Hostname", uname.nodename),
+        ("Kernel", uname.release),
+        ("Uptime", get_uptime()),
+        ("Memory", get_memory()),
+        ("Disk Usage", get_disk()),
+        ("CPU", get_cpu()),
+        ("User", get_user()),
+        ("Shell", os.path.basename(os.environ.get("SHELL", ""))),
+        ("Time", time.strftime("%Y-%m-%d %H:%M:%S")),
+    ]
+
+    lines = [
+        SEPARATOR,
+        "\033[1;32m    🌐  System Information\033[0m",
+        SEPARATOR,
+        "\n",
+    ]
+    for label, value in rows:
+        lines.append(f"\033[1;33m{label}: \033[1;37m{value}")
+    lines += [
+        "\n",
+        SEPARATOR,
+        "\033[1;33m🌱 Enjoy your terminal session! 🌱\033[0m",
+        SEPARATOR,
+    ]
+    return CLEAR_SCREEN + read_banner() + "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Alpine系统信息展示（单进程版本）")
+    parser.add_argument("--render-banner", action="store_true", help="调用figlet生成横幅缓存（安装时执行一次）")
+    args = parser.parse_args()
+
+    if args.render_banner:
+        sys.exit(0 if render_banner() else 1)
+
+    sys.stdout.write(build_output())
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import os
-import subprocess
-import shlex
 import sys
 import json
 import re
 import time
+import argparse
 from datetime import datetime
 
+import runcmd
+import toolreg
+import tracing
+
 # 颜色代码
 COLOR_RED = "\033[1;31m"
 COLOR_GREEN = "\033[1;32m"
@@ -16,48 +19,46 @@ COLOR_BLUE = "\033[1;34m"
 COLOR_CYAN = "\033[1;36m"
 COLOR_RESET = "\033[0m"
 
-def run_command(cmd, capture=False, check=False, exit_on_fail=False, verbose=True):
-    """执行系统命令并返回结果"""
+# 单条命令的超时时间（秒），容器卡死时docker命令可能一直不返回
+COMMAND_TIMEOUT = 120
+
+# 清理过程的日志文件，设置后每条命令及其输出都会写入
+log_file = None
+
+def run_command(*cmds, capture=False, check=False, verbose=True, timeout=COMMAND_TIMEOUT):
+    """执行系统命令并返回结果，传入多条命令时组成管道；check 为True时失败抛出 runcmd.CommandError"""
     if verbose:
-        print(f"{COLOR_BLUE}[+] Executing: {cmd}{COLOR_RESET}")
-    
-    try:
-        if capture:
-            result = subprocess.run(
-                shlex.split(cmd),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            if result.returncode != 0:
-                if verbose: print(f"{COLOR_RED}[!] Command failed (code {result.returncode}): {result.stderr.strip()}{COLOR_RESET}")
-                if exit_on_fail:
-                    sys.exit(1)
-            return result
-        else:
-            result = subprocess.run(
-                shlex.split(cmd),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            if result.returncode != 0 and verbose:
-                print(f"{COLOR_RED}[!] Command failed (code {result.returncode}): {result.stderr.strip()}{COLOR_RESET}")
-            return result
-    except Exception as e:
-        if verbose: print(f"{COLOR_RED}[!] Command execution error: {str(e)}{COLOR_RESET}")
-        if exit_on_fail:
-            sys.exit(1)
-        return None
+        print(f"{COLOR_BLUE}[+] Executing: {runcmd.format_command([runcmd.split(cmd) for cmd in cmds])}{COLOR_RESET}")
+
+    result = runcmd.run(*cmds, capture=capture, echo=verbose and not capture, timeout=timeout)
+    if log_file:
+        with open(log_file, "a") as log:
+            log.write(f"$ {result.args}\n{result.stdout}{result.stderr}")
+            log.write(f"[exit {result.returncode}{', timed out' if result.timed_out else ''}, {result.duration:.2f}s]\n")
+    if verbose:
+        if result.timed_out:
+            print(f"{COLOR_RED}[!] Command timed out after {timeout}s{COLOR_RESET}")
+        elif result.returncode != 0:
+            print(f"{COLOR_RED}[!] Command failed (code {result.returncode}): {result.stderr.strip()}{COLOR_RESET}")
+    if check:
+        result.check_returncode()
+    return result
+
+def filter_iptables(pattern):
+    """删除包含 pattern 的iptables规则：iptables-save | grep -v pattern | iptables-restore"""
+    saved = run_command("iptables-save", capture=True, verbose=False)
+    if saved.returncode != 0 or pattern not in saved.stdout:
+        return False
+    result = run_command("iptables-save", ["grep", "-v", pattern], "iptables-restore", verbose=False)
+    return result.returncode == 0
 
 def get_container_info(container_id):
     """获取容器详细信息"""
-    cmd = f"docker inspect {container_id}"
-    result = run_command(cmd, capture=True, exit_on_fail=True, verbose=False)
-    
-    if not result or result.returncode != 0:
+    try:
+        result = run_command(["docker", "inspect", container_id], capture=True, check=True, verbose=False)
+    except runcmd.CommandError as e:
         print(f"{COLOR_RED}[!] Failed to inspect container {container_id}{COLOR_RESET}")
-        print(f"Error: {result.stderr.strip() if result else 'Unknown error'}")
+        print(f"Error: {e.stderr.strip() if e.stderr else e}")
         return None
     
     try:
@@ -75,18 +76,16 @@ def kill_container_processes(container_info):
     container_id = container_info.get('Id', '')
     print(f"{COLOR_YELLOW}[+] Killing processes for container: {container_id[:12]}{COLOR_RESET}")
     
-    # 方法1：通过容器ID查找进程
-    cmd = f"ps aux | grep '{container_id}' | grep -v grep | awk '{{print $2}}'"
-    result = run_command(cmd, capture=True)
+    # 方法1：通过容器ID查找进程（pgrep -f 匹配完整命令行）
+    result = run_command(["pgrep", "-f", container_id], capture=True)
     pids = []
-    if result and result.stdout:
+    if result.stdout:
         pids = [pid.strip() for pid in result.stdout.splitlines() if pid.strip()]
     
     # 方法2：查找所有docker-containerd-shim进程
     if not pids:
-        cmd = "pgrep -f 'docker-containerd-shim'"
-        result = run_command(cmd, capture=True)
-        if result and result.stdout:
+        result = run_command(["pgrep", "-f", "docker-containerd-shim"], capture=True)
+        if result.stdout:
             all_shim_pids = result.stdout.splitlines()
             print(f"{COLOR_YELLOW}[+] Found {len(all_shim_pids)} containerd-shim processes{COLOR_RESET}")
             
@@ -96,15 +95,18 @@ def kill_container_processes(container_info):
                 if not pid:
                     continue
                 
-                cmd = f"cat /proc/{pid}/cmdline | grep -a '{container_id}'"
-                grep_result = run_command(cmd, capture=True)
-                if grep_result and grep_result.stdout:
+                try:
+                    with open(f"/proc/{pid}/cmdline", "rb") as f:
+                        cmdline = f.read()
+                except OSError:
+                    continue
+                if container_id.encode() in cmdline:
                     pids.append(pid)
     
     # 杀死找到的进程
     if pids:
         pid_list = " ".join(pids)
-        run_command(f"kill -9 {pid_list}")
+        run_command(["kill", "-9"] + pids)
         print(f"{COLOR_GREEN}[+] Killed {len(pids)} processes: {pid_list}{COLOR_RESET}")
         return True
     else:
@@ -129,7 +131,7 @@ def cleanup_mounts(container_info):
     cleaned = False
     for mp in mount_points:
         if os.path.exists(mp):
-            run_command(f"umount -f {mp} 2>/dev/null", verbose=False)
+            run_command(["umount", "-f", mp], verbose=False)
             cleaned = True
             print(f"{COLOR_GREEN}[+] Unmounted: {mp}{COLOR_RESET}")
     
@@ -158,14 +160,14 @@ def cleanup_network(container_info):
     # 删除网络命名空间
     netns_path = f"/var/run/netns/{netns_id}"
     if os.path.exists(netns_path):
-        run_command(f"ip netns del {netns_id}")
+        run_command(["ip", "netns", "del", netns_id])
         print(f"{COLOR_GREEN}[+] Removed network namespace{COLOR_RESET}")
     else:
         print(f"{COLOR_YELLOW}[!] Network namespace not found at {netns_path}{COLOR_RESET}")
     
     # 清理iptables规则 - 更安全的方法
     print(f"{COLOR_YELLOW}[+] Cleaning up iptables rules{COLOR_RESET}")
-    run_command("iptables-save | grep -v surgio | iptables-restore", exit_on_fail=False, verbose=False)
+    filter_iptables("surgio")
     
     return True
 
@@ -182,7 +184,7 @@ def remove_container_files(container_info):
     
     # 递归删除容器文件
     if os.path.exists(container_path):
-        run_command(f"rm -rf {container_path}")
+        run_command(["rm", "-rf", container_path])
         print(f"{COLOR_GREEN}[+] Removed container files at {container_path}{COLOR_RESET}")
         return True
     else:
@@ -197,8 +199,8 @@ def restart_docker():
     run_command("systemctl stop docker", verbose=False)
     
     # 清理残留进程
-    run_command("pkill -9 docker-containerd-shim", exit_on_fail=False, verbose=False)
-    run_command("pkill -9 dockerd", exit_on_fail=False, verbose=False)
+    run_command("pkill -9 docker-containerd-shim", verbose=False)
+    run_command("pkill -9 dockerd", verbose=False)
     
     # 确保进程被杀死
     time.sleep(2)
@@ -208,13 +210,12 @@ def restart_docker():
     
     # 检查Docker状态
     status_result = run_command("systemctl status docker --no-pager", capture=True, verbose=False)
-    if status_result and "active (running)" in status_result.stdout:
+    if "active (running)" in status_result.stdout:
         print(f"{COLOR_GREEN}[+] Docker restarted successfully{COLOR_RESET}")
         return True
     else:
         print(f"{COLOR_RED}[!] Docker failed to start{COLOR_RESET}")
-        if status_result:
-            print(status_result.stdout)
+        print(status_result.stdout)
         return False
 
 def cleanup_network_resources():
@@ -222,13 +223,14 @@ def cleanup_network_resources():
     print(f"{COLOR_YELLOW}[+] Cleaning up network resources{COLOR_RESET}")
     
     # 清理docker网络
-    run_command("docker network rm surgio_default", exit_on_fail=False, verbose=False)
-    
+    run_command("docker network rm surgio_default", verbose=False)
+
     # 清理残留网络
-    run_command("docker network prune -f", exit_on_fail=False, verbose=False)
-    
-    # 清理iptables规则再次确认
-    run_command("iptables-save | grep -v docker | iptables-restore", exit_on_fail=False, verbose=False)
+    run_command("docker network prune -f", verbose=False)
+
+    # 清理iptables规则再次确认；Docker刚重启并重建了自己的规则，
+    # 过滤所有包含docker的规则会删掉docker0的转发和NAT规则，这里只清理残留的surgio规则
+    filter_iptables("surgio")
     
     return True
 
@@ -237,8 +239,8 @@ def check_docker_service():
     print(f"{COLOR_YELLOW}[+] Checking Docker service status{COLOR_RESET}")
     
     # 检查Docker是否安装
-    result = run_command("which docker", capture=True)
-    if not result.stdout.strip():
+    docker_path = toolreg.get_registry().lookup("docker")
+    if not docker_path:
         print(f"{COLOR_RED}[!] Docker is not installed{COLOR_RESET}")
         return False
     
@@ -268,6 +270,14 @@ def list_all_containers():
     return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Docker Container Force Cleanup Tool")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached tool registry and re-probe tool paths")
+    parser.add_argument("--trace", metavar="DIR", nargs="?", const="",
+                        help="Record every step and command as a span (JSONL + Chrome trace), default dir /var/log/init_scripts/trace")
+    args = parser.parse_args()
+    toolreg.get_registry(refresh=args.refresh)
+    tracing.configure(args.trace, "docker_force_clean")
+
     # 检查root权限
     if os.geteuid() != 0:
         print(f"{COLOR_RED}[!] This script must be run as root{COLOR_RESET}")
@@ -325,6 +335,7 @@ def main():
         sys.exit(0)
     
     # 创建日志文件
+    global log_file
     log_file = f"/var/log/docker_force_clean_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
     print(f"{COLOR_YELLOW}[+] Logging to: {log_file}{COLOR_RESET}")
     
@@ -332,13 +343,13 @@ def main():
     print(f"\n{COLOR_RED}=== Starting Force Removal Procedure ==={COLOR_RESET}")
     
     steps = [
-        ("Trying regular docker removal", lambda: run_command(f"docker rm -f {container_id}")),
+        ("Trying regular docker removal", lambda: run_command(["docker", "rm", "-f", container_id])),
         ("Force killing container processes", lambda: kill_container_processes(container_info)),
         ("Cleaning up mounts", lambda: cleanup_mounts(container_info)),
         ("Cleaning up network namespace", lambda: cleanup_network(container_info)),
         ("Removing container files", lambda: remove_container_files(container_info)),
         ("Restarting Docker service", restart_docker),
-        ("Final removal attempt", lambda: run_command(f"docker rm -f {container_id}", exit_on_fail=False)),
+        ("Final removal attempt", lambda: run_command(["docker", "rm", "-f", container_id])),
         ("Cleaning up network resources", cleanup_network_resources)
     ]
     
@@ -347,13 +358,20 @@ def main():
         with open(log_file, "a") as log:
             log.write(f"\n\n=== Step {i}: {desc} ===\n")
         
+        step_start = time.monotonic()
         try:
-            result = action()
-            status = "SUCCESS" if result or result is None else "FAILED"
+            with tracing.span(desc, step=i) as span:
+                result = action()
+                status = "SUCCESS" if result or result is None else "FAILED"
+                if status == "FAILED":
+                    span.fail()
             color = COLOR_GREEN if status == "SUCCESS" else COLOR_RED
             print(f"{color}[+] Step {i}: {status}{COLOR_RESET}")
         except Exception as e:
+            status = f"ERROR ({e})"
             print(f"{COLOR_RED}[!] Step {i} failed: {str(e)}{COLOR_RESET}")
+        with open(log_file, "a") as log:
+            log.write(f"=== Step {i}: {status} in {time.monotonic() - step_start:.2f}s ===\n")
     
     print(f"\n{COLOR_GREEN}=== Cleanup completed successfully! ==={COLOR_RESET}")
     print(f"{COLOR_CYAN}Log file saved to: {log_file}{COLOR_RESET}")
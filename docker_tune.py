@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+import runcmd
+import toolreg
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+# 命令超时时间（秒），dockerd 卡死时 docker info 不会一直阻塞
+COMMAND_TIMEOUT = 60
+# 重启时要等待正在运行的容器停止
+RESTART_TIMEOUT = 300
+
+DAEMON_JSON = "/etc/docker/daemon.json"
+DEFAULT_DATA_ROOT = "/var/lib/docker"
+# 逗号分隔的镜像加速地址，也可通过 --registry-mirror 指定
+MIRRORS_ENV = "INIT_DOCKER_MIRRORS"
+
+# 可以通过 SIGHUP 重新加载的配置项，其余配置项（日志、存储驱动）需要重启dockerd
+RELOADABLE = {
+    "live-restore", "max-concurrent-downloads", "max-concurrent-uploads", "max-download-attempts",
+    "registry-mirrors", "insecure-registries", "debug", "labels", "shutdown-timeout",
+}
+
+def run(cmd, timeout=COMMAND_TIMEOUT):
+    """执行命令，标准错误追加到输出之后"""
+    result = runcmd.run(cmd, capture=True, timeout=timeout)
+    result.stdout += result.stderr
+    return result
+
+def load_config(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def docker_info():
+    """正在运行的dockerd的信息，未运行时返回None"""
+    docker = toolreg.get_registry().lookup("docker")
+    if not docker:
+        return None
+    result = run([docker, "info", "--format", "{{json .}}"])
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return None
+
+# ==================== overlay2 检查 ====================
+
+def overlay_supported():
+    with open("/proc/filesystems", "r") as f:
+        if "overlay" in f.read():
+            return True
+    return run(["modprobe", "overlay"]).returncode == 0
+
+def backing_filesystem(path):
+    """返回 (文件系统类型, 挂载点)，目录不存在时检查上级目录"""
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    path = os.path.realpath(path)
+    best = ("", "/")
+    with open("/proc/mounts", "r") as f:
+        for line in f:
+            fields = line.split()
+            mount_point, fs_type = fields[1], fields[2]
+            if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) >= len(best[1]):
+                best = (fs_type, mount_point)
+    return best
+
+def check_overlay2(data_root, info):
+    """返回 (是否设置overlay2, 说明)"""
+    if not overlay_supported():
+        return False, "内核不支持overlay文件系统"
+    fs_type, mount_point = backing_filesystem(data_root)
+    if fs_type == "xfs":
+        # xfs 必须以 ftype=1 格式化，否则overlay2会出现文件丢失
+        xfs_info = toolreg.get_registry().lookup("xfs_info", version_args=("-V",))
+        result = run([xfs_info, mount_point]) if xfs_info else None
+        if result is None or not re.search(r"ftype=1", result.stdout):
+            return False, f"{mount_point} 为xfs但不是 ftype=1"
+    elif fs_type not in ("ext4", "xfs", "btrfs", ""):
+        print(f"{COLOR_YELLOW}[提示] {data_root} 位于 {fs_type}，overlay2 官方只支持ext4/xfs{COLOR_RESET}")
+
+    current = info.get("Driver") if info else None
+    if current and current != "overlay2" and info.get("Images", 0):
+        # 切换存储驱动后已有的镜像和容器不可见
+        return False, f"当前存储驱动为 {current} 且已有 {info['Images']} 个镜像，未切换（使用 --force-storage 强制切换）"
+    return True, f"{data_root} 位于 {fs_type or '未知'}，使用overlay2"
+
+# ==================== 生成配置 ====================
+
+def swarm_active(info, data_root):
+    """dockerd运行时读取 docker info；未运行时读取 swarm/state.json，节点加入swarm后该文件记录了集群成员信息
+
+    无法读取时返回None
+    """
+    if info:
+        return info.get("Swarm", {}).get("LocalNodeState") == "active"
+    try:
+        with open(os.path.join(data_root, "swarm", "state.json"), "r") as f:
+            return bool(json.load(f))
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return None
+
+def build_config(existing, args, info):
+    """在现有配置基础上合并调优项，返回 (新配置, 提示信息)"""
+    config = dict(existing)
+    notes = []
+
+    config["log-driver"] = existing.get("log-driver", "json-file")
+    if config["log-driver"] in ("json-file", "local"):
+        log_opts = dict(existing.get("log-opts", {}))
+        log_opts.update({"max-size": args.log_max_size, "max-file": str(args.log_max_file)})
+        config["log-opts"] = log_opts
+    else:
+        notes.append(f"日志驱动为 {config['log-driver']}，不设置日志轮转")
+
+    # live-restore 与swarm模式不兼容，dockerd会拒绝启动
+    data_root = existing.get("data-root", DEFAULT_DATA_ROOT)
+    swarm = swarm_active(info, data_root)
+    if swarm:
+        notes.append("节点处于swarm模式，不启用live-restore")
+    elif swarm is None:
+        # 无法判断时不启用，避免dockerd拒绝启动
+        notes.append("dockerd未运行且无法读取swarm状态，不启用live-restore")
+    else:
+        config["live-restore"] = True
+
+    config["max-concurrent-downloads"] = args.max_downloads
+    config["max-concurrent-uploads"] = args.max_uploads
+
+    mirrors = list(args.registry_mirror)
+    mirrors += [m.strip() for m in os.environ.get(MIRRORS_ENV, "").split(",") if m.strip()]
+    if mirrors:
+        # 新地址优先，保留已有的镜像加速地址
+        config["registry-mirrors"] = list(dict.fromkeys(mirrors + existing.get("registry-mirrors", [])))
+
+    use_overlay2, note = check_overlay2(data_root, None if args.force_storage else info)
+    notes.append(note)
+    if use_overlay2:
+        config["storage-driver"] = "overlay2"
+        # storage-opts 中的 overlay2.override_kernel_check 等旧选项在新版本中会导致启动失败
+        if "storage-opts" in config:
+            config["storage-opts"] = [o for o in config["storage-opts"] if "override_kernel_check" not in o]
+            if not config["storage-opts"]:
+                del config["storage-opts"]
+    return config, notes
+
+def validate(config):
+    """使用 dockerd --validate 校验配置，旧版本dockerd不支持时只做JSON校验"""
+    dockerd = toolreg.get_registry().lookup("dockerd")
+    if not dockerd:
+        return True, "未找到dockerd，跳过校验"
+    fd, path = tempfile.mkstemp(prefix="daemon-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config, f, indent=2)
+        result = run([dockerd, "--validate", "--config-file", path])
+        if result.returncode != 0 and "unknown flag: --validate" in result.stdout:
+            return True, "dockerd 版本过旧，不支持 --validate，跳过校验"
+        return result.returncode == 0, result.stdout.strip()
+    finally:
+        os.remove(path)
+
+def write_config(config):
+    os.makedirs(os.path.dirname(DAEMON_JSON), exist_ok=True)
+    if os.path.exists(DAEMON_JSON):
+        shutil.copy2(DAEMON_JSON, f"{DAEMON_JSON}.bak")
+    tmp_path = f"{DAEMON_JSON}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, DAEMON_JSON)
+
+def apply_changes(changed, info, allow_restart):
+    """能热加载的配置通过reload生效；其余配置在没有运行中的容器、live-restore已生效或明确允许时重启"""
+    if not info:
+        print("Docker未运行，配置将在下次启动时生效")
+        return True
+    if not changed:
+        return True
+    if set(changed) <= RELOADABLE:
+        result = run(["systemctl", "reload", "docker"])
+        if result.returncode != 0:
+            result = run(["pkill", "-HUP", "-x", "dockerd"])
+        print(f"{COLOR_GREEN}已重新加载dockerd配置{COLOR_RESET}" if result.returncode == 0
+              else f"{COLOR_RED}[!] 重新加载失败: {result.stdout.strip()}{COLOR_RESET}")
+        return result.returncode == 0
+
+    pending = sorted(set(changed) - RELOADABLE)
+    # 刚安装的Docker没有容器，重启不影响任何业务
+    idle = info.get("ContainersRunning", 1) == 0
+    if idle or info.get("LiveRestoreEnabled") or allow_restart:
+        if not idle and not info.get("LiveRestoreEnabled"):
+            print(f"{COLOR_YELLOW}[提示] live-restore尚未生效，重启会停止正在运行的容器{COLOR_RESET}")
+        result = run(["systemctl", "restart", "docker"], timeout=RESTART_TIMEOUT)
+        print(f"{COLOR_GREEN}已重启dockerd{COLOR_RESET}" if result.returncode == 0
+              else f"{COLOR_RED}[!] 重启失败: {result.stdout.strip()}{COLOR_RESET}")
+        return result.returncode == 0
+
+    # 先热加载使live-restore生效，下次重启时容器不会被停止
+    run(["systemctl", "reload", "docker"])
+    print(f"{COLOR_YELLOW}[提示] {', '.join(pending)} 需要重启dockerd才能生效。"
+          f"live-restore已热加载，之后可安全执行 systemctl restart docker{COLOR_RESET}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="生成并合并 /etc/docker/daemon.json：日志轮转、live-restore、存储驱动、并发和镜像加速")
+    parser.add_argument("--log-max-size", default="100m", help="单个容器日志文件大小上限 (默认: 100m)")
+    parser.add_argument("--log-max-file", type=int, default=3, help="保留的日志文件个数 (默认: 3)")
+    parser.add_argument("--max-downloads", type=int, default=10, help="并发下载层数 (默认: 10)")
+    parser.add_argument("--max-uploads", type=int, default=5, help="并发上传层数 (默认: 5)")
+    parser.add_argument("--registry-mirror", action="append", default=[],
+                        help=f"镜像加速地址，可多次指定（也可通过 ${MIRRORS_ENV} 指定）")
+    parser.add_argument("--force-storage", action="store_true", help="已有镜像时也切换到overlay2")
+    parser.add_argument("--restart", action="store_true", help="需要时允许重启dockerd（live-restore未生效时会停止容器）")
+    parser.add_argument("--dry-run", action="store_true", help="只显示合并后的配置，不写入")
+    parser.add_argument("--refresh", action="store_true", help="忽略工具注册表缓存，重新探测")
+    args = parser.parse_args()
+
+    toolreg.get_registry(refresh=args.refresh)
+    try:
+        existing = load_config(DAEMON_JSON)
+    except ValueError as e:
+        print(f"{COLOR_RED}[!] {DAEMON_JSON} 不是合法的JSON: {e}{COLOR_RESET}")
+        sys.exit(1)
+
+    info = docker_info()
+    config, notes = build_config(existing, args, info)
+    for note in notes:
+        print(f"{COLOR_CYAN}[*] {note}{COLOR_RESET}")
+
+    changed = [key for key in sorted(set(config) | set(existing)) if config.get(key) != existing.get(key)]
+    print(json.dumps(config, indent=2, ensure_ascii=False))
+    if not changed:
+        print(f"{COLOR_GREEN}daemon.json 无需修改{COLOR_RESET}")
+        return
+    print(f"变更的配置项: {', '.join(changed)}")
+
+    ok, message = validate(config)
+    if message:
+        print(message)
+    if not ok:
+        print(f"{COLOR_RED}[!] 配置校验失败，未写入{COLOR_RESET}")
+        sys.exit(1)
+    if args.dry_run:
+        return
+
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 请使用root用户运行{COLOR_RESET}")
+        sys.exit(1)
+    write_config(config)
+    print(f"{COLOR_GREEN}已写入 {DAEMON_JSON}（原文件备份为 daemon.json.bak）{COLOR_RESET}")
+    sys.exit(0 if apply_changes(changed, info, args.restart) else 1)
+
+if __name__ == "__main__":
+    main()
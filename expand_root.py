@@ -1,22 +1,27 @@
 #!/usr/bin/env python3
 import os
-import subprocess
 import re
 import sys
+import argparse
 
-def run_cmd(cmd):
-    try:
-        result = subprocess.run(
-            cmd.split(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            text=True
-        )
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"命令执行失败: {e.stderr}")
+import runcmd
+import toolreg
+import tracing
+
+# 单条命令的超时时间（秒），扩容大文件系统时 resize2fs 可能耗时较长
+CMD_TIMEOUT = 1800
+
+def run_cmd(*cmds):
+    """执行命令并返回输出，传入多条命令时组成管道；失败时抛出 runcmd.CommandError"""
+    return runcmd.run(*cmds, capture=True, check=True, timeout=CMD_TIMEOUT).stdout.strip()
+
+def require_tool(name):
+    """通过工具注册表获取命令的绝对路径，缺失时退出"""
+    path = toolreg.get_registry().lookup(name, version_args=None)
+    if not path:
+        print(f"缺少必要命令: {name}，请先安装后重试")
         sys.exit(1)
+    return path
 
 def get_root_device():
     """获取根分区设备路径"""
@@ -35,7 +40,7 @@ def check_lvm(device):
 
 def get_unallocated_space(disk):
     """获取未分配空间大小（GB）"""
-    parted_output = run_cmd(f"parted -s {disk} unit GB print free")
+    parted_output = run_cmd(f"{require_tool('parted')} -s {disk} unit GB print free")
     free_lines = [line for line in parted_output.split('\n') if "Free Space" in line]
     
     if not free_lines:
@@ -51,34 +56,35 @@ def expand_root_lvm():
     """扩展LVM根分区"""
     print("检测到LVM系统，开始扩展...")
     
-    # 获取物理卷信息
-    pvs_output = run_cmd("pvs --noheadings -o pv_name")
-    pv_device = pvs_output.split()[0]
-    
-    # 获取卷组名
-    vg_name = run_cmd("vgs --noheadings -o vg_name | head -n1").strip()
-    
-    # 获取逻辑卷路径
-    lv_path = run_cmd("lvs --noheadings -o lv_path | grep root | head -n1").strip()
-    
+    # 物理卷、卷组和逻辑卷信息互不依赖，同时查询
+    pvs, vgs, lvs = runcmd.run_many([
+        "pvs --noheadings -o pv_name",
+        "vgs --noheadings -o vg_name",
+        "lvs --noheadings -o lv_path",
+    ], capture=True, check=True, timeout=CMD_TIMEOUT)
+    pv_device = next(iter(pvs.stdout.split()), "")
+    vg_name = next(iter(vgs.stdout.split()), "")
+    # 名称中包含root的第一个逻辑卷
+    lv_path = next((path for path in lvs.stdout.split() if "root" in path), "")
+
     if not all([pv_device, vg_name, lv_path]):
         print("获取LVM信息失败")
         sys.exit(1)
     
     # 扩展物理卷
     print(f"扩展物理卷: {pv_device}")
-    run_cmd(f"pvresize {pv_device}")
+    run_cmd(f"{require_tool('pvresize')} {pv_device}")
     
     # 扩展逻辑卷（使用100%空闲空间）
     print(f"扩展逻辑卷: {lv_path}")
-    run_cmd(f"lvextend -l +100%FREE {lv_path}")
+    run_cmd(f"{require_tool('lvextend')} -l +100%FREE {lv_path}")
     
     # 调整文件系统
     fs_type = run_cmd(f"blkid -o value -s TYPE {lv_path}")
     if "xfs" in fs_type:
-        run_cmd(f"xfs_growfs {lv_path}")
+        run_cmd(f"{require_tool('xfs_growfs')} {lv_path}")
     else:
-        run_cmd(f"resize2fs {lv_path}")
+        run_cmd(f"{require_tool('resize2fs')} {lv_path}")
     
     print("✅ LVM根分区扩展完成")
 
@@ -94,34 +100,32 @@ def expand_root_non_lvm(disk, root_part):
     
     # 扩展分区
     print(f"扩展分区 {root_part}")
-    run_cmd(f"growpart {disk} {root_part[-1]}")
+    run_cmd(f"{require_tool('growpart')} {disk} {root_part[-1]}")
     
     # 调整文件系统
     fs_type = run_cmd(f"blkid -o value -s TYPE {root_part}")
     if "xfs" in fs_type:
-        run_cmd(f"xfs_growfs {root_part}")
+        run_cmd(f"{require_tool('xfs_growfs')} {root_part}")
     else:
-        run_cmd(f"resize2fs {root_part}")
+        run_cmd(f"{require_tool('resize2fs')} {root_part}")
     
     print("✅ 非LVM根分区扩展完成")
 
-def main():
-    # 检查root权限
-    if os.geteuid() != 0:
-        print("❌ 请使用sudo运行此脚本")
-        sys.exit(1)
-    
+def expand_root():
+    """识别根分区类型并扩展"""
     # 获取根设备
-    root_device = get_root_device()
+    with tracing.span("获取根设备"):
+        root_device = get_root_device()
     print(f"根设备: {root_device}")
     
     # 确定磁盘设备
     if check_lvm(root_device):
-        disk_device = run_cmd("pvs --noheadings -o pv_name | head -n1").strip()
+        disk_device = next(iter(run_cmd("pvs --noheadings -o pv_name").split()), "")
         if not disk_device:
             print("无法确定物理卷设备")
             sys.exit(1)
-        expand_root_lvm()
+        with tracing.span("扩展LVM根分区", device=root_device):
+            expand_root_lvm()
     else:
         # 非LVM系统
         disk_device = re.match(r"(/dev/[a-z]+)\d+", root_device)
@@ -129,11 +133,32 @@ def main():
             print("无法确定磁盘设备")
             sys.exit(1)
         disk_device = disk_device.group(1)
-        expand_root_non_lvm(disk_device, root_device)
+        with tracing.span("扩展非LVM根分区", disk=disk_device, device=root_device):
+            expand_root_non_lvm(disk_device, root_device)
     
     # 验证结果
     print("\n扩展后磁盘空间:")
     print(run_cmd("df -h /"))
 
+def main():
+    parser = argparse.ArgumentParser(description="自动扩展根分区")
+    parser.add_argument("--refresh", action="store_true", help="忽略工具注册表缓存，重新探测命令路径")
+    parser.add_argument("--trace", metavar="DIR", nargs="?", const="",
+                        help="记录每个步骤和命令的耗时（JSONL和Chrome trace），默认目录 /var/log/init_scripts/trace")
+    args = parser.parse_args()
+    toolreg.get_registry(refresh=args.refresh)
+    tracing.configure(args.trace, "expand_root")
+
+    # 检查root权限
+    if os.geteuid() != 0:
+        print("❌ 请使用sudo运行此脚本")
+        sys.exit(1)
+    
+    try:
+        expand_root()
+    except runcmd.CommandError as e:
+        print(f"{e}\n{e.stderr.strip() if e.stderr else ''}")
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
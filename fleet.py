@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+import argparse
+import fnmatch
+import glob
+import io
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_ROOT = "/var/log/init_scripts"
+REMOTE_DIR = "/tmp/init_scripts"
+
+# 推送到远程主机的文件：init2.0.sh、alpine-fetch 和所有Python模块（脚本之间互相import）
+PAYLOAD_PATTERNS = ["init2.0.sh", "alpine-fetch", "*.py"]
+
+# 清单中这些字段是ssh连接参数，其余 KEY=VALUE 作为环境变量传给远程脚本
+SSH_FIELDS = ("user", "port", "identity")
+
+class Host:
+    def __init__(self, name, user=None, port=None, identity=None, env=None):
+        self.name = name
+        self.user = user
+        self.port = port
+        self.identity = identity
+        self.env = env or {}
+
+    @property
+    def target(self):
+        return f"{self.user}@{self.name}" if self.user and "@" not in self.name else self.name
+
+class HostResult:
+    def __init__(self, host, log_path):
+        self.host = host
+        self.log_path = log_path
+        # 各阶段耗时，None表示未执行
+        self.connect = None
+        self.push = None
+        self.run = None
+        self.exit_code = None
+        self.error = ""
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return self.exit_code == 0 and not self.error
+
+# ==================== 主机清单 ====================
+
+def parse_inventory(path):
+    """每行一台主机: 主机名 [user=root] [port=22] [identity=~/.ssh/id_rsa] [INIT_HOSTNAME=web01 ...]"""
+    hosts = []
+    with open(path, "r") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = shlex.split(line, comments=True)
+            if not fields:
+                continue
+            options, env = {}, {}
+            for field in fields[1:]:
+                key, sep, value = field.partition("=")
+                if not sep:
+                    raise ValueError(f"{path}:{lineno}: 无法解析 {field}，应为 KEY=VALUE")
+                if key in SSH_FIELDS:
+                    options[key] = value
+                else:
+                    env[key] = value
+            hosts.append(Host(fields[0], env=env, **options))
+    return hosts
+
+# ==================== SSH连接复用 ====================
+
+class SSHPool:
+    """所有ssh调用共享 ControlMaster 连接，每台主机只做一次密钥交换和认证"""
+
+    def __init__(self, port=None, identity=None, options=(), persist=120, connect_timeout=10):
+        # ControlPath 有长度限制（unix socket），放在 /tmp 下的短目录中
+        self.control_dir = tempfile.mkdtemp(prefix="fleet-", dir="/tmp")
+        self.port = port
+        self.identity = identity
+        self.options = list(options)
+        self.persist = persist
+        self.connect_timeout = connect_timeout
+
+    def base_args(self, host):
+        args = [
+            "ssh", "-T",
+            "-o", "BatchMode=yes",
+            "-o", f"ConnectTimeout={self.connect_timeout}",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_dir}/%C",
+            "-o", f"ControlPersist={self.persist}",
+        ]
+        port = host.port or self.port
+        if port:
+            args += ["-p", str(port)]
+        identity = host.identity or self.identity
+        if identity:
+            args += ["-i", os.path.expanduser(identity)]
+        for option in self.options:
+            args += ["-o", option]
+        return args + [host.target]
+
+    def command(self, host, remote_cmd):
+        return self.base_args(host) + [remote_cmd]
+
+    def close(self, hosts):
+        for host in hosts:
+            subprocess.run(
+                self.base_args(host)[:-1] + ["-O", "exit", host.target],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+# ==================== 执行 ====================
+
+def payload_files():
+    files = set()
+    for pattern in PAYLOAD_PATTERNS:
+        files.update(glob.glob(os.path.join(BASE_DIR, pattern)))
+    return sorted(files)
+
+def build_payload():
+    """把脚本打包成内存中的tar.gz，每台主机通过已建立的ssh连接解包"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for path in payload_files():
+            tar.add(path, arcname=os.path.basename(path))
+    return buffer.getvalue()
+
+def remote_command(script, script_args, env, remote_dir, sudo):
+    if script.endswith(".sh"):
+        cmd = ["bash", script]
+    elif script.endswith(".py"):
+        cmd = ["python3", script]
+    else:
+        cmd = [f"./{script}"]
+    cmd += script_args
+    if env:
+        cmd = ["env"] + [f"{key}={value}" for key, value in sorted(env.items())] + cmd
+    if sudo:
+        cmd = ["sudo", "-n"] + cmd
+    return f"cd {shlex.quote(remote_dir)} && " + " ".join(shlex.quote(arg) for arg in cmd)
+
+def run_phase(cmd, log, timeout, payload=None):
+    """执行一个阶段，输出直接写入主机日志；返回 (退出码, 耗时)，超时返回 (None, 耗时)"""
+    log.write(f"$ {' '.join(shlex.quote(arg) for arg in cmd)}\n")
+    log.flush()
+    start = time.time()
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if payload is not None else subprocess.DEVNULL,
+        stdout=log,
+        stderr=subprocess.STDOUT
+    )
+    try:
+        proc.communicate(input=payload, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        return None, time.time() - start
+    return proc.returncode, time.time() - start
+
+def process_host(pool, host, payload, script, script_args, args, log_dir):
+    # 主机名可能包含 / 等字符（如 user@[fe80::1%eth0]），日志文件名中替换掉
+    log_name = "".join(c if c.isalnum() or c in "-_.@" else "_" for c in host.name)
+    result = HostResult(host, os.path.join(log_dir, f"{log_name}.log"))
+    start = time.time()
+    remote_dir = shlex.quote(args.remote_dir)
+    env = dict(args.env)
+    env.update(host.env)
+
+    with open(result.log_path, "w") as log:
+        def phase(title, remote_cmd, timeout, payload=None):
+            log.write(f"\n==== {title} ====\n")
+            code, elapsed = run_phase(pool.command(host, remote_cmd), log, timeout, payload)
+            if code is None:
+                result.error = f"{title}超时"
+            elif code == 255:
+                # ssh自身的错误（连接、认证、控制连接）返回255
+                result.error = f"{title}时SSH连接失败"
+            elif code != 0:
+                result.error = f"{title}失败，退出码 {code}"
+            return code, elapsed
+
+        # 第一次调用建立主连接，之后的推送和执行都复用它
+        code, result.connect = phase("连接", "true", args.connect_timeout + 20)
+        if code == 0:
+            code, result.push = phase("推送", f"mkdir -p {remote_dir} && tar -xzf - -C {remote_dir}",
+                                      args.timeout, payload)
+        if code == 0:
+            result.exit_code, result.run = phase(
+                "执行", remote_command(script, script_args, env, args.remote_dir, args.sudo), args.timeout)
+        if args.cleanup and result.push is not None:
+            # 清理失败不影响执行结果
+            log.write("\n==== 清理 ====\n")
+            run_phase(pool.command(host, f"rm -rf {remote_dir}"), log, args.connect_timeout + 20)
+
+    result.elapsed = time.time() - start
+    return result
+
+def format_phase(seconds, failed):
+    if seconds is None:
+        return f"{'-':>{PHASE_WIDTH}}"
+    text = f"{seconds:>{PHASE_WIDTH - 1}.1f}s"
+    return f"{COLOR_RED}{text}{COLOR_RESET}" if failed else text
+
+def display_width(text):
+    """中文等全角字符在终端中占两列"""
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+def pad(text, width, right=False):
+    """按显示宽度补齐空格，str.format 按字符数补齐，中文列会错位"""
+    spaces = " " * max(0, width - display_width(text))
+    return spaces + text if right else text + spaces
+
+# 各列的显示宽度，表头和数据行共用：状态为两个中文字，耗时为 "{:>7.1f}s"
+STATUS_WIDTH = 4
+PHASE_WIDTH = 8
+EXIT_WIDTH = 7
+TOTAL_WIDTH = 8
+
+def print_matrix(results, total):
+    width = max([display_width(r.host.name) for r in results] + [8])
+    print(f"\n{COLOR_CYAN}=== 执行结果 ==={COLOR_RESET}")
+    header = [pad("主机", width), pad("状态", STATUS_WIDTH)]
+    header += [pad(title, PHASE_WIDTH, right=True) for title in ("连接", "推送", "执行")]
+    header += [pad("退出码", EXIT_WIDTH, right=True), pad("总耗时", TOTAL_WIDTH, right=True)]
+    print(f"  {' '.join(header)}  说明")
+    for r in sorted(results, key=lambda r: (r.ok, r.host.name)):
+        status = f"{COLOR_GREEN}成功{COLOR_RESET}" if r.ok else f"{COLOR_RED}失败{COLOR_RESET}"
+        exit_code = "-" if r.exit_code is None else str(r.exit_code)
+        phases = [r.connect, r.push, r.run]
+        # 失败的阶段是最后一个执行过的阶段
+        last = max((i for i, seconds in enumerate(phases) if seconds is not None), default=-1)
+        cells = " ".join(format_phase(seconds, not r.ok and i == last) for i, seconds in enumerate(phases))
+        print(f"  {pad(r.host.name, width)} {status} {cells} {exit_code:>{EXIT_WIDTH}} "
+              f"{r.elapsed:>{TOTAL_WIDTH - 1}.1f}s  {r.error}")
+
+    failed = [r for r in results if not r.ok]
+    color = COLOR_RED if failed else COLOR_GREEN
+    print(f"{color}共 {len(results)} 台主机，成功 {len(results) - len(failed)} 台，"
+          f"失败 {len(failed)} 台，总耗时 {total:.1f}s{COLOR_RESET}")
+    return not failed
+
+def write_summary(results, path):
+    with open(path, "w") as f:
+        json.dump([{
+            "host": r.host.name,
+            "ok": r.ok,
+            "connect_seconds": r.connect,
+            "push_seconds": r.push,
+            "run_seconds": r.run,
+            "exit_code": r.exit_code,
+            "elapsed_seconds": r.elapsed,
+            "error": r.error,
+            "log": r.log_path
+        } for r in results], f, indent=2, ensure_ascii=False)
+
+def parse_env(value):
+    key, sep, val = value.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"应为 KEY=VALUE: {value}")
+    return key, val
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="通过复用的SSH连接在多台主机上并行执行初始化脚本",
+        epilog="示例: fleet.py -i hosts.txt -j 50 provision.py --profile baseline"
+    )
+    parser.add_argument("--inventory", "-i", help="主机清单文件，每行: 主机 [user=] [port=] [identity=] [KEY=VALUE]")
+    parser.add_argument("--host", "-H", action="append", default=[], help="额外的主机，可多次指定")
+    parser.add_argument("--limit", help="只在匹配该通配符的主机上执行，如 'web*'")
+    parser.add_argument("--jobs", "-j", type=int, default=20, help="最大并发主机数 (默认: 20)")
+    parser.add_argument("--user", "-l", help="默认SSH用户")
+    parser.add_argument("--port", "-p", type=int, help="默认SSH端口")
+    parser.add_argument("--identity", help="默认SSH私钥")
+    parser.add_argument("--ssh-option", "-o", action="append", default=[], help="传给ssh的 -o 选项，可多次指定")
+    parser.add_argument("--env", "-e", type=parse_env, action="append", default=[], help="传给远程脚本的环境变量 KEY=VALUE")
+    parser.add_argument("--sudo", action="store_true", help="以 sudo -n 执行远程脚本（非root用户登录时使用）")
+    parser.add_argument("--remote-dir", default=REMOTE_DIR, help=f"远程主机上存放脚本的目录 (默认: {REMOTE_DIR})")
+    parser.add_argument("--cleanup", action="store_true", help="执行完成后删除远程目录")
+    parser.add_argument("--timeout", type=int, default=3600, help="每台主机推送和执行的超时时间，秒 (默认: 3600)")
+    parser.add_argument("--connect-timeout", type=int, default=10, help="SSH连接超时，秒 (默认: 10)")
+    parser.add_argument("--log-dir", help=f"日志目录 (默认: {LOG_ROOT}/fleet_时间)")
+    parser.add_argument("script", help="要执行的脚本，如 init2.0.sh、provision.py、expand_root.py")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="传给脚本的参数")
+    args = parser.parse_args()
+
+    if not os.path.isfile(os.path.join(BASE_DIR, args.script)):
+        parser.error(f"脚本不存在: {args.script}")
+
+    hosts = []
+    if args.inventory:
+        try:
+            hosts += parse_inventory(args.inventory)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    hosts += [Host(name) for name in args.host]
+    if args.limit:
+        hosts = [h for h in hosts if fnmatch.fnmatch(h.name, args.limit)]
+    if not hosts:
+        parser.error("没有要执行的主机，请指定 --inventory 或 --host")
+    for host in hosts:
+        host.user = host.user or args.user
+
+    log_dir = args.log_dir or os.path.join(LOG_ROOT, f"fleet_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"主机数: {len(hosts)}，并发: {args.jobs}，日志目录: {log_dir}\n")
+
+    payload = build_payload()
+    pool = SSHPool(args.port, args.identity, args.ssh_option, connect_timeout=args.connect_timeout)
+    print_lock = threading.Lock()
+    results = []
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            futures = {
+                executor.submit(process_host, pool, host, payload, args.script, args.script_args, args, log_dir): host
+                for host in hosts
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 单台主机的异常（日志无法写入、无法启动ssh等）记为失败，不影响其他主机的结果和汇总
+                    result = HostResult(futures[future], "")
+                    result.error = f"{type(e).__name__}: {e}"
+                results.append(result)
+                with print_lock:
+                    if result.ok:
+                        print(f"{COLOR_GREEN}[成功] {result.host.name} ({result.elapsed:.1f}s){COLOR_RESET}")
+                    else:
+                        log_hint = f"，日志: {result.log_path}" if result.log_path else ""
+                        print(f"{COLOR_RED}[失败] {result.host.name} ({result.elapsed:.1f}s) "
+                              f"{result.error}{log_hint}{COLOR_RESET}")
+    finally:
+        pool.close(hosts)
+
+    write_summary(results, os.path.join(log_dir, "summary.json"))
+    sys.exit(0 if print_matrix(results, time.time() - start) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,38 @@ yellow(){
 red(){
     echo -e "\033[31m\033[01m$1\033[0m"
 }
+#运行本仓库的Python模块：与本脚本在同一目录时（如通过 fleet.py 推送）直接使用，否则下载到临时目录
+#下载失败时返回127，调用方据此区分"模块不可用"和"模块执行失败"
+PY_SCRIPT_RAW="https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main"
+run_module(){
+	local module=$1 script_dir work_dir file rc=0
+	shift
+	script_dir=$(dirname "$(readlink -f "$0")")
+	if [ -f "$script_dir/$module" ]; then
+		python3 "$script_dir/$module" "$@" || rc=$?
+		return $rc
+	fi
+	work_dir=$(mktemp -d /tmp/init-scripts.XXXXXX)
+	for file in "$module" runcmd.py toolreg.py tracing.py; do
+		curl -sSL --max-time 30 --retry 3 -o "$work_dir/$file" "$PY_SCRIPT_RAW/$file" || {
+			rm -rf "$work_dir"
+			red "下载 $file 失败"
+			return 127
+		}
+	done
+	python3 "$work_dir/$module" "$@" || rc=$?
+	rm -rf "$work_dir"
+	return $rc
+}
+#配置局域网软件包缓存代理，没有可用缓存时不做修改
+use_pkg_cache(){
+	run_module pkg_cache.py enable || true
+}
+#经局域网缓存一次性安装软件包，没有缓存或安装失败时返回非0，由调用方逐个安装
+install_with_pkg_cache(){
+	[ $# -gt 0 ] || return 0
+	run_module pkg_cache.py install "$@"
+}
 #永久关闭防火墙
 disable_firewalld_selinux () {
 	systemctl stop firewalld
@@ -53,14 +85,19 @@ change_Centos_networkname(){
 #done
 # 重载规则
 #udevadm control --reload-rules
+# 已经配置过时不再重复追加和重新生成grub配置
+if ! grep -q "net.ifnames=0" /etc/default/grub; then
 cat >> /etc/default/grub << EOF
 GRUB_CMDLINE_LINUX="crashkernel=auto rhgb quiet net.ifnames=0 biosdevname=0"
 EOF
 grub2-mkconfig -o /boot/grub2/grub.cfg
+fi
 cd /etc/sysconfig/network-scripts/
-mv ifcfg-ens192 ifcfg-eth0
-sed -i 's/ens192/eth0/g' ifcfg-eth0
-systemctl restart network
+if [ -f ifcfg-ens192 ]; then
+    mv ifcfg-ens192 ifcfg-eth0
+    sed -i 's/ens192/eth0/g' ifcfg-eth0
+    systemctl restart network
+fi
 }
 
 
@@ -85,23 +122,55 @@ echo  "init sucess" chenzai | mail -s " test" 18827262495@163.com
 
 #设置 ssh 服务端口并开启 root 可以远程登录
 
+# 替换已有的配置项，不存在时追加，重复执行不会产生重复行
+set_sshd_option () {
+    local key=$1 value=$2 file=/etc/ssh/sshd_config
+    if grep -qE "^#?${key}[[:space:]]" $file; then
+        sed -i -E "s/^#?${key}[[:space:]].*/${key} ${value}/" $file
+    else
+        echo "${key} ${value}" >> $file
+    fi
+}
+
+#SSH连接调优：关闭UseDNS/GSSAPI、放宽MaxStartups/MaxSessions、有AES-NI时优先AES-GCM和客户端连接复用
+#sshd -t 校验失败时自动恢复，INIT_SSH_TUNE=off 跳过
+tune_ssh () {
+    [ "${INIT_SSH_TUNE:-}" = "off" ] && return 0
+    command -v python3 &> /dev/null || return 0
+    run_module ssh_tune.py || red "SSH 连接调优失败"
+}
+
 set_ssh_port_rootlogin () {
 	source /etc/init.d/functions
-    read -p "请输入ssh端口号: " port
+    # 非交互调用时通过 INIT_SSH_PORT 传入端口号
+    local port="${INIT_SSH_PORT:-}"
+    if [ -z "$port" ]; then
+        read -p "请输入ssh端口号: " port
+    fi
     cp -a /etc/ssh/sshd_config /etc/ssh/sshd_config.bak
-    echo Port $port >> /etc/ssh/sshd_config
-    echo PermitRootLogin yes >> /etc/ssh/sshd_config
-    systemctl restart sshd
-    if [ $? -eq 0 ];then
+    set_sshd_option Port $port
+    set_sshd_option PermitRootLogin yes
+    if cmp -s /etc/ssh/sshd_config /etc/ssh/sshd_config.bak; then
+        green "SSH 配置未变化"
+    elif ! sshd -t; then
+        cp -a /etc/ssh/sshd_config.bak /etc/ssh/sshd_config
+        red "SSH 配置校验失败，已恢复原配置"
+        return 1
+    elif systemctl restart sshd; then
         green "SSH 服务重启成功"
     else
         red "SSH 服务重启失败"
     fi
+    tune_ssh
 }
 
 #制作光盘yum源和阿里云、epel源
 #centos6配置yum源
 centos6_make_yum_repo () {
+if grep -qs "Centos-vault-6.10\|mirrors.aliyun.com" /etc/yum.repos.d/CentOS-Base.repo; then
+    green "yum 源已配置"
+    return 0
+fi
 cd /etc/yum.repos.d/
 if [ -d /etc/yum.repos.d/bak ]; then
     red "bak 目录已存在!"
@@ -119,6 +188,7 @@ rpm -q epel-release &> /dev/null ||yum install -y epel-release &> /dev/null
 #enabled=1
 #gpgcheck=0
 #EOF
+use_pkg_cache
 yum clean all
 yum makecache fast
 #if [ -d /iso ];then
@@ -132,6 +202,10 @@ yum makecache fast
 }
 #centos7配置yum源
 centos7_make_yum_repo (){
+if grep -qs "huaweicloud" /etc/yum.repos.d/CentOS-Base.repo; then
+    green "yum 源已配置"
+    return 0
+fi
 cd /etc/yum.repos.d/
 if [ -d /etc/yum.repos.d/bak ]; then
     red "bak 目录已存在!"
@@ -149,6 +223,7 @@ rpm -q epel-release &> /dev/null || yum install -y epel-release &> /dev/null
 #enabled=1
 #gpgcheck=0
 #EOF
+use_pkg_cache
 yum clean all
 yum makecache fast
 #if [ -d /iso ];then
@@ -162,6 +237,10 @@ yum makecache fast
 }
 #Rocky8配置yum源
 Rocky8_make_yum_repo (){
+if grep -qs "^baseurl=https://mirrors.aliyun.com/rockylinux" /etc/yum.repos.d/Rocky-*.repo; then
+    green "yum 源已配置"
+    return 0
+fi
 sed -e 's|^mirrorlist=|#mirrorlist=|g' \
     -e 's|^#baseurl=http://dl.rockylinux.org/$contentdir|baseurl=https://mirrors.aliyun.com/rockylinux|g' \
     -i.bak \
@@ -179,6 +258,7 @@ sed -e 's|^mirrorlist=|#mirrorlist=|g' \
 #enabled=1
 #gpgcheck=0
 #EOF
+use_pkg_cache
 dnf clean all
 dnf makecache fast
 }
@@ -226,8 +306,16 @@ EOF
 #PS1='\[\e[31;1m\][\u@\h \w]\$\[\e[0m\]'
 #EOF
 set_ps1 () {
+    if grep -qs "^# ==== init_scripts: ps1 ====" /root/.bashrc; then
+        echo "命令提示符已配置"
+        return 0
+    fi
     #echo "PS1='\[\e[32;1m\][\[\e[34;1m\]\u@\[\e[1;31m\]\h \[\e[1;33m\]\w \[\e[1;32m\]]\\$ \[\e[0m\]'" > /etc/profile.d/PS1.sh
-    echo "PS1='\[\e[32;1m\][\[\e[34;1m\]\u@\[\e[1;31m\]\h \[\e[1;33m\]\w \[\e[1;32m\]]\\$ \[\e[0m\]'" >> /root/.bashrc
+    {
+        echo "# ==== init_scripts: ps1 ===="
+        echo "PS1='\[\e[32;1m\][\[\e[34;1m\]\u@\[\e[1;31m\]\h \[\e[1;33m\]\w \[\e[1;32m\]]\\$ \[\e[0m\]'"
+        echo "# ==== end init_scripts: ps1 ===="
+    } >> /root/.bashrc
     echo "命令提示符优化完毕,请重新登录"
 }
 #安装常用软件
@@ -258,51 +346,75 @@ centos_install_package() {
         exit 1
     fi
     # 更新包缓存
+    use_pkg_cache
     sudo $pm_cmd makecache
-    
+
+    local missing=()
     for pkg in "${packages[@]}"; do
         # 检查包是否已安装
         if rpm -q "$pkg" &> /dev/null; then
             echo "[跳过] $pkg 已安装"
         else
-            echo "[安装] $pkg..."
-            sudo $pm_cmd install -y "$pkg"
+            missing+=("$pkg")
         fi
     done
+    # 软件包都已安装时直接返回（bash 4.3及更早版本在 set -u 下展开空数组会报错）
+    [ ${#missing[@]} -gt 0 ] || return 0
+    install_with_pkg_cache "${missing[@]}" && return 0
+    for pkg in "${missing[@]}"; do
+        echo "[安装] $pkg..."
+        sudo $pm_cmd install -y "$pkg"
+    done
 }
 # 定义Ubuntu安装函数（独立包检测）
 ubuntu_install_package() {
     local packages=("sudo" "vim" "curl" "tree" "net-tools" "wget" "jq" "bc" "netcat" "dnsutils" "iproute2" "ntpdate" "tcpdump" "telnet" "traceroute" "nfs-kernel-server" "nfs-common" "lrzsz" "tree" "openssl" "libssl-dev" "libpcre3" "libpcre3-dev" "zlib1g-dev" "gcc" "openssh-server" "iotop" "unzip" "zip" "bzip2" "htop" "git") # Ubuntu特有包
     
     # 更新包列表
+    use_pkg_cache
     apt-get update
-    
+
+    local missing=()
     for pkg in "${packages[@]}"; do
         # Ubuntu特有的包检测方式
         if dpkg -l "$pkg" 2>/dev/null | grep -q "^ii"; then
             echo "[跳过] $pkg - Ubuntu包已安装"
         else
-            echo "[安装] $pkg - Ubuntu..."
-            sudo apt-get install -y "$pkg"
+            missing+=("$pkg")
         fi
     done
+    # 软件包都已安装时直接返回（bash 4.3及更早版本在 set -u 下展开空数组会报错）
+    [ ${#missing[@]} -gt 0 ] || return 0
+    install_with_pkg_cache "${missing[@]}" && return 0
+    for pkg in "${missing[@]}"; do
+        echo "[安装] $pkg - Ubuntu..."
+        sudo apt-get install -y "$pkg"
+    done
 }
 # 定义Debian安装函数（独立包检测）
 debian_install_package() {
     local packages=("sudo" "vim" "curl" "tree" "net-tools" "wget" "jq" "bc" "netcat" "dnsutils" "iproute2" "iputils-ping" "traceroute" "htop" "lshw" "inxi" "lm-sensors" "unzip" "zip" "bzip2" "p7zip-full" "unrar-free" "git" "tcpdump" "iotop" "gcc") # Debian特有包
     
     # 更新包列表
+    use_pkg_cache
     apt-get update
-    
+
+    local missing=()
     for pkg in "${packages[@]}"; do
         # Debian专用的包检测方式
         if apt list --installed 2>/dev/null | grep -q "^$pkg/"; then
             echo "[跳过] $pkg - Debian包已安装"
         else
-            echo "[安装] $pkg - Debian..."
-            sudo apt-get install -y "$pkg"
+            missing+=("$pkg")
         fi
     done
+    # 软件包都已安装时直接返回（bash 4.3及更早版本在 set -u 下展开空数组会报错）
+    [ ${#missing[@]} -gt 0 ] || return 0
+    install_with_pkg_cache "${missing[@]}" && return 0
+    for pkg in "${missing[@]}"; do
+        echo "[安装] $pkg - Debian..."
+        sudo apt-get install -y "$pkg"
+    done
 }
 
 
@@ -370,14 +482,24 @@ esac
 #yum install vim lrzsz tree tmux lsof tcpdump wget net-tools iotop bc bzip2 zip unzip nfs-utils man-pages dos2unix nc telnet wget ntpdate bash-completion bash-completion-extras gcc make autoconf gcc-c++ glibc glibc-devel pcre pcre-devel openssl openssl-devel systemd-devel zlib-devel -y
 #添加常用别名
 set_alias(){
+if grep -qs "^# ==== init_scripts: aliases ====" ~/.bashrc; then
+    echo "常用别名已配置"
+    return 0
+fi
 cat >> ~/.bashrc <<EOF
+# ==== init_scripts: aliases ====
 alias scandisk='echo - - - > /sys/class/scsi_host/host0/scan;echo - - - > /sys/class/scsi_host/host1/scan;echo - - - > /sys/class/scsi_host/host2/scan'
 alias cdnet='cd /etc/sysconfig/network-scripts/'
 alias cdrepo='cd /etc/yum.repos.d/'
+# ==== end init_scripts: aliases ====
 EOF
 }
 #修改vim格式
 set_vimrc(){
+if grep -qs "^func SetTitle()" ~/.vimrc; then
+    echo "vim 已配置"
+    return 0
+fi
 cat >> ~/.vimrc << EOF
 set number
 set ignorecase
@@ -410,24 +532,46 @@ EOF
 #配置Ubuntu的root登录
 set_ubuntu_root(){
 	source /etc/init.d/functions
-	echo PermitRootLogin yes >> /etc/ssh/sshd_config
-	/etc/init.d/ssh restart
-	if [ $? -eq 0 ];then
+	cp -a /etc/ssh/sshd_config /etc/ssh/sshd_config.bak
+	set_sshd_option PermitRootLogin yes
+	if cmp -s /etc/ssh/sshd_config /etc/ssh/sshd_config.bak; then
+		green "SSH 配置未变化"
+	elif ! sshd -t; then
+		cp -a /etc/ssh/sshd_config.bak /etc/ssh/sshd_config
+		red "SSH 配置校验失败，已恢复原配置!"
+		return 1
+	elif /etc/init.d/ssh restart; then
 		green "SSH 服务重启成功!"
 	else
 		red "SSH 服务重启失败!"
 	fi
+	tune_ssh
 }
 
-#禁用SWAP
+#禁用SWAP；设置 INIT_VM_PROFILE（k8s/database/build）时改为应用 vm_tune.py 的内存和VM调优配置
 set_swap(){
-sed -i '/swap/s/^/#/' /etc/fstab
+local rc=0
+if [ -n "${INIT_VM_PROFILE:-}" ] && command -v python3 &> /dev/null; then
+    run_module vm_tune.py apply --profile "$INIT_VM_PROFILE" || rc=$?
+    if [ $rc -ne 127 ]; then
+        # vm_tune.py 执行失败时报告错误，不回退到只禁用SWAP
+        [ $rc -eq 0 ] || red "内存调优失败 (返回码 $rc)"
+        return $rc
+    fi
+fi
+# 未指定调优配置、没有Python或无法下载 vm_tune.py 时只禁用SWAP
+# 只注释尚未注释的swap行，重复执行不会叠加 #
+sed -i '/^[^#].*swap/s/^/#/' /etc/fstab
 swapoff -a
 }
 
 #配置主机名
 set_host_name(){
-	read -p "请输入主机名: " name
+	# 非交互调用时通过 INIT_HOSTNAME 传入主机名
+	local name="${INIT_HOSTNAME:-}"
+	if [ -z "$name" ]; then
+		read -p "请输入主机名: " name
+	fi
 	hostnamectl set-hostname $name
 }
 
@@ -582,13 +726,19 @@ if [ "$(id -u)" -ne 0 ]; then
     exit 1
 fi
 
-# 定义下载 URL
+# 定义下载 URL（优先使用单进程的Python版本，无法安装python3时使用shell版本）
 FETCH_URL="https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main/alpine-fetch"
+PY_FETCH_URL="https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main/alpine_fetch.py"
 INSTALL_PATH="/usr/local/bin/alpine-fetch"
 
-# 安装依赖
+# 安装依赖（工具检查只在安装时进行，登录时不再检查）
 echo "安装必要依赖..."
-apk add --no-cache curl bash figlet util-linux procps coreutils > /dev/null 2>&1
+apk add --no-cache curl bash figlet python3 > /dev/null 2>&1 || \
+    apk add --no-cache curl bash figlet util-linux procps coreutils > /dev/null 2>&1
+
+if command -v python3 > /dev/null 2>&1; then
+    FETCH_URL="$PY_FETCH_URL"
+fi
 
 # 下载脚本
 echo "下载 Alpine Fetch 脚本..."
@@ -603,6 +753,14 @@ fi
 chmod +x "$INSTALL_PATH"
 echo "设置执行权限: $INSTALL_PATH"
 
+# Python版本预先渲染figlet横幅，shell版本在此补齐缺失的命令
+if [ "$FETCH_URL" = "$PY_FETCH_URL" ]; then
+    "$INSTALL_PATH" --render-banner
+else
+    apk add --no-cache util-linux procps coreutils > /dev/null 2>&1
+    "$INSTALL_PATH" --install
+fi
+
 # 添加到 /etc/profile
 PROFILE_HOOK="# Alpine Fetch Hook
 if [ -x /usr/local/bin/alpine-fetch ]; then
@@ -632,8 +790,11 @@ echo -e "当前用户下次登录时即可生效\e[0m\n"
 
 install_fastfetch(){
 # ===================== 配置项（可根据你的 GitHub 仓库修改） =====================
-# GitHub 上 Python 脚本的原始文件地址
-PY_SCRIPT_URL="https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main/install_fastfetch.py"
+# GitHub 仓库中脚本文件的原始地址前缀
+PY_SCRIPT_BASE="https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main"
+# 主安装脚本及其依赖的同目录模块
+PY_SCRIPT_NAME="install_fastfetch.py"
+PY_MODULES="install_fastfetch.py pylolcat.py pkg_cache.py runcmd.py toolreg.py tracing.py"
 # 超时时间（秒）
 TIMEOUT=30
 # ==============================================================================
@@ -709,20 +870,31 @@ check_dependencies() {
 
 # 从 GitHub 拉取并执行 Python 脚本
 run_python_script() {
-    info "开始从 GitHub 拉取安装脚本: $PY_SCRIPT_URL"
-    
-    # 优先使用 curl，没有则用 wget
-    if command -v curl &> /dev/null; then
-        # 使用 curl 拉取并通过管道执行（添加超时、静默模式、失败重试）
-        if ! curl -sSL --max-time "$TIMEOUT" --retry 3 "$PY_SCRIPT_URL" | python3 -; then
-            error "Python 脚本执行失败，请检查 GitHub 地址是否正确，或网络是否稳定"
-        fi
-    else
-        # 使用 wget 拉取并通过管道执行
-        if ! wget -qO- --timeout="$TIMEOUT" --tries=3 "$PY_SCRIPT_URL" | python3 -; then
-            error "Python 脚本执行失败，请检查 GitHub 地址是否正确，或网络是否稳定"
+    local work_dir
+    work_dir=$(mktemp -d /tmp/fastfetch-installer.XXXXXX)
+
+    # 主脚本会从同目录加载 pylolcat.py 等模块，因此下载到同一临时目录后再执行
+    for module in $PY_MODULES; do
+        info "开始从 GitHub 拉取: $PY_SCRIPT_BASE/$module"
+        # 优先使用 curl，没有则用 wget（添加超时、静默模式、失败重试）
+        if command -v curl &> /dev/null; then
+            curl -sSL --max-time "$TIMEOUT" --retry 3 -o "$work_dir/$module" "$PY_SCRIPT_BASE/$module" || {
+                rm -rf "$work_dir"
+                error "下载 $module 失败，请检查 GitHub 地址是否正确，或网络是否稳定"
+            }
+        else
+            wget -qO "$work_dir/$module" --timeout="$TIMEOUT" --tries=3 "$PY_SCRIPT_BASE/$module" || {
+                rm -rf "$work_dir"
+                error "下载 $module 失败，请检查 GitHub 地址是否正确，或网络是否稳定"
+            }
         fi
+    done
+
+    if ! python3 "$work_dir/$PY_SCRIPT_NAME"; then
+        rm -rf "$work_dir"
+        error "Python 脚本执行失败，请检查输出信息"
     fi
+    rm -rf "$work_dir"
 }
 
 # 主函数
@@ -753,9 +925,10 @@ Choice_change(){
      blue " 1.更换国内版仓库源"
      blue " 2.更换教育版仓库源"
      blue " 3.更换海外版仓库源"
+     blue " 4.测速后自动选择最快的仓库源"
 	 yellow " ================== "
     echo
-   read -p "请输入您的选项(1-3): " choice
+   read -p "请输入您的选项(1-4): " choice
 clear
   case $choice in
   	1)
@@ -767,6 +940,9 @@ clear
     3)
       Change_overseas_mirrors
       ;;
+    4)
+      Change_fastest_mirrors
+      ;;
     *)
       clear
 	red "输入错误,请输入正确的数字!"
@@ -788,10 +964,30 @@ Change_educate_mirrors(){
 Change_overseas_mirrors(){
 	bash <(curl -sSL https://linuxmirrors.cn/main.sh) --abroad
 }
+#并发测速候选镜像，写入最快镜像的仓库配置，参数直接传给 mirror_probe.py
+Change_fastest_mirrors(){
+	run_module mirror_probe.py "$@"
+}
 
 
 Install_Docker(){
-	bash <(curl -sSL https://linuxmirrors.cn/docker.sh)
+	if [ -t 0 ]; then
+		bash <(curl -sSL https://linuxmirrors.cn/docker.sh)
+	else
+		# 非交互调用（provision.py、fleet.py）时没有终端，通过参数给出所有选项，安装脚本不再提问
+		# 软件源和镜像仓库可通过 INIT_DOCKER_SOURCE/INIT_DOCKER_REGISTRY 指定
+		bash <(curl -sSL https://linuxmirrors.cn/docker.sh) \
+			--source "${INIT_DOCKER_SOURCE:-mirrors.aliyun.com/docker-ce}" \
+			--source-registry "${INIT_DOCKER_REGISTRY:-registry.hub.docker.com}" \
+			--protocol https \
+			--use-intranet-source false \
+			--install-latest true \
+			--close-firewall false \
+			--clean-screen false \
+			--ignore-backup-tips
+	fi
+	# 安装后调优daemon.json：日志轮转、live-restore、overlay2、并发下载和镜像加速
+	run_module docker_tune.py || red "Docker 调优失败，daemon.json 未修改"
 }
 
 start_menu(){
@@ -801,7 +997,7 @@ start_menu(){
      blue " 2. 网卡更名为eth0"
      blue " 3.配置邮箱告警"
      blue " 4.设置ssh服务和root远程登录"
-     blue " 5.禁用SWAP"
+     blue " 5.禁用SWAP并调优内存参数"
      blue " 6.配置主机名"
 	 blue " 7.修改vim格式"
 	 blue " 8.修改提示符颜色"
@@ -939,5 +1135,16 @@ case $num in
     ;;
 esac
 }
-start_menu
+
+# 带参数运行时直接执行指定的函数（供 provision.py 非交互调用），否则显示菜单
+if [ $# -gt 0 ]; then
+    if declare -F "$1" > /dev/null; then
+        "$@"
+    else
+        red "未知的函数: $1"
+        exit 1
+    fi
+else
+    start_menu
+fi
 
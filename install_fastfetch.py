@@ -1,13 +1,65 @@
 #!/usr/bin/env python3
 import os
-import subprocess
 import sys
 import glob
+import json
+import time
+import hashlib
+import tarfile
+import argparse
 import platform
 import shutil
 import tempfile
+import urllib.request
 from pathlib import Path
 
+import pkg_cache
+import runcmd
+import toolreg
+import tracing
+
+FASTFETCH_REPO_URL = "https://github.com/fastfetch-cli/fastfetch.git"
+FASTFETCH_INSTALL_PREFIX = "/usr"  # 标准安装路径
+
+# 内置Python彩虹着色器（替代Ruby版lolcat）
+PYLOLCAT_URL = "https://raw.githubusercontent.com/chenzai666/init_scripts/refs/heads/main/pylolcat.py"
+PYLOLCAT_INSTALL_PATH = "/usr/local/bin/pylolcat"
+
+# 离线包格式版本及打包进离线包的本仓库脚本（离线环境可直接从包内运行安装脚本）
+BUNDLE_FORMAT = 1
+BUNDLE_MODULES = ["install_fastfetch.py", "pylolcat.py", "pkg_cache.py", "runcmd.py", "toolreg.py", "tracing.py"]
+
+# 命令超时时间（秒），网络或编译卡住时不会无限等待
+INSTALL_TIMEOUT = 1800
+CLONE_TIMEOUT = 600
+BUILD_TIMEOUT = 3600
+
+# 本脚本依赖同目录的 runcmd.py 等模块，不支持通过管道执行，总是有 __file__
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 计算文件的sha256
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 安全解压，拒绝指向目标目录之外的成员
+def safe_extract(tar, dest):
+    dest = os.path.realpath(dest)
+    for member in tar.getmembers():
+        target = os.path.realpath(os.path.join(dest, member.name))
+        if target != dest and not target.startswith(dest + os.sep):
+            raise ValueError(f"归档中包含非法路径: {member.name}")
+        if member.issym() or member.islnk():
+            # 符号链接相对于链接所在目录，硬链接的 linkname 是相对于归档根目录的成员路径
+            base = os.path.dirname(target) if member.issym() else dest
+            link_target = os.path.realpath(os.path.join(base, member.linkname))
+            if not link_target.startswith(dest + os.sep):
+                raise ValueError(f"归档中包含非法链接: {member.name} -> {member.linkname}")
+    tar.extractall(dest)
+
 # 检查root权限
 def check_root():
     if os.geteuid() != 0:
@@ -80,25 +132,84 @@ def install_packages(os_id):
     # 安装基础依赖
     base_packages = " ".join(packages['base'])
     print(f"安装基础依赖: {base_packages}")
-    subprocess.run(f"{cmd} {base_packages}".split(), check=True, stderr=subprocess.PIPE)
+    run_install(cmd, packages['base'])
     
     # 安装FastFetch依赖
     fastfetch_packages = " ".join(packages['fastfetch'])
     print(f"安装FastFetch依赖: {fastfetch_packages}")
-    subprocess.run(f"{cmd} {fastfetch_packages}".split(), check=True, stderr=subprocess.PIPE)
+    run_install(cmd, packages['fastfetch'])
+
+# 有局域网软件包缓存时经缓存安装并报告命中率，否则直接安装
+def run_install(cmd, package_list):
+    if pkg_cache.install(package_list):
+        return
+    runcmd.run(cmd.split() + package_list, check=True, timeout=INSTALL_TIMEOUT)
+
+# 获取FastFetch源码（在线克隆或从离线包的源码归档解压）
+def fetch_fastfetch_source(work_dir, source_tarball=None, ref=None):
+    src_dir = f"{work_dir}/fastfetch"
+    if source_tarball:
+        print(f"解压离线源码: {source_tarball}")
+        with tarfile.open(source_tarball, "r:*") as tar:
+            safe_extract(tar, work_dir)
+        return src_dir
+
+    # 克隆仓库
+    clone_cmd = ["git", "clone", "--depth", "1"]
+    if ref:
+        clone_cmd += ["--branch", ref]
+    clone_cmd += [FASTFETCH_REPO_URL, src_dir]
+    print(f"克隆仓库: {' '.join(clone_cmd)}")
+    runcmd.run(clone_cmd, check=True, timeout=CLONE_TIMEOUT)
+    return src_dir
+
+# 编译FastFetch，install为False时只编译不安装（用于打包预编译二进制）
+def build_fastfetch(src_dir, install=True):
+    build_dir = f"{src_dir}/build"
+    os.makedirs(build_dir, exist_ok=True)
+    
+    # 添加编译选项
+    cmake_cmd = ["cmake", "..", "-DCMAKE_BUILD_TYPE=Release", f"-DCMAKE_INSTALL_PREFIX={FASTFETCH_INSTALL_PREFIX}"]
+    print(f"运行CMake: {' '.join(cmake_cmd)}")
+    runcmd.run(cmake_cmd, check=True, cwd=build_dir, timeout=BUILD_TIMEOUT)
+    
+    # 使用并行编译加速
+    cpu_count = os.cpu_count() or 1
+    make_cmd = ["make", "-j", str(cpu_count)]
+    print(f"编译FastFetch: {' '.join(make_cmd)}")
+    runcmd.run(make_cmd, check=True, cwd=build_dir, timeout=BUILD_TIMEOUT)
+    
+    if install:
+        install_cmd = ["make", "install"]
+        print(f"安装FastFetch: {' '.join(install_cmd)}")
+        runcmd.run(install_cmd, check=True, cwd=build_dir, timeout=BUILD_TIMEOUT)
 
-# 编译安装FastFetch
-def install_fastfetch():
+    return build_dir
+
+# 编译安装FastFetch（可使用离线包中的源码或预编译二进制）
+def install_fastfetch(source_tarball=None, binary=None):
     print("\n正在安装FastFetch...")
     
+    registry = toolreg.get_registry()
+
     # 查找现有安装路径
-    existing_path = shutil.which("fastfetch")
+    existing_path = registry.lookup("fastfetch")
     if existing_path:
         print(f"FastFetch 已经安装于: {existing_path}")
         return existing_path
     
+    # 离线包中带有匹配当前架构的预编译二进制时直接安装
+    if binary:
+        fastfetch_path = f"{FASTFETCH_INSTALL_PREFIX}/bin/fastfetch"
+        print(f"安装预编译二进制: {binary} -> {fastfetch_path}")
+        shutil.copyfile(binary, fastfetch_path)
+        os.chmod(fastfetch_path, 0o755)
+        registry.forget("fastfetch")
+        print(f"FastFetch 安装成功: {fastfetch_path}")
+        return fastfetch_path
+    
     # 检查编译环境
-    if not shutil.which("g++") or not shutil.which("cmake"):
+    if not registry.lookup("g++") or not registry.lookup("cmake"):
         print("错误：缺少必要的编译工具 (g++ 或 cmake)")
         sys.exit(1)
     
@@ -112,37 +223,12 @@ def install_fastfetch():
             print("清理旧构建目录: /tmp/fastfetch")
             shutil.rmtree("/tmp/fastfetch", ignore_errors=True)
         
-        # 克隆仓库
-        repo_url = "https://github.com/fastfetch-cli/fastfetch.git"
-        clone_cmd = f"git clone --depth 1 {repo_url} {work_dir}/fastfetch"
-        print(f"克隆仓库: {clone_cmd}")
-        subprocess.run(clone_cmd.split(), check=True, stderr=subprocess.PIPE)
-        
-        # 编译安装
-        os.chdir(f"{work_dir}/fastfetch")
-        build_dir = f"{work_dir}/fastfetch/build"
-        os.makedirs(build_dir, exist_ok=True)
-        os.chdir(build_dir)
-        
-        # 添加编译选项
-        install_prefix = "/usr"  # 标准安装路径
-        cmake_cmd = ["cmake", "..", "-DCMAKE_BUILD_TYPE=Release", f"-DCMAKE_INSTALL_PREFIX={install_prefix}"]
-        print(f"运行CMake: {' '.join(cmake_cmd)}")
-        subprocess.run(cmake_cmd, check=True, stderr=subprocess.PIPE)
-        
-        # 使用并行编译加速
-        cpu_count = os.cpu_count() or 1
-        make_cmd = ["make", "-j", str(cpu_count)]
-        print(f"编译FastFetch: {' '.join(make_cmd)}")
-        subprocess.run(make_cmd, check=True, stderr=subprocess.PIPE)
-        
-        # 安装
-        install_cmd = ["make", "install"]
-        print(f"安装FastFetch: {' '.join(install_cmd)}")
-        subprocess.run(install_cmd, check=True, stderr=subprocess.PIPE)
+        # 获取源码并编译安装
+        src_dir = fetch_fastfetch_source(work_dir, source_tarball)
+        build_fastfetch(src_dir)
         
         # 获取安装路径
-        fastfetch_path = shutil.which("fastfetch") or f"{install_prefix}/bin/fastfetch"
+        fastfetch_path = registry.lookup("fastfetch") or f"{FASTFETCH_INSTALL_PREFIX}/bin/fastfetch"
         print(f"FastFetch 安装成功: {fastfetch_path}")
         return fastfetch_path
         
@@ -174,23 +260,19 @@ def install_lolcat_from_source():
         print(f"解压源码: {zip_path}")
         shutil.unpack_archive(zip_path, work_dir)
         
-        # 进入源代码目录
+        # 源代码目录
         src_dir = glob.glob(f"{work_dir}/lolcat-*")[0]
-        os.chdir(src_dir)
-        
+
         # 安装依赖
         print("安装Lolcat依赖...")
-        subprocess.run(["gem", "install", "rake"], check=True)
-        
+        runcmd.run(["gem", "install", "rake"], check=True, cwd=src_dir, timeout=INSTALL_TIMEOUT)
+
         # 编译并安装
         print("编译安装Lolcat...")
-        subprocess.run(["rake", "install"], check=True)
+        runcmd.run(["rake", "install"], check=True, cwd=src_dir, timeout=INSTALL_TIMEOUT)
         
-        # 获取安装路径
-        lolcat_path = shutil.which("lolcat")
-        if not lolcat_path:
-            # 尝试在gem路径中查找
-            lolcat_path = find_lolcat_path()
+        # 获取安装路径（注册表会依次尝试PATH和gem路径）
+        lolcat_path = find_lolcat_path()
         
         print(f"Lolcat 安装成功: {lolcat_path}")
         return lolcat_path
@@ -199,15 +281,19 @@ def install_lolcat_from_source():
         print(f"源码安装失败: {str(e)}")
         print("尝试替代方法：直接使用gem安装到系统目录")
         os.chdir("/")
-        subprocess.run(["gem", "install", "lolcat", "--no-document"], check=True)
+        runcmd.run(["gem", "install", "lolcat", "--no-document"], check=True, timeout=INSTALL_TIMEOUT)
         return find_lolcat_path() or "/usr/local/bin/lolcat"
         
     finally:
         # 清理工作目录
         print(f"清理构建目录: {work_dir}")
         shutil.rmtree(work_dir, ignore_errors=True)
-# 查找Lolcat路径（优化版）
+# 查找Lolcat路径（通过工具注册表缓存结果）
 def find_lolcat_path():
+    """优先使用注册表中已记录且未变化的路径，否则完整探测一次"""
+    return toolreg.get_registry().lookup("lolcat", finder=probe_lolcat_path)
+# 探测Lolcat路径（优化版）
+def probe_lolcat_path():
     """更健壮的Lolcat路径查找方法"""
     # 1. 首先尝试标准路径查找
     lolcat_path = shutil.which("lolcat")
@@ -231,11 +317,12 @@ def find_lolcat_path():
     # 3. 尝试Ruby gem路径
     try:
         # 使用更可靠的gem路径查找方法
-        gem_path = subprocess.check_output(
+        gem_path = runcmd.run(
             ["gem", "environment", "gempath"],
-            text=True,
-            stderr=subprocess.DEVNULL
-        ).split(":")[0].strip()
+            capture=True,
+            check=True,
+            timeout=60
+        ).stdout.split(":")[0].strip()
         
         possible_paths = [
             f"{gem_path}/bin/lolcat",
@@ -298,15 +385,15 @@ def install_lolcat():
         }.get(os_id, "lolcat")
         
         if os_id in ["ubuntu", "debian", "pop", "kali"]:
-            subprocess.run(["apt-get", "install", "-y", package_name], check=True)
+            runcmd.run(["apt-get", "install", "-y", package_name], check=True, timeout=INSTALL_TIMEOUT)
         elif os_id in ["arch", "manjaro"]:
-            subprocess.run(["pacman", "-S", "--noconfirm", package_name], check=True)
+            runcmd.run(["pacman", "-S", "--noconfirm", package_name], check=True, timeout=INSTALL_TIMEOUT)
         elif os_id in ["fedora", "centos", "rhel"]:
-            subprocess.run(["dnf", "install", "-y", package_name], check=True)
+            runcmd.run(["dnf", "install", "-y", package_name], check=True, timeout=INSTALL_TIMEOUT)
         elif os_id in ["opensuse"]:
-            subprocess.run(["zypper", "install", "-y", package_name], check=True)
+            runcmd.run(["zypper", "install", "-y", package_name], check=True, timeout=INSTALL_TIMEOUT)
         elif os_id in ["alpine"]:
-            subprocess.run(["apk", "add", package_name], check=True)
+            runcmd.run(["apk", "add", package_name], check=True, timeout=INSTALL_TIMEOUT)
         
         # 检查路径
         lolcat_path = find_lolcat_path()
@@ -331,7 +418,7 @@ def install_lolcat():
             
             print(f"执行: {' '.join(cmd)}")
             try:
-                subprocess.run(cmd, check=True)
+                runcmd.run(cmd, check=True, timeout=INSTALL_TIMEOUT)
                 print("gem安装成功")
                 break
             except Exception as e:
@@ -350,6 +437,45 @@ def install_lolcat():
     # 如果上述方法都失败，使用源码安装
     print("所有方法失败，使用源码安装...")
     return install_lolcat_from_source()
+# 从离线包中的gem文件安装Ruby版Lolcat（gem install --local 不访问网络）
+def install_lolcat_from_bundle(gems_dir):
+    print("\n正在从离线包安装Lolcat...")
+    
+    lolcat_gems = glob.glob(f"{gems_dir}/lolcat-*.gem")
+    if not lolcat_gems:
+        print(f"错误：离线包中没有lolcat的gem文件: {gems_dir}")
+        sys.exit(1)
+    
+    # 依赖的gem位于同一目录，gem会在当前目录中查找
+    cmd = ["gem", "install", "--local", "--no-document", os.path.basename(lolcat_gems[0])]
+    print(f"执行: {' '.join(cmd)}")
+    runcmd.run(cmd, check=True, cwd=gems_dir, timeout=INSTALL_TIMEOUT)
+    
+    toolreg.get_registry().forget("lolcat")
+    lolcat_path = find_lolcat_path()
+    print(f"Lolcat 安装成功: {lolcat_path}")
+    return lolcat_path
+# 安装内置的Python彩虹着色器（无需Ruby/gem）
+def install_pylolcat(source=None):
+    print("\n正在安装内置彩虹着色器 pylolcat...")
+
+    # 优先使用离线包或与本脚本同目录的 pylolcat.py，都不存在时改为下载
+    local_source = source or os.path.join(BASE_DIR, "pylolcat.py")
+
+    tmp_path = f"{PYLOLCAT_INSTALL_PATH}.tmp"
+    if local_source and os.path.isfile(local_source):
+        print(f"使用本地源码: {local_source}")
+        shutil.copyfile(local_source, tmp_path)
+    else:
+        print(f"下载pylolcat: {PYLOLCAT_URL}")
+        with urllib.request.urlopen(PYLOLCAT_URL, timeout=30) as response:
+            with open(tmp_path, "wb") as out_file:
+                shutil.copyfileobj(response, out_file)
+
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, PYLOLCAT_INSTALL_PATH)
+    print(f"pylolcat 安装成功: {PYLOLCAT_INSTALL_PATH}")
+    return PYLOLCAT_INSTALL_PATH
 # 清理旧的失效配置
 def remove_old_config():
     config_path = "/etc/profile"
@@ -437,18 +563,190 @@ def configure_terminal_startup(fastfetch_path, lolcat_path):
         f.write(config_block)
     
     print("配置已写入 /etc/profile")
+# 制作离线安装包：源码、脚本、可选的gem和预编译二进制，附带校验和清单
+def create_bundle(output_dir, ref=None, with_binary=False, with_ruby_lolcat=False):
+    arch = platform.machine()
+    work_dir = tempfile.mkdtemp(prefix="fastfetch-bundle-")
+    stage_dir = f"{work_dir}/stage"
+    print(f"创建临时打包目录: {work_dir}")
+    
+    try:
+        for sub_dir in ("src", "python"):
+            os.makedirs(f"{stage_dir}/{sub_dir}")
+        
+        # 源码归档（不包含.git目录）
+        src_dir = fetch_fastfetch_source(work_dir, ref=ref)
+        commit = runcmd.run(["git", "-C", src_dir, "rev-parse", "HEAD"], capture=True, check=True).stdout.strip()
+        source_tarball = f"{stage_dir}/src/fastfetch.tar.gz"
+        print(f"打包源码: {source_tarball}")
+        with tarfile.open(source_tarball, "w:gz") as tar:
+            tar.add(src_dir, arcname="fastfetch",
+                    filter=lambda info: None if ".git" in info.name.split("/") else info)
+        
+        # 本仓库的安装脚本
+        for module in BUNDLE_MODULES:
+            shutil.copyfile(f"{BASE_DIR}/{module}", f"{stage_dir}/python/{module}")
+        
+        # 预编译二进制（仅适用于相同架构和相近发行版）
+        if with_binary:
+            build_dir = build_fastfetch(src_dir, install=False)
+            os.makedirs(f"{stage_dir}/bin")
+            shutil.copyfile(f"{build_dir}/fastfetch", f"{stage_dir}/bin/fastfetch-{arch}")
+            os.chmod(f"{stage_dir}/bin/fastfetch-{arch}", 0o755)
+        
+        # Ruby版lolcat及其依赖的gem，安装到临时目录后取出gem缓存
+        if with_ruby_lolcat:
+            gem_home = f"{work_dir}/gem-home"
+            cmd = ["gem", "install", "lolcat", "--no-document", "--install-dir", gem_home]
+            print(f"下载gem: {' '.join(cmd)}")
+            runcmd.run(cmd, check=True, timeout=INSTALL_TIMEOUT)
+            shutil.copytree(f"{gem_home}/cache", f"{stage_dir}/gems")
+        
+        # 生成清单
+        files = {}
+        for root, _, names in os.walk(stage_dir):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, stage_dir)] = sha256_file(path)
+        bundle_version = f"{ref or commit[:12]}-{time.strftime('%Y%m%d')}"
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "version": bundle_version,
+            "created": int(time.time()),
+            "arch": arch if with_binary else None,
+            "fastfetch": {"ref": ref, "commit": commit},
+            "files": files
+        }
+        with open(f"{stage_dir}/manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        
+        # 打包并写入归档的校验文件
+        os.makedirs(output_dir, exist_ok=True)
+        bundle_name = f"fastfetch-bundle-{bundle_version}"
+        archive_path = os.path.join(os.path.abspath(output_dir), f"{bundle_name}.tar.gz")
+        with tarfile.open(archive_path, "w:gz") as tar:
+            tar.add(stage_dir, arcname=bundle_name)
+        with open(f"{archive_path}.sha256", "w") as f:
+            f.write(f"{sha256_file(archive_path)}  {os.path.basename(archive_path)}\n")
+        
+        print(f"\n离线包已生成: {archive_path}")
+        print(f"校验文件: {archive_path}.sha256")
+        print("离线安装: 解压后执行 python3 <包目录>/python/install_fastfetch.py --from-bundle <离线包>")
+        return archive_path
+    
+    finally:
+        print(f"清理打包目录: {work_dir}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+# 解压并校验离线安装包，返回 (包根目录, 清单)
+def open_bundle(archive_path, work_dir):
+    print(f"\n校验离线包: {archive_path}")
+    checksum_path = f"{archive_path}.sha256"
+    if os.path.exists(checksum_path):
+        with open(checksum_path, "r") as f:
+            expected = f.read().split()[0]
+        if sha256_file(archive_path) != expected:
+            print("错误：离线包校验失败，文件可能已损坏")
+            sys.exit(1)
+        print("离线包校验通过")
+    else:
+        print(f"未找到校验文件 {checksum_path}，仅校验包内清单")
+    
+    with tarfile.open(archive_path, "r:gz") as tar:
+        safe_extract(tar, work_dir)
+    roots = glob.glob(f"{work_dir}/fastfetch-bundle-*/manifest.json")
+    if not roots:
+        print("错误：离线包中缺少 manifest.json")
+        sys.exit(1)
+    bundle_dir = os.path.dirname(roots[0])
+    
+    with open(roots[0], "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        print(f"错误：不支持的离线包格式: {manifest.get('format')}")
+        sys.exit(1)
+    for rel_path, digest in manifest["files"].items():
+        path = os.path.join(bundle_dir, rel_path)
+        if not os.path.isfile(path) or sha256_file(path) != digest:
+            print(f"错误：离线包文件校验失败: {rel_path}")
+            sys.exit(1)
+    
+    print(f"离线包版本: {manifest['version']} (fastfetch {manifest['fastfetch']['commit'][:12]})")
+    return bundle_dir, manifest
+def parse_args():
+    parser = argparse.ArgumentParser(description="FastFetch 一键安装脚本")
+    parser.add_argument("--ruby-lolcat", action="store_true",
+                        help="使用Ruby版lolcat（需要安装Ruby/gem），默认使用内置的pylolcat")
+    parser.add_argument("--refresh", action="store_true",
+                        help="忽略工具注册表缓存，重新探测所有工具路径")
+    parser.add_argument("--from-bundle", metavar="ARCHIVE",
+                        help="从离线包安装，不访问网络也不安装系统依赖")
+    parser.add_argument("--skip-packages", action="store_true",
+                        help="跳过系统依赖安装（已通过 deps 子命令单独安装时使用）")
+    parser.add_argument("--trace", metavar="DIR", nargs="?", const="",
+                        help="记录每个步骤和命令的耗时（JSONL和Chrome trace），默认目录 /var/log/init_scripts/trace")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("deps", help="只安装编译和运行FastFetch所需的系统依赖")
+    bundle_parser = subparsers.add_parser("bundle", help="制作离线安装包")
+    bundle_parser.add_argument("-o", "--output", default=".", help="离线包输出目录 (默认: 当前目录)")
+    bundle_parser.add_argument("--ref", help="fastfetch的tag或分支 (默认: 默认分支最新提交)")
+    bundle_parser.add_argument("--with-binary", action="store_true", help="同时打包当前架构的预编译二进制")
+    bundle_parser.add_argument("--with-ruby-lolcat", action="store_true", help="同时打包Ruby版lolcat及其依赖gem")
+    return parser.parse_args()
 def main():
+    args = parse_args()
+    toolreg.get_registry(refresh=args.refresh)
+    tracing.configure(args.trace, "install_fastfetch")
+
+    if args.command == "bundle":
+        with tracing.span("制作离线包"):
+            create_bundle(args.output, args.ref, args.with_binary, args.with_ruby_lolcat)
+        return
+    
+    bundle_work_dir = None
     try:
         check_root()
         os_id = detect_os()
         
         print(f"检测到系统: {os_id.capitalize()}")
-        print("安装依赖...")
-        install_packages(os_id)
+        if args.command == "deps":
+            with tracing.span("安装系统依赖", os=os_id):
+                install_packages(os_id)
+            print("\n系统依赖安装完成")
+            return
         
-        # 安装并获取二进制路径
-        fastfetch_path = install_fastfetch()
-        lolcat_path = install_lolcat()
+        if args.from_bundle:
+            bundle_work_dir = tempfile.mkdtemp(prefix="fastfetch-offline-")
+            with tracing.span("校验离线包", archive=args.from_bundle):
+                bundle_dir, manifest = open_bundle(args.from_bundle, bundle_work_dir)
+            print("离线安装模式：跳过系统依赖安装")
+
+            binary = f"{bundle_dir}/bin/fastfetch-{platform.machine()}"
+            with tracing.span("安装FastFetch"):
+                fastfetch_path = install_fastfetch(
+                    source_tarball=f"{bundle_dir}/src/fastfetch.tar.gz",
+                    binary=binary if os.path.exists(binary) else None
+                )
+            with tracing.span("安装Lolcat"):
+                if args.ruby_lolcat:
+                    lolcat_path = install_lolcat_from_bundle(f"{bundle_dir}/gems")
+                else:
+                    lolcat_path = install_pylolcat(source=f"{bundle_dir}/python/pylolcat.py")
+        else:
+            if args.skip_packages:
+                print("跳过系统依赖安装")
+            else:
+                print("安装依赖...")
+                with tracing.span("安装系统依赖", os=os_id):
+                    install_packages(os_id)
+
+            # 安装并获取二进制路径
+            with tracing.span("安装FastFetch"):
+                fastfetch_path = install_fastfetch()
+            with tracing.span("安装Lolcat"):
+                if args.ruby_lolcat:
+                    lolcat_path = install_lolcat()
+                else:
+                    lolcat_path = install_pylolcat()
         
         # 验证路径有效性
         if not fastfetch_path or not os.access(fastfetch_path, os.X_OK):
@@ -462,25 +760,26 @@ def main():
         # 测试FastFetch是否能正常运行
         print("\n测试FastFetch...")
         try:
-            subprocess.run([fastfetch_path, "--version"], check=True, stdout=subprocess.DEVNULL)
+            runcmd.run([fastfetch_path, "--version"], check=True, echo=False, timeout=60)
             print("FastFetch测试通过")
-        except subprocess.CalledProcessError as e:
-            print(f"FastFetch测试失败: {e.stderr.decode('utf-8') if e.stderr else '未知错误'}")
+        except runcmd.CommandError as e:
+            print(f"FastFetch测试失败: {e.stderr.strip() if e.stderr else e}")
             print("提示：可能需要安装额外的依赖，尝试运行: sudo apt install libpci-dev libvulkan-dev")
             sys.exit(1)
         
         # 测试Lolcat是否能正常运行
         print("\n测试Lolcat...")
         try:
-            test_cmd = f'echo "测试彩色输出" | {lolcat_path} --version'
-            subprocess.run(test_cmd, shell=True, check=True)
+            runcmd.run(["echo", "测试彩色输出"], [lolcat_path, "--version"], check=True, timeout=60)
             print("Lolcat测试通过")
         except Exception as e:
             print(f"Lolcat测试失败: {str(e)}")
-            print("提示：可能需要手动配置Ruby环境")
+            if args.ruby_lolcat:
+                print("提示：可能需要手动配置Ruby环境")
         
         # 配置启动脚本
-        configure_terminal_startup(fastfetch_path, lolcat_path)
+        with tracing.span("配置登录显示"):
+            configure_terminal_startup(fastfetch_path, lolcat_path)
         
         print("\n安装完成！")
         print(f"FastFetch路径: {fastfetch_path}")
@@ -490,12 +789,12 @@ def main():
         print("提示：可通过编辑 /etc/profile 自定义配置")
         print("卸载提示: 要卸载配置，请编辑 /etc/profile 并删除脚本添加的配置块")
     
-    except subprocess.CalledProcessError as e:
-        print(f"\n错误：命令执行失败: {e.cmd}")
+    except runcmd.CommandError as e:
+        print(f"\n错误：{e}")
         print(f"返回代码: {e.returncode}")
-        print(f"错误输出: {e.stderr.decode('utf-8') if e.stderr else '无'}")
-        
-        if "git clone" in " ".join(e.cmd):
+        print(f"错误输出: {e.stderr.strip() if e.stderr else '无'}")
+
+        if "git clone" in e.cmd:
             print("\n解决方法:")
             print("1. 手动清理临时目录: sudo rm -rf /tmp/fastfetch*")
             print("2. 检查网络连接是否正常")
@@ -507,5 +806,8 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if bundle_work_dir:
+            shutil.rmtree(bundle_work_dir, ignore_errors=True)
 if __name__ == "__main__":
     main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import toolreg
+
+JOURNAL_NAME = "journal.json"
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def inputs_hash(inputs):
+    """对步骤的输入参数（字典）计算稳定的哈希"""
+    return sha256_text(json.dumps(inputs, sort_keys=True, ensure_ascii=False))
+
+def snapshot_file(path):
+    """记录文件的大小、mtime和内容哈希，文件不存在时返回None"""
+    path = os.path.expanduser(path)
+    try:
+        st = os.stat(path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256_file(path)}
+    except OSError:
+        return None
+
+def file_unchanged(path, recorded):
+    """先比较stat信息，只有mtime或大小变化时才重新计算内容哈希"""
+    path = os.path.expanduser(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return recorded is None
+    if recorded is None:
+        return False
+    if st.st_size == recorded["size"] and st.st_mtime_ns == recorded["mtime_ns"]:
+        return True
+    try:
+        return sha256_file(path) == recorded["sha256"]
+    except OSError:
+        return False
+
+class Journal:
+    """配置步骤的执行记录：输入哈希和输出文件/状态都未变化的步骤可以直接跳过"""
+
+    def __init__(self, path=None):
+        self.path = path or toolreg.state_path(JOURNAL_NAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                self._steps = json.load(f).get("steps", {})
+        except (OSError, ValueError):
+            self._steps = {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".journal-", dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"steps": self._steps}, f, indent=2, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, step, digest, files=(), state=None):
+        """输入哈希相同、输出文件未变化且状态一致时返回True"""
+        entry = self._steps.get(step)
+        if not entry or entry.get("inputs") != digest:
+            return False
+        recorded_files = entry.get("files", {})
+        if set(recorded_files) != {os.path.expanduser(p) for p in files}:
+            return False
+        for path, recorded in recorded_files.items():
+            if not file_unchanged(path, recorded):
+                return False
+        if state is not None and entry.get("state") != sha256_text(state):
+            return False
+        return True
+
+    def record(self, step, digest, files=(), state=None):
+        with self._lock:
+            self._steps[step] = {
+                "inputs": digest,
+                "files": {os.path.expanduser(p): snapshot_file(p) for p in files},
+                "state": sha256_text(state) if state is not None else None,
+                "recorded_at": int(time.time())
+            }
+            self._save()
+
+    def forget(self, step=None):
+        with self._lock:
+            if step:
+                self._steps.pop(step, None)
+            else:
+                self._steps.clear()
+            self._save()
+
+    def entries(self):
+        return dict(self._steps)
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或清除配置步骤的执行记录")
+    parser.add_argument("--forget", metavar="STEP", help="清除指定步骤的记录，下次执行时重新运行")
+    parser.add_argument("--forget-all", action="store_true", help="清除所有记录")
+    args = parser.parse_args()
+
+    journal = Journal()
+    if args.forget or args.forget_all:
+        journal.forget(None if args.forget_all else args.forget)
+        print("记录已清除")
+        return
+
+    print(f"记录文件: {journal.path}")
+    for step, entry in sorted(journal.entries().items()):
+        recorded = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["recorded_at"]))
+        files = ", ".join(entry.get("files", {})) or "-"
+        print(f"  {step:<16} {recorded}  {files}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import http.client
+import ipaddress
+import json
+import os
+import re
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import toolreg
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+CACHE_NAME = "mirrors.json"
+DEFAULT_TTL = 24 * 3600
+USER_AGENT = "init_scripts-mirror-probe"
+
+# 评分按下载一个典型软件包（4MB）的预计耗时计算：建连 + 首字节 + 传输
+SCORE_BYTES = 4 * 1024 * 1024
+
+# 各发行版在镜像站上的默认目录，以及用于测速的元数据文件
+DISTROS = {
+    "ubuntu": {"path": "ubuntu", "metadata": "dists/{codename}/Release"},
+    "debian": {"path": "debian", "metadata": "dists/{codename}/Release"},
+    "rocky": {"path": "rockylinux", "metadata": "{version}/BaseOS/{arch}/os/repodata/repomd.xml"},
+    "centos": {"path": "centos-vault", "metadata": "{release}/os/{arch}/repodata/repomd.xml"},
+    "alpine": {"path": "alpine", "metadata": "{branch}/main/{arch}/APKINDEX.tar.gz"},
+}
+# 已停止维护的CentOS只能从vault获取，按主版本选择最后一个发行版目录；8 的仓库布局不同，暂不支持
+CENTOS_RELEASES = {"6": "6.10", "7": "7.9.2009"}
+# Ubuntu 只在 ubuntu 目录提供 amd64/i386 的软件包，其他架构（arm64、riscv64等）在 ubuntu-ports 目录，
+# 在 MIRRORS 中用 "ubuntu-ports" 覆盖该目录
+UBUNTU_PORTS = "ubuntu-ports"
+UBUNTU_MAIN_ARCHES = ("x86_64", "amd64", "i386", "i686")
+
+# 候选镜像：(名称, 分组, 站点地址, 目录覆盖)；目录为完整URL时直接使用，为None表示该站不提供此发行版
+MIRRORS = [
+    ("aliyun", "domestic", "https://mirrors.aliyun.com", {}),
+    ("huaweicloud", "domestic", "https://repo.huaweicloud.com", {"rocky": "rocky"}),
+    ("tencent", "domestic", "https://mirrors.cloud.tencent.com", {}),
+    ("ustc", "edu", "https://mirrors.ustc.edu.cn", {}),
+    ("tuna", "edu", "https://mirrors.tuna.tsinghua.edu.cn", {}),
+    ("sjtu", "edu", "https://mirror.sjtu.edu.cn", {"centos": None}),
+    ("official", "overseas", "", {
+        "ubuntu": "http://archive.ubuntu.com/ubuntu",
+        UBUNTU_PORTS: "http://ports.ubuntu.com/ubuntu-ports",
+        "debian": "https://deb.debian.org/debian",
+        "rocky": "https://dl.rockylinux.org/pub/rocky",
+        "centos": "https://vault.centos.org",
+        "alpine": "https://dl-cdn.alpinelinux.org/alpine",
+    }),
+    ("kernel", "overseas", "https://mirrors.edge.kernel.org", {"centos": None, "rocky": "rocky", UBUNTU_PORTS: None}),
+]
+GROUPS = ("domestic", "edu", "overseas", "all")
+
+# ==================== 系统信息 ====================
+
+def detect_distro():
+    """返回 {id, version, codename, branch, arch}，读取 /etc/os-release"""
+    info = {}
+    try:
+        with open("/etc/os-release", "r") as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                info[key] = value.strip('"')
+    except FileNotFoundError:
+        pass
+    version = info.get("VERSION_ID", "")
+    distro_id = info.get("ID", "").lower()
+    # AlmaLinux、RHEL 等与 Rocky 使用相同的仓库布局
+    if distro_id not in DISTROS and "rhel" in info.get("ID_LIKE", "").split():
+        distro_id = "rocky"
+    return {
+        "id": distro_id,
+        "version": version.split(".")[0],
+        "codename": info.get("VERSION_CODENAME", ""),
+        "branch": "v" + ".".join(version.split(".")[:2]) if distro_id == "alpine" else "",
+        "arch": os.uname().machine,
+        "release": "",
+    }
+
+def local_subnet():
+    """本机出口地址所在的 /24 网段，测速结果按网段缓存"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            # UDP connect 不发送数据，只用于选出路由对应的源地址
+            s.connect(("223.5.5.5", 53))
+            address = s.getsockname()[0]
+        return str(ipaddress.ip_network(f"{address}/24", strict=False))
+    except OSError:
+        return "unknown"
+
+# ==================== 测速 ====================
+
+def repo_layout(distro_id, arch):
+    """仓库目录的名称，非x86架构的Ubuntu使用 ubuntu-ports"""
+    if distro_id == "ubuntu" and arch not in UBUNTU_MAIN_ARCHES:
+        return UBUNTU_PORTS
+    return distro_id
+
+def candidate_mirrors(distro_id, group, arch=""):
+    """返回 [(名称, 仓库地址)]"""
+    layout = repo_layout(distro_id, arch)
+    default_path = UBUNTU_PORTS if layout == UBUNTU_PORTS else DISTROS[distro_id]["path"]
+    candidates = []
+    for name, mirror_group, base, paths in MIRRORS:
+        if group != "all" and mirror_group != group:
+            continue
+        path = paths.get(layout, default_path)
+        if path is None:
+            continue
+        candidates.append((name, path if path.startswith(("http://", "https://")) else f"{base}/{path}"))
+    return candidates
+
+def probe(name, repo_url, metadata_path, timeout, max_bytes):
+    """分别测量TCP建连、首字节和传输速度，失败时 error 字段为错误信息"""
+    result = {"name": name, "url": repo_url, "connect_ms": None, "ttfb_ms": None,
+              "bytes": 0, "throughput": 0.0, "score": None, "error": ""}
+    url = urlsplit(f"{repo_url.rstrip('/')}/{metadata_path.lstrip('/')}")
+    https = url.scheme == "https"
+    port = url.port or (443 if https else 80)
+    try:
+        start = time.perf_counter()
+        sock = socket.create_connection((url.hostname, port), timeout=timeout)
+        result["connect_ms"] = (time.perf_counter() - start) * 1000
+
+        request_start = time.perf_counter()
+        if https:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=url.hostname)
+            conn = http.client.HTTPSConnection(url.hostname, port, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(url.hostname, port, timeout=timeout)
+        # 使用已测量过建连时间的socket，避免再建一次连接
+        conn.sock = sock
+        try:
+            conn.request("GET", url.path + (f"?{url.query}" if url.query else ""),
+                         headers={"User-Agent": USER_AGENT, "Cache-Control": "no-cache"})
+            response = conn.getresponse()
+            first_byte = time.perf_counter()
+            result["ttfb_ms"] = (first_byte - request_start) * 1000
+            if response.status != 200:
+                result["error"] = f"HTTP {response.status}"
+                return result
+            while result["bytes"] < max_bytes:
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                result["bytes"] += len(chunk)
+            transfer = max(time.perf_counter() - first_byte, 1e-3)
+        finally:
+            conn.close()
+    except (OSError, http.client.HTTPException) as e:
+        result["error"] = str(e) or e.__class__.__name__
+        return result
+
+    result["throughput"] = result["bytes"] / transfer
+    result["score"] = (result["connect_ms"] + result["ttfb_ms"]) / 1000 + SCORE_BYTES / max(result["throughput"], 1.0)
+    return result
+
+def rank(results):
+    """可用的镜像按评分（预计耗时）升序，失败的排在最后"""
+    return sorted(results, key=lambda r: (r["score"] is None, r["score"] or 0.0, r["name"]))
+
+def probe_all(candidates, metadata_path, timeout, max_bytes, jobs):
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(candidates)))) as pool:
+        futures = [pool.submit(probe, name, url, metadata_path, timeout, max_bytes) for name, url in candidates]
+        return rank([f.result() for f in futures])
+
+# ==================== 缓存 ====================
+
+def load_cache(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(path, cache):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# ==================== 写入仓库配置 ====================
+
+UBUNTU_SOURCES = """deb {url} {codename} main restricted universe multiverse
+deb {url} {codename}-security main restricted universe multiverse
+deb {url} {codename}-updates main restricted universe multiverse
+deb {url} {codename}-backports main restricted universe multiverse
+"""
+
+DEBIAN_SOURCES = """deb {url} {codename} {components}
+deb {url} {codename}-updates {components}
+deb {url}-security {security} {components}
+"""
+# 没有 VERSION_ID 时按代号判断版本（testing/sid 视为最新版本）
+DEBIAN_VERSIONS = {"jessie": 8, "stretch": 9, "buster": 10, "bullseye": 11, "bookworm": 12, "trixie": 13}
+
+def debian_version(distro):
+    if distro["version"].isdigit():
+        return int(distro["version"])
+    return DEBIAN_VERSIONS.get(distro["codename"], max(DEBIAN_VERSIONS.values()))
+
+def debian_sources(url, distro):
+    """Debian 10 及更早的安全更新为 <代号>/updates，11 开始为 <代号>-security；non-free-firmware 从12开始才有"""
+    version = debian_version(distro)
+    codename = distro["codename"]
+    components = "main contrib non-free" + (" non-free-firmware" if version >= 12 else "")
+    security = f"{codename}/updates" if version <= 10 else f"{codename}-security"
+    return DEBIAN_SOURCES.format(url=url, codename=codename, components=components, security=security)
+
+CENTOS_REPO = """[base]
+name=CentOS-{version} - Base
+baseurl={url}/{release}/os/$basearch/
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-{version}
+
+[updates]
+name=CentOS-{version} - Updates
+baseurl={url}/{release}/updates/$basearch/
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-{version}
+
+[extras]
+name=CentOS-{version} - Extras
+baseurl={url}/{release}/extras/$basearch/
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-{version}
+"""
+
+def write_file(path, content):
+    """原文件备份为 .bak 后原子替换"""
+    if os.path.exists(path):
+        shutil.copy2(path, f"{path}.bak")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    print(f"已写入: {path}")
+
+def rewrite_deb822(path, url):
+    """新版 Ubuntu/Debian 的 *.sources 文件只替换 URIs 字段，保留 Suites 和签名配置"""
+    lines = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("URIs:"):
+                suffix = "-security" if line.split()[-1].rstrip("/").endswith("-security") else ""
+                line = f"URIs: {url}{suffix}\n"
+            lines.append(line)
+    write_file(path, "".join(lines))
+
+def write_repo_config(distro, url):
+    """写入选中镜像的仓库配置，返回刷新缓存的命令"""
+    distro_id = distro["id"]
+    if distro_id in ("ubuntu", "debian"):
+        deb822 = f"/etc/apt/sources.list.d/{distro_id}.sources"
+        if os.path.exists(deb822):
+            rewrite_deb822(deb822, url)
+        else:
+            if distro_id == "ubuntu":
+                content = UBUNTU_SOURCES.format(url=url, codename=distro["codename"])
+            else:
+                content = debian_sources(url, distro)
+            write_file("/etc/apt/sources.list", content)
+        return ["apt-get", "update"]
+
+    if distro_id == "rocky":
+        pattern = re.compile(r"^#?baseurl=\S*?(/\$releasever/.*)$", re.M)
+        for path in sorted(glob.glob("/etc/yum.repos.d/[Rr]ocky*.repo")):
+            with open(path, "r") as f:
+                content = f.read()
+            content = re.sub(r"^mirrorlist=", "#mirrorlist=", content, flags=re.M)
+            write_file(path, pattern.sub(lambda m: f"baseurl={url}{m.group(1)}", content))
+        return ["dnf", "makecache"]
+
+    if distro_id == "centos":
+        write_file("/etc/yum.repos.d/CentOS-Base.repo", CENTOS_REPO.format(url=url, version=distro["version"], release=distro["release"]))
+        return ["yum", "makecache", "fast"]
+
+    if distro_id == "alpine":
+        write_file("/etc/apk/repositories",
+                   f"{url}/{distro['branch']}/main\n{url}/{distro['branch']}/community\n")
+        return ["apk", "update"]
+    raise ValueError(f"不支持的发行版: {distro_id}")
+
+# ==================== 输出 ====================
+
+def format_speed(throughput):
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if throughput < 1024 or unit == "MB/s":
+            return f"{throughput:.1f}{unit}"
+        throughput /= 1024
+
+def print_ranking(results):
+    print(f"\n{COLOR_CYAN}=== 镜像测速结果 ==={COLOR_RESET}")
+    print(f"  {'#':>2} {'镜像':<12} {'建连(ms)':>9} {'首字节(ms)':>10} {'速度':>11} {'评分(s)':>8}  地址")
+    for i, r in enumerate(results, 1):
+        if r["error"]:
+            print(f"  {i:>2} {r['name']:<14} {COLOR_RED}失败: {r['error']}{COLOR_RESET}  {r['url']}")
+            continue
+        color = COLOR_GREEN if i == 1 else ""
+        print(f"{color}  {i:>2} {r['name']:<14} {r['connect_ms']:>9.1f} {r['ttfb_ms']:>12.1f} "
+              f"{format_speed(r['throughput']):>11} {r['score']:>9.2f}  {r['url']}{COLOR_RESET if color else ''}")
+
+def parse_mirror(value):
+    name, sep, url = value.partition("=")
+    if not sep or not url.startswith(("http://", "https://")):
+        raise argparse.ArgumentTypeError(f"应为 名称=仓库地址: {value}")
+    return name, url
+
+def main():
+    parser = argparse.ArgumentParser(description="并发测速候选镜像站，选择最快的镜像写入软件源配置")
+    parser.add_argument("--group", choices=GROUPS, default="all", help="候选镜像分组 (默认: all)")
+    parser.add_argument("--mirror", type=parse_mirror, action="append", default=[],
+                        help="自定义候选镜像 名称=仓库地址，指定后只测这些镜像且不使用缓存")
+    parser.add_argument("--metadata-path", help="测速使用的元数据文件路径（相对仓库地址）")
+    parser.add_argument("--distro", choices=sorted(DISTROS), help="发行版，默认自动检测")
+    parser.add_argument("--timeout", type=float, default=5.0, help="单个镜像的超时时间，秒 (默认: 5)")
+    parser.add_argument("--max-bytes", type=int, default=1024 * 1024, help="每个镜像最多下载的字节数 (默认: 1MB)")
+    parser.add_argument("--jobs", "-j", type=int, default=8, help="并发测速数 (默认: 8)")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help=f"测速结果缓存时间，秒 (默认: {DEFAULT_TTL})")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新测速")
+    parser.add_argument("--no-write", action="store_true", help="只测速排名，不修改软件源配置")
+    parser.add_argument("--no-update", action="store_true", help="写入配置后不刷新软件包缓存")
+    parser.add_argument("--json", action="store_true", help="以JSON输出排名结果")
+    args = parser.parse_args()
+
+    distro = detect_distro()
+    if args.distro:
+        distro["id"] = args.distro
+    if distro["id"] not in DISTROS:
+        print(f"{COLOR_RED}[!] 不支持的发行版: {distro['id'] or '未知'}，请使用 --distro 指定{COLOR_RESET}")
+        sys.exit(1)
+    if distro["id"] == "centos":
+        distro["release"] = CENTOS_RELEASES.get(distro["version"], "")
+        if not distro["release"]:
+            print(f"{COLOR_RED}[!] 只支持 CentOS {'/'.join(sorted(CENTOS_RELEASES))}，当前版本: {distro['version'] or '未知'}{COLOR_RESET}")
+            sys.exit(1)
+
+    metadata_path = args.metadata_path or DISTROS[distro["id"]]["metadata"].format(**distro)
+    candidates = args.mirror or candidate_mirrors(distro["id"], args.group, distro["arch"])
+    if not candidates:
+        print(f"{COLOR_RED}[!] 分组 {args.group} 中没有支持 {distro['id']} 的镜像{COLOR_RESET}")
+        sys.exit(1)
+
+    # 同一网段的主机网络条件相近，共享测速结果；自定义镜像（测试用）不读写缓存
+    cache_path = toolreg.state_path(CACHE_NAME)
+    cache = {} if args.mirror else load_cache(cache_path)
+    cache_key = f"{local_subnet()}|{repo_layout(distro['id'], distro['arch'])}|{metadata_path}|{args.group}"
+    entry = cache.get(cache_key)
+    if entry and not args.refresh and time.time() - entry["time"] < args.ttl:
+        results = entry["results"]
+        print(f"使用 {int(time.time() - entry['time'])} 秒前的测速结果（{cache_key.split('|')[0]}），--refresh 重新测速")
+    else:
+        print(f"正在测速 {len(candidates)} 个镜像: {metadata_path}")
+        results = probe_all(candidates, metadata_path, args.timeout, args.max_bytes, args.jobs)
+        # 全部失败多半是网络暂时不通，不缓存
+        if not args.mirror and not results[0]["error"]:
+            cache[cache_key] = {"time": int(time.time()), "results": results}
+            save_cache(cache_path, cache)
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_ranking(results)
+
+    best = results[0]
+    if best["error"]:
+        print(f"{COLOR_RED}[!] 所有镜像都不可用{COLOR_RESET}")
+        sys.exit(1)
+    print(f"\n{COLOR_GREEN}最快的镜像: {best['name']} ({best['url']}){COLOR_RESET}")
+    if args.no_write:
+        return
+
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 写入软件源配置需要root权限，可使用 --no-write 只测速{COLOR_RESET}")
+        sys.exit(1)
+    update_cmd = write_repo_config(distro, best["url"])
+    if not args.no_update:
+        print(f"{COLOR_YELLOW}刷新软件包缓存: {' '.join(update_cmd)}{COLOR_RESET}")
+        sys.exit(subprocess.run(update_cmd).returncode)
+
+if __name__ == "__main__":
+    main()
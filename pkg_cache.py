@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+import argparse
+import functools
+import glob
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import toolreg
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INIT_SCRIPT = os.path.join(BASE_DIR, "init2.0.sh")
+
+# 局域网软件包缓存地址，优先级：环境变量 > 配置文件 > 自动探测；INIT_PKG_CACHE=off 表示禁用
+CACHE_ENV = "INIT_PKG_CACHE"
+CONFIG_FILE = "/etc/init_scripts/pkg-cache"
+# 自动探测的主机名和端口（apt-cacher-ng 默认3142，squid 默认3128）
+CANDIDATE_HOSTS = ["pkg-cache", "apt-cacher"]
+CANDIDATE_PORTS = [3142, 3128]
+# 默认网关只探测apt-cacher-ng端口；网关的3128多为公司上网代理而不是软件包缓存，INIT_PKG_CACHE_GATEWAY=1 时才使用
+GATEWAY_ENV = "INIT_PKG_CACHE_GATEWAY"
+GATEWAY_PORTS = [3142]
+PROBE_TIMEOUT = 0.3
+
+# 各包管理器的代理配置文件，由本脚本写入和删除
+APT_PROXY_CONF = "/etc/apt/apt.conf.d/01init-scripts-proxy"
+YUM_CONF = {"dnf": "/etc/dnf/dnf.conf", "yum": "/etc/yum.conf"}
+APT_ARCHIVES = "/var/cache/apt/archives"
+
+# ==================== 探测 ====================
+
+def default_gateway():
+    """从 /proc/net/route 读取默认网关"""
+    try:
+        with open("/proc/net/route", "r") as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[1] == "00000000" and int(fields[3], 16) & 2:
+                    return socket.inet_ntoa(int(fields[2], 16).to_bytes(4, "little"))
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+def port_open(host, port, timeout=PROBE_TIMEOUT):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def read_config():
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+@functools.lru_cache(maxsize=None)
+def detect():
+    """返回缓存代理地址如 http://10.0.0.2:3142，没有可用缓存时返回None（每个进程只探测一次）"""
+    configured = os.environ.get(CACHE_ENV) or read_config()
+    if configured == "off":
+        return None
+    if configured:
+        url = configured if "://" in configured else f"http://{configured}"
+        parsed = urlsplit(url)
+        return url.rstrip("/") if port_open(parsed.hostname, parsed.port or 80) else None
+
+    candidates = [(host, port) for host in CANDIDATE_HOSTS for port in CANDIDATE_PORTS]
+    gateway = default_gateway()
+    if gateway:
+        ports = CANDIDATE_PORTS if os.environ.get(GATEWAY_ENV) in ("1", "yes", "on") else GATEWAY_PORTS
+        candidates += [(gateway, port) for port in ports]
+    for host, port in candidates:
+        if port_open(host, port):
+            return f"http://{host}:{port}"
+    return None
+
+def package_manager():
+    registry = toolreg.get_registry()
+    for name in ("apt-get", "dnf", "yum", "apk"):
+        if registry.lookup(name, version_args=None):
+            return name
+    return None
+
+# ==================== 代理配置 ====================
+
+def write_file(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def yum_proxy(path):
+    """读取 [main] 段的 proxy= 设置"""
+    section = None
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("["):
+                    section = line.strip().strip("[] ")
+                elif section == "main":
+                    match = re.match(r"^\s*proxy\s*=\s*(\S*)", line)
+                    if match:
+                        return match.group(1)
+    except OSError:
+        pass
+    return None
+
+def set_yum_proxy(path, url):
+    """在 [main] 段设置或删除 proxy=，url为None时删除"""
+    try:
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = ["[main]"]
+    if url and "[main]" not in lines:
+        lines.insert(0, "[main]")
+    section = None
+    result = []
+    for line in lines:
+        if line.startswith("["):
+            section = line.strip("[] ")
+            result.append(line)
+            if section == "main" and url:
+                result.append(f"proxy={url}")
+            continue
+        if section == "main" and re.match(r"^\s*proxy\s*=", line):
+            continue
+        result.append(line)
+    write_file(path, "\n".join(result) + "\n")
+
+def enable(url, manager):
+    """配置包管理器经缓存代理下载；apk没有配置文件，通过环境变量传入"""
+    if manager == "apt-get":
+        # apt-cacher-ng 无法缓存HTTPS，HTTPS源直连
+        write_file(APT_PROXY_CONF, f'Acquire::http::Proxy "{url}";\nAcquire::https::Proxy "DIRECT";\n')
+    elif manager in YUM_CONF:
+        set_yum_proxy(YUM_CONF[manager], url)
+    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
+    write_file(CONFIG_FILE, url + "\n")
+
+def remove_proxy(manager, only=None):
+    """删除本脚本写入的代理配置，only 指定时只删除指向该地址的yum代理，返回是否有修改"""
+    if manager == "apt-get" and os.path.exists(APT_PROXY_CONF):
+        os.remove(APT_PROXY_CONF)
+        return True
+    if manager in YUM_CONF:
+        current = yum_proxy(YUM_CONF[manager])
+        if current and (only is None or current.rstrip("/") == only.rstrip("/")):
+            set_yum_proxy(YUM_CONF[manager], None)
+            return True
+    return False
+
+def disable(manager):
+    remove_proxy(manager)
+    if os.path.isdir(os.path.dirname(CONFIG_FILE)):
+        write_file(CONFIG_FILE, "off\n")
+
+def remove_stale(manager):
+    """已配置的缓存无法连接时删除代理配置，否则之后的 apt/yum 全部失败；保留配置文件，缓存恢复后再次启用"""
+    configured = read_config()
+    if not configured or configured == "off":
+        return False
+    url = configured if "://" in configured else f"http://{configured}"
+    return remove_proxy(manager, url)
+
+def proxy_env(url):
+    env = os.environ.copy()
+    if url:
+        env["http_proxy"] = env["HTTP_PROXY"] = url
+    return env
+
+def https_sources(manager):
+    """返回使用HTTPS的软件源文件，经代理的HTTPS请求无法被缓存"""
+    patterns = {
+        "apt-get": ["/etc/apt/sources.list", "/etc/apt/sources.list.d/*"],
+        "dnf": ["/etc/yum.repos.d/*.repo"],
+        "yum": ["/etc/yum.repos.d/*.repo"],
+        "apk": ["/etc/apk/repositories"],
+    }.get(manager, [])
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path, "r") as f:
+                    if re.search(r"^(?!\s*#).*https://", f.read(), re.M):
+                        found.append(path)
+            except OSError:
+                continue
+    return found
+
+# ==================== 解析和下载 ====================
+
+def resolve_urls(manager, packages, env):
+    """返回 [(url, 文件名)]，包括尚未安装的依赖"""
+    if manager == "apt-get":
+        result = subprocess.run(
+            ["apt-get", "install", "--print-uris", "-qq", "-y"] + packages,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env
+        )
+        if result.returncode != 0:
+            return None
+        # 输出格式: 'url' 文件名 大小 哈希
+        return [(m.group(1), m.group(2)) for m in re.finditer(r"^'(\S+)' (\S+) ", result.stdout, re.M)]
+
+    if manager in YUM_CONF:
+        if manager == "dnf":
+            cmd = ["dnf", "download", "--urls", "--resolve", "-q"] + packages
+        elif toolreg.get_registry().lookup("yumdownloader", version_args=None):
+            cmd = ["yumdownloader", "--urls", "--resolve", "-q"] + packages
+        else:
+            return None
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env)
+        if result.returncode != 0:
+            return None
+        urls = [line.strip() for line in result.stdout.splitlines() if line.strip().endswith(".rpm")]
+        return [(url, os.path.basename(urlsplit(url).path)) for url in urls]
+    return None
+
+def cache_status(headers):
+    """根据响应头判断是否命中缓存：squid/nginx/varnish 的 X-Cache 系列头，或 Age > 0"""
+    for name in ("X-Cache-Status", "X-Cache", "X-Cache-Lookup"):
+        value = (headers.get(name) or "").upper()
+        if "HIT" in value:
+            return "hit"
+        if "MISS" in value or "EXPIRED" in value:
+            return "miss"
+    try:
+        if int(headers.get("Age", "0")) > 0:
+            return "hit"
+    except ValueError:
+        pass
+    return "unknown"
+
+def fetch(url, dest, proxy, timeout=300):
+    """经缓存代理下载一个文件，返回 (状态, 字节数)"""
+    if url.startswith("https://"):
+        return "https", 0
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({"http": proxy} if proxy else {}))
+    tmp_path = f"{dest}.part" if dest else None
+    try:
+        with opener.open(urllib.request.Request(url, headers={"User-Agent": "init_scripts-pkg-cache"}),
+                         timeout=timeout) as response:
+            status = cache_status(response.headers)
+            size = 0
+            out = open(tmp_path, "wb") if tmp_path else None
+            try:
+                for chunk in iter(lambda: response.read(1024 * 1024), b""):
+                    size += len(chunk)
+                    if out:
+                        out.write(chunk)
+            finally:
+                if out:
+                    out.close()
+        if tmp_path:
+            os.replace(tmp_path, dest)
+        return status, size
+    except OSError as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return f"error: {e}", 0
+
+def fetch_all(items, dest_dir, proxy, jobs=4):
+    """并发下载，返回统计 {hit, miss, unknown, https, error, bytes, files}"""
+    stats = {"hit": 0, "miss": 0, "unknown": 0, "https": 0, "error": 0, "bytes": 0, "files": []}
+    if dest_dir:
+        os.makedirs(dest_dir, exist_ok=True)
+
+    def work(item):
+        url, name = item
+        dest = os.path.join(dest_dir, name) if dest_dir else None
+        return dest, fetch(url, dest, proxy)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for dest, (status, size) in pool.map(work, items):
+            if status.startswith("error"):
+                stats["error"] += 1
+                print(f"{COLOR_RED}[!] 下载失败 {os.path.basename(dest or '')}: {status}{COLOR_RESET}")
+                continue
+            stats[status] += 1
+            stats["bytes"] += size
+            if dest and status != "https":
+                stats["files"].append(dest)
+    return stats
+
+def print_stats(stats, elapsed, proxy):
+    """命中率只按返回了 X-Cache/Age 的文件计算；apt-cacher-ng 不返回这些头，此时标为未测量"""
+    known = stats["hit"] + stats["miss"]
+    if not known:
+        ratio = "未测量"
+    elif stats["unknown"]:
+        ratio = f"{stats['hit'] / known * 100:.0f}%（仅 {known} 个文件可判断）"
+    else:
+        ratio = f"{stats['hit'] / known * 100:.0f}%"
+    print(f"{COLOR_CYAN}缓存命中率: {ratio} (命中 {stats['hit']}，未命中 {stats['miss']}，"
+          f"无法判断 {stats['unknown']}，HTTPS未缓存 {stats['https']}，失败 {stats['error']})，"
+          f"下载 {stats['bytes'] / 1024 / 1024:.1f}MB，耗时 {elapsed:.1f}s{COLOR_RESET}")
+    if stats["unknown"]:
+        print(f"{COLOR_YELLOW}[提示] 缓存服务器未返回命中信息，apt-cacher-ng 的统计见 {proxy}/acng-report.html{COLOR_RESET}")
+
+# ==================== 安装 ====================
+
+def install(packages, url=None, manager=None):
+    """经缓存代理安装软件包并报告命中率；没有可用缓存或无法预取时返回False，由调用方按原方式安装"""
+    url = url or detect()
+    manager = manager or package_manager()
+    if not url or not manager or not packages:
+        return False
+    enable(url, manager)
+    env = proxy_env(url)
+    print(f"使用局域网软件包缓存: {url}")
+
+    # 无法解析下载地址（有包不存在、缺少 dnf download 插件等）时由调用方逐个安装，代理配置已生效
+    items = resolve_urls(manager, packages, env)
+    if items is None:
+        return False
+
+    start = time.time()
+    dest_dir = APT_ARCHIVES if manager == "apt-get" else tempfile.mkdtemp(prefix="pkg-cache-", dir="/tmp")
+    try:
+        stats = fetch_all(items, dest_dir, url)
+        print_stats(stats, time.time() - start, url)
+        if manager == "apt-get" or stats["error"] or stats["https"] or not stats["files"]:
+            # apt 从 archives 目录使用预取的deb并校验哈希；HTTPS源的包没有预取，按包名安装才不会漏装
+            cmd = install_command(manager, packages)
+        else:
+            cmd = install_command(manager, stats["files"])
+        return subprocess.run(cmd, env=env).returncode == 0
+    finally:
+        if dest_dir != APT_ARCHIVES:
+            shutil.rmtree(dest_dir, ignore_errors=True)
+
+def install_command(manager, packages):
+    if manager == "apk":
+        return ["apk", "add"] + packages
+    return [manager, "install", "-y"] + packages
+
+def os_id():
+    try:
+        with open("/etc/os-release", "r") as f:
+            for line in f:
+                if line.startswith("ID="):
+                    return line.split("=", 1)[1].strip().strip('"').lower()
+    except FileNotFoundError:
+        pass
+    return ""
+
+def suggested_packages(manager):
+    """读取 init2.0.sh 中对应发行版安装函数的软件包列表"""
+    if manager == "apt-get":
+        function = "debian_install_package" if os_id() == "debian" else "ubuntu_install_package"
+    elif manager in YUM_CONF:
+        function = "centos_install_package"
+    else:
+        return []
+    try:
+        with open(INIT_SCRIPT, "r") as f:
+            content = f.read()
+    except OSError:
+        return []
+    match = re.search(rf"^{function}\(\) \{{\n\s*local packages=\(([^)]*)\)", content, re.M)
+    return list(dict.fromkeys(re.findall(r'"([^"]+)"', match.group(1)))) if match else []
+
+def warm(url, manager, packages):
+    """在一台主机上经缓存代理刷新元数据并下载软件包（不安装），预热缓存供其他主机使用"""
+    enable(url, manager)
+    env = proxy_env(url)
+    refresh = {"apt-get": ["apt-get", "update"], "dnf": ["dnf", "makecache"],
+               "yum": ["yum", "makecache", "fast"], "apk": ["apk", "update"]}[manager]
+    print(f"刷新软件源元数据: {' '.join(refresh)}")
+    subprocess.run(refresh, env=env, check=True)
+
+    start = time.time()
+    items = []
+    for package in packages:
+        # 逐个解析，仓库中不存在的包不影响其他包
+        resolved = resolve_urls(manager, [package], env) or []
+        items += [item for item in resolved if item not in items]
+    if manager == "apt-get":
+        # --print-uris 不列出已安装的包，使用 apt-get download 的地址补齐
+        result = subprocess.run(["apt-get", "download", "--print-uris", "-qq"] + packages,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env)
+        for m in re.finditer(r"^'(\S+)' (\S+) ", result.stdout, re.M):
+            if (m.group(1), m.group(2)) not in items:
+                items.append((m.group(1), m.group(2)))
+    if not items:
+        print(f"{COLOR_YELLOW}没有需要预热的软件包{COLOR_RESET}")
+        return True
+    print(f"预热 {len(items)} 个软件包文件")
+    stats = fetch_all(items, None, url)
+    print_stats(stats, time.time() - start, url)
+    return not stats["error"]
+
+def main():
+    parser = argparse.ArgumentParser(description="局域网软件包缓存（apt-cacher-ng/squid等HTTP代理）集成")
+    parser.add_argument("--url", help=f"缓存代理地址，如 http://10.0.0.2:3142 (默认: ${CACHE_ENV}、{CONFIG_FILE} 或自动探测)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="显示探测到的缓存和当前配置")
+    subparsers.add_parser("enable", help="配置包管理器使用缓存代理")
+    subparsers.add_parser("disable", help="删除代理配置并禁用自动探测")
+    warm_parser = subparsers.add_parser("warm", help="在一台主机上预热缓存")
+    warm_parser.add_argument("packages", nargs="*", help="要预热的软件包 (默认: init2.0.sh 的建议软件包)")
+    install_parser = subparsers.add_parser("install", help="经缓存安装软件包并报告命中率")
+    install_parser.add_argument("packages", nargs="+")
+    args = parser.parse_args()
+
+    manager = package_manager()
+    if args.command == "status":
+        url = args.url or detect()
+        print(f"包管理器: {manager or '未知'}")
+        print(f"缓存代理: {url or '未找到'}")
+        print(f"配置文件: {read_config() or '无'}")
+        for path in https_sources(manager):
+            print(f"{COLOR_YELLOW}[提示] {path} 使用HTTPS源，经代理时无法缓存{COLOR_RESET}")
+        return
+
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 请使用root用户运行{COLOR_RESET}")
+        sys.exit(1)
+    if not manager:
+        print(f"{COLOR_RED}[!] 未找到支持的包管理器{COLOR_RESET}")
+        sys.exit(1)
+
+    if args.command == "disable":
+        disable(manager)
+        print("已删除缓存代理配置")
+        return
+
+    url = args.url or detect()
+    if not url:
+        # 退出码3表示没有可用缓存，init2.0.sh 据此回退到直接安装
+        print(f"{COLOR_YELLOW}未找到局域网软件包缓存{COLOR_RESET}")
+        if remove_stale(manager):
+            print(f"{COLOR_YELLOW}已配置的缓存代理 {read_config()} 无法连接，已删除 {manager} 的代理配置{COLOR_RESET}")
+        sys.exit(3)
+
+    if args.command == "enable":
+        enable(url, manager)
+        print(f"已配置 {manager} 使用缓存代理: {url}")
+        for path in https_sources(manager):
+            print(f"{COLOR_YELLOW}[提示] {path} 使用HTTPS源，经代理时无法缓存{COLOR_RESET}")
+    elif args.command == "warm":
+        packages = args.packages or suggested_packages(manager)
+        sys.exit(0 if warm(url, manager, packages) else 1)
+    elif args.command == "install":
+        sys.exit(0 if install(args.packages, url, manager) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+# 本仓库写入启动文件的配置块：(块名, 开始标记, 结束标记)
+# 结束标记为None时表示块到下一个顶层 fi 为止
+BLOCK_MARKERS = [
+    ("fastfetch", re.compile(r"^# ==== 由FastFetch安装脚本添加 ===="), re.compile(r"^# ==== 结束FastFetch配置 ====")),
+    ("alpine-fetch", re.compile(r"^# Alpine Fetch Hook"), None),
+    (None, re.compile(r"^# ==== init_scripts: (\S+) ===="), re.compile(r"^# ==== end init_scripts: \S+ ====")),
+]
+
+# 旧版本 init2.0.sh 写入的没有标记的单行配置
+LINE_PATTERNS = [
+    ("neofetch", re.compile(r"neofetch \| lolcat")),
+    ("aliases", re.compile(r"^alias (scandisk|cdnet|cdrepo)=")),
+    ("ps1", re.compile(r"^PS1='\\\[\\e\[32;1m\\\]")),
+]
+
+# 跟踪行格式：嵌套层级、时间戳、源文件、行号、命令
+# 必须使用真实的制表符，PS4中的 \t 会被bash展开为当前时间
+PS4 = "+\t${EPOCHREALTIME:-$(date +%s.%N)}\t${BASH_SOURCE}\t${LINENO}\t"
+TRACE_LINE = re.compile(r"^(\++)\t(\d+(?:[.,]\d+)?)\t([^\t]*)\t(\d+)\t(.*)$")
+
+# 在一个干净的bash中按登录shell的顺序加载启动文件，并把跟踪输出写到fd 9
+LOGIN_WRAPPER = """PS4='{ps4}'
+BASH_XTRACEFD=9
+set -x
+if [ -r /etc/profile ]; then . /etc/profile; fi
+for __startup in ~/.bash_profile ~/.bash_login ~/.profile; do
+    if [ -r "$__startup" ]; then . "$__startup"; break; fi
+done
+set +x
+"""
+
+def build_wrapper(trace_target):
+    """trace_target 为本地跟踪文件路径，None表示写到标准错误（远程模式）"""
+    if trace_target:
+        redirect = f"exec 9>{shlex.quote(trace_target)} >/dev/null 2>&1\n"
+    else:
+        redirect = "exec 9>&2 >/dev/null 2>/dev/null\n"
+    return redirect + LOGIN_WRAPPER.format(ps4=PS4)
+
+def shell_command(interactive):
+    cmd = ["bash", "--noprofile", "--norc"]
+    if interactive:
+        cmd.append("-i")
+    return cmd
+
+def trace_local(interactive):
+    """在本机跟踪一次登录shell，返回 (跟踪文本, 结束时间戳, 总耗时)"""
+    fd, trace_path = tempfile.mkstemp(prefix="login-trace-")
+    os.close(fd)
+    try:
+        start = time.time()
+        subprocess.run(
+            shell_command(interactive) + ["-c", build_wrapper(trace_path)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=300
+        )
+        end = time.time()
+        with open(trace_path, "r", errors="replace") as f:
+            return f.read(), end, end - start
+    finally:
+        os.remove(trace_path)
+
+def trace_remote(host, interactive, ssh_options):
+    """通过ssh在远程主机跟踪登录shell，跟踪输出经标准错误返回"""
+    remote_cmd = " ".join(shlex.quote(arg) for arg in shell_command(interactive) + ["-c", build_wrapper(None)])
+    start = time.time()
+    result = subprocess.run(
+        ["ssh", "-T"] + ssh_options + [host, remote_cmd],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        timeout=300
+    )
+    elapsed = time.time() - start
+    if result.returncode == 255:
+        print(f"{COLOR_RED}[!] SSH连接失败: {result.stderr.strip()}{COLOR_RESET}")
+        sys.exit(1)
+    # 远程主机时钟与本机不同，最后一条命令的耗时无法计算
+    return result.stderr, None, elapsed
+
+def read_source(path, host, ssh_options):
+    try:
+        if host:
+            result = subprocess.run(
+                ["ssh", "-T"] + ssh_options + [host, f"cat {shlex.quote(path)}"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                errors="replace",
+                timeout=30
+            )
+            return result.stdout.splitlines() if result.returncode == 0 else []
+        with open(path, "r", errors="replace") as f:
+            return f.read().splitlines()
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+
+def map_blocks(lines):
+    """返回 {行号: 块名}，只包含属于已标记配置块的行"""
+    blocks = {}
+    current, end_marker = None, None
+    for lineno, line in enumerate(lines, 1):
+        if current:
+            blocks[lineno] = current
+            if (end_marker and end_marker.match(line)) or (end_marker is None and line.rstrip() == "fi"):
+                current = None
+            continue
+
+        for name, start_marker, end in BLOCK_MARKERS:
+            match = start_marker.match(line)
+            if match:
+                current = name or match.group(1)
+                end_marker = end
+                blocks[lineno] = current
+                break
+        else:
+            for name, pattern in LINE_PATTERNS:
+                if pattern.search(line):
+                    blocks[lineno] = name
+                    break
+    return blocks
+
+def parse_trace(text):
+    events = []
+    for line in text.splitlines():
+        match = TRACE_LINE.match(line)
+        if match:
+            events.append((
+                float(match.group(2).replace(",", ".")),
+                match.group(3),
+                int(match.group(4)),
+                match.group(5)
+            ))
+    return events
+
+def build_report(events, end_time, total, host, ssh_options):
+    """把每条命令到下一条命令之间的时间计入所在文件和配置块"""
+    sources = {}
+    entries = {}
+    files = {}
+    for i, (stamp, source, lineno, command) in enumerate(events):
+        if i + 1 < len(events):
+            duration = events[i + 1][0] - stamp
+        else:
+            duration = end_time - stamp if end_time else 0.0
+        duration = max(duration, 0.0)
+
+        # 包装脚本自身的命令没有 BASH_SOURCE，按实际被加载的文件统计
+        if not source:
+            continue
+        if source not in sources:
+            sources[source] = map_blocks(read_source(source, host, ssh_options))
+        block = sources[source].get(lineno)
+        key = f"{source}:{block}" if block else source
+
+        entry = entries.setdefault(key, {
+            "key": key, "file": source, "block": block,
+            "seconds": 0.0, "commands": 0, "slowest": "", "slowest_seconds": 0.0
+        })
+        entry["seconds"] += duration
+        entry["commands"] += 1
+        if duration > entry["slowest_seconds"]:
+            entry["slowest_seconds"] = duration
+            entry["slowest"] = f"{lineno}: {command[:80]}"
+        files[source] = files.get(source, 0.0) + duration
+
+    return {
+        "host": host or socket.gethostname(),
+        "created": int(time.time()),
+        "total_seconds": total,
+        "traced_seconds": sum(files.values()),
+        "entries": sorted(entries.values(), key=lambda e: e["seconds"], reverse=True),
+        "files": files
+    }
+
+def print_report(report, top):
+    print(f"\n{COLOR_CYAN}=== 登录耗时分析: {report['host']} ==={COLOR_RESET}")
+    print(f"登录shell总耗时: {report['total_seconds'] * 1000:.1f} ms，"
+          f"其中启动文件: {report['traced_seconds'] * 1000:.1f} ms")
+
+    print(f"\n{COLOR_YELLOW}最慢的 {top} 项:{COLOR_RESET}")
+    print(f"{'耗时(ms)':>10} {'占比':>6} {'命令数':>6}  条目 / 最慢命令")
+    total = report["total_seconds"] or 1.0
+    for entry in report["entries"][:top]:
+        print(f"{entry['seconds'] * 1000:>10.1f} {entry['seconds'] / total * 100:>5.1f}% {entry['commands']:>6}  {entry['key']}")
+        if entry["slowest"]:
+            print(f"{'':>26}└ {entry['slowest']}")
+
+    print(f"\n{COLOR_YELLOW}按文件汇总:{COLOR_RESET}")
+    for path, seconds in sorted(report["files"].items(), key=lambda item: item[1], reverse=True):
+        print(f"{seconds * 1000:>10.1f}  {path}")
+
+def compare_reports(left, right, top):
+    print(f"\n{COLOR_CYAN}=== 登录耗时对比: {left['host']} vs {right['host']} ==={COLOR_RESET}")
+    print(f"总耗时: {left['total_seconds'] * 1000:.1f} ms vs {right['total_seconds'] * 1000:.1f} ms")
+
+    left_entries = {e["key"]: e["seconds"] for e in left["entries"]}
+    right_entries = {e["key"]: e["seconds"] for e in right["entries"]}
+    keys = set(left_entries) | set(right_entries)
+    rows = sorted(
+        keys,
+        key=lambda k: abs(right_entries.get(k, 0.0) - left_entries.get(k, 0.0)),
+        reverse=True
+    )
+
+    print(f"\n{left['host'][:12]:>12} {right['host'][:12]:>12} {'差值':>10}  条目 (ms)")
+    for key in rows[:top]:
+        a = left_entries.get(key, 0.0) * 1000
+        b = right_entries.get(key, 0.0) * 1000
+        color = COLOR_RED if b - a > 0 else COLOR_GREEN
+        print(f"{a:>12.1f} {b:>12.1f} {color}{b - a:>+10.1f}{COLOR_RESET}  {key}")
+
+def load_report(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"{COLOR_RED}[!] 无法读取报告 {path}: {e}{COLOR_RESET}")
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="分析登录shell各启动文件和配置块的耗时")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="跟踪一次登录shell并输出耗时报告")
+    run_parser.add_argument("--host", help="通过ssh分析远程主机，如 root@10.0.0.1")
+    run_parser.add_argument("--ssh-option", "-o", action="append", default=[], help="传给ssh的 -o 选项，可多次指定")
+    run_parser.add_argument("--no-interactive", action="store_true", help="以非交互shell运行（默认模拟交互式SSH登录）")
+    run_parser.add_argument("--top", type=int, default=10, help="显示最慢的N项 (默认: 10)")
+    run_parser.add_argument("--json", help="将报告保存为JSON，便于对比不同主机")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两份JSON报告")
+    compare_parser.add_argument("left")
+    compare_parser.add_argument("right")
+    compare_parser.add_argument("--top", type=int, default=15, help="显示差异最大的N项 (默认: 15)")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare_reports(load_report(args.left), load_report(args.right), args.top)
+        return
+
+    ssh_options = [item for option in args.ssh_option for item in ("-o", option)]
+    interactive = not args.no_interactive
+    if args.host:
+        text, end_time, total = trace_remote(args.host, interactive, ssh_options)
+    else:
+        text, end_time, total = trace_local(interactive)
+
+    events = parse_trace(text)
+    if not events:
+        print(f"{COLOR_RED}[!] 未采集到跟踪数据，请确认目标主机使用bash{COLOR_RESET}")
+        sys.exit(1)
+
+    report = build_report(events, end_time, total, args.host, ssh_options)
+    print_report(report, args.top)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n报告已保存: {args.json}")
+
+if __name__ == "__main__":
+    main()
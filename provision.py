@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import hashlib
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import journal
+import toolreg
+import tracing
+import vm_tune
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_BLUE = "\033[1;34m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INIT_SCRIPT = os.path.join(BASE_DIR, "init2.0.sh")
+LOG_ROOT = "/var/log/init_scripts"
+
+# 任务状态
+STATUS_OK = "完成"
+STATUS_UNCHANGED = "未变化"
+STATUS_SATISFIED = "已满足"
+STATUS_NOT_APPLICABLE = "不适用"
+STATUS_FAILED = "失败"
+STATUS_BLOCKED = "未执行"
+
+class Task:
+    """一个配置步骤：action 执行配置，check 返回True表示目标状态已满足可以跳过
+
+    outputs 为步骤写入的文件（列表或以ctx为参数的函数），state 返回步骤产生的非文件状态，
+    params 为影响执行结果的ctx字段，这三者和action的源码一起记入执行记录。
+    """
+
+    def __init__(self, name, description, action, deps=(), check=None, when=None, locks=(),
+                 outputs=(), state=None, params=()):
+        self.name = name
+        self.description = description
+        self.action = action
+        self.deps = tuple(deps)
+        self.check = check
+        self.when = when
+        # 共享同一资源（包管理器、同一个配置文件）的任务互斥执行
+        self.locks = tuple(locks)
+        self.outputs = outputs
+        self.state = state
+        self.params = tuple(params)
+
+    def output_files(self, ctx):
+        return list(self.outputs(ctx) if callable(self.outputs) else self.outputs)
+
+    def inputs_hash(self, ctx):
+        fingerprint = getattr(self.action, "fingerprint", None)
+        return journal.inputs_hash({
+            "action": fingerprint(ctx) if fingerprint else self.action.__name__,
+            "params": {key: ctx[key] for key in self.params}
+        })
+
+    def current_state(self, ctx):
+        return self.state(ctx) if self.state else None
+
+class TaskResult:
+    def __init__(self, name, status, elapsed=0.0, detail=""):
+        self.name = name
+        self.status = status
+        self.elapsed = elapsed
+        self.detail = detail
+
+# ==================== 系统信息 ====================
+
+def detect_os():
+    """返回 (ID, 主版本号)，读取 /etc/os-release"""
+    info = {}
+    try:
+        with open("/etc/os-release", "r") as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                info[key] = value.strip('"')
+    except FileNotFoundError:
+        pass
+    return info.get("ID", "").lower(), info.get("VERSION_ID", "").split(".")[0]
+
+def read_text(path):
+    try:
+        with open(os.path.expanduser(path), "r", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def command_ok(cmd):
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+# ==================== 动作 ====================
+
+def shell_function_source(function):
+    """提取 init2.0.sh 中函数的源码，函数被修改后对应步骤会重新执行"""
+    lines = read_text(INIT_SCRIPT).splitlines()
+    header = re.compile(rf"^{re.escape(function)}\s*\(\)")
+    for i, line in enumerate(lines):
+        if header.match(line):
+            for j in range(i + 1, len(lines)):
+                if lines[j].rstrip() == "}":
+                    return "\n".join(lines[i:j + 1])
+            return "\n".join(lines[i:])
+    return function
+
+def shell_action(function, env=None):
+    """调用 init2.0.sh 中的函数，function 和 env 可以是以ctx为参数的函数"""
+    def resolve(ctx):
+        return function(ctx) if callable(function) else function
+    def action(ctx, log):
+        run_logged(["bash", INIT_SCRIPT, resolve(ctx)], log, env(ctx) if env else None)
+    action.fingerprint = lambda ctx: shell_function_source(resolve(ctx))
+    return action
+
+def python_action(script, *args):
+    """调用本仓库中的Python脚本"""
+    path = os.path.join(BASE_DIR, script)
+    def action(ctx, log):
+        run_logged([sys.executable, path] + list(args), log)
+    action.fingerprint = lambda ctx: [hashlib.sha256(read_text(path).encode()).hexdigest()] + list(args)
+    return action
+
+def run_logged(cmd, log, env=None):
+    log.write(f"$ {' '.join(cmd)}\n")
+    log.flush()
+    result = subprocess.run(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        env=dict(os.environ, **(env or {}))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"命令退出码 {result.returncode}: {' '.join(cmd)}")
+
+def repo_function(ctx):
+    """根据发行版和版本选择 init2.0.sh 中对应的软件源配置函数"""
+    return {
+        ("centos", "6"): "centos6_make_yum_repo",
+        ("centos", "7"): "centos7_make_yum_repo",
+        ("rocky", "8"): "Rocky8_make_yum_repo",
+        ("ubuntu", "18"): "Ubuntu18_make_yum_repo",
+        ("ubuntu", "20"): "Ubuntu20_make_yum_repo",
+    }.get((ctx["os_id"], ctx["os_version"]))
+
+def repo_files(ctx):
+    """软件源配置函数写入的文件"""
+    function = repo_function(ctx) or ""
+    if function.startswith("Ubuntu"):
+        return ["/etc/apt/source.list"]
+    if function.startswith("Rocky"):
+        return sorted(glob.glob("/etc/yum.repos.d/Rocky-*.repo"))
+    return ["/etc/yum.repos.d/CentOS-Base.repo"]
+
+# ==================== 检查 ====================
+
+def firewall_disabled(ctx):
+    if command_ok(["systemctl", "is-active", "--quiet", "firewalld"]):
+        return False
+    selinux = read_text("/etc/selinux/config")
+    return not selinux or "SELINUX=enforcing" not in selinux
+
+def vm_tuned(ctx):
+    return vm_tune.is_applied(ctx["vm_profile"])
+
+def hostname_set(ctx):
+    return socket.gethostname() == ctx["hostname"]
+
+def vimrc_configured(ctx):
+    return "func SetTitle()" in read_text("~/.vimrc")
+
+def alias_configured(ctx):
+    return "alias cdrepo=" in read_text("~/.bashrc")
+
+def ps1_configured(ctx):
+    return "init_scripts: ps1" in read_text("/root/.bashrc")
+
+def repo_configured(ctx):
+    function = repo_function(ctx)
+    if function.startswith("Ubuntu"):
+        return "repo.huaweicloud.com" in read_text("/etc/apt/source.list")
+    if function.startswith("Rocky"):
+        return any(
+            "mirrors.aliyun.com/rockylinux" in read_text(f"/etc/yum.repos.d/{name}")
+            for name in os.listdir("/etc/yum.repos.d") if name.startswith("Rocky-")
+        )
+    mirror = "mirrors.aliyun.com" if ctx["os_version"] == "6" else "repo.huaweicloud.com"
+    return mirror in read_text("/etc/yum.repos.d/CentOS-Base.repo")
+
+# 建议软件包中的代表性命令，全部存在时视为已安装
+PACKAGE_PROBES = ["sudo", "vim", "curl", "wget", "jq", "tree", "htop", "git", "tcpdump", "unzip"]
+
+def packages_installed(ctx):
+    registry = toolreg.get_registry()
+    return all(registry.lookup(name, version_args=None) for name in PACKAGE_PROBES)
+
+def fastfetch_deps_installed(ctx):
+    registry = toolreg.get_registry()
+    return all(registry.lookup(name, version_args=None) for name in ("git", "g++", "cmake", "make"))
+
+def fastfetch_configured(ctx):
+    return bool(toolreg.get_registry().lookup("fastfetch")) and "由FastFetch安装脚本添加" in read_text("/etc/profile")
+
+def docker_installed(ctx):
+    return bool(toolreg.get_registry().lookup("docker"))
+
+def firewall_state(ctx):
+    return "active" if command_ok(["systemctl", "is-active", "--quiet", "firewalld"]) else "inactive"
+
+def swap_state(ctx):
+    return read_text("/proc/swaps")
+
+def tool_state(name):
+    return lambda ctx: toolreg.get_registry().lookup(name, version_args=None) or ""
+
+# ==================== 任务定义 ====================
+
+def is_rhel_family(ctx):
+    return ctx["os_id"] in ("centos", "rhel", "rocky", "almalinux", "fedora")
+
+TASKS = [
+    Task("firewall", "永久关闭防火墙和SELinux", shell_action("disable_firewalld_selinux"),
+         check=firewall_disabled, when=is_rhel_family,
+         outputs=["/etc/selinux/config"], state=firewall_state),
+    Task("swap", "内存和VM调优（默认k8s配置，禁用SWAP）",
+         shell_action("set_swap", env=lambda ctx: {"INIT_VM_PROFILE": ctx["vm_profile"]}),
+         check=vm_tuned, locks=("fstab",), params=("vm_profile",),
+         outputs=["/etc/fstab", vm_tune.SYSCTL_DROPIN, vm_tune.THP_TMPFILES], state=swap_state),
+    Task("hostname", "配置主机名",
+         shell_action("set_host_name", env=lambda ctx: {"INIT_HOSTNAME": ctx["hostname"]}),
+         check=hostname_set, when=lambda ctx: bool(ctx["hostname"]),
+         outputs=["/etc/hostname"], state=lambda ctx: socket.gethostname(), params=("hostname",)),
+    Task("vimrc", "修改vim格式", shell_action("set_vimrc"), check=vimrc_configured, outputs=["~/.vimrc"]),
+    Task("alias", "添加常用别名", shell_action("set_alias"), check=alias_configured, locks=("bashrc",),
+         outputs=["~/.bashrc"]),
+    Task("ps1", "修改提示符颜色", shell_action("set_ps1"), check=ps1_configured, locks=("bashrc",),
+         outputs=["/root/.bashrc"]),
+    Task("repo", "配置软件源仓库", shell_action(repo_function), check=repo_configured,
+         when=lambda ctx: repo_function(ctx) is not None, locks=("pkg",),
+         outputs=repo_files, params=("os_id", "os_version")),
+    Task("packages", "安装建议软件包", shell_action("minimal_install"), deps=("repo",),
+         check=packages_installed, locks=("pkg",), state=lambda ctx: str(packages_installed(ctx))),
+    Task("fastfetch-deps", "安装FastFetch编译依赖", python_action("install_fastfetch.py", "deps"),
+         deps=("repo",), check=fastfetch_deps_installed, locks=("pkg",),
+         state=lambda ctx: str(fastfetch_deps_installed(ctx))),
+    Task("fastfetch", "编译安装FastFetch并配置登录显示",
+         python_action("install_fastfetch.py", "--skip-packages"),
+         deps=("fastfetch-deps",), check=fastfetch_configured, locks=("profile",),
+         outputs=["/etc/profile"], state=tool_state("fastfetch")),
+    Task("docker", "安装Docker", shell_action("Install_Docker"), deps=("repo",),
+         check=docker_installed, locks=("pkg",), state=tool_state("docker")),
+]
+
+PROFILES = {
+    "baseline": ["firewall", "swap", "hostname", "vimrc", "alias", "ps1", "repo", "packages", "fastfetch"],
+    "docker": ["firewall", "swap", "hostname", "vimrc", "alias", "ps1", "repo", "packages", "fastfetch", "docker"],
+    "shell": ["vimrc", "alias", "ps1"],
+}
+
+def select_tasks(names):
+    """按名称选择任务，并自动补齐依赖的任务"""
+    by_name = {task.name: task for task in TASKS}
+    selected = []
+    def add(name):
+        if name not in by_name:
+            raise KeyError(name)
+        if by_name[name] in selected:
+            return
+        for dep in by_name[name].deps:
+            add(dep)
+        selected.append(by_name[name])
+    for name in names:
+        add(name)
+    return selected
+
+# ==================== 执行引擎 ====================
+
+def execute(task, ctx, log_dir, records=None):
+    start = time.time()
+    if task.when and not task.when(ctx):
+        return TaskResult(task.name, STATUS_NOT_APPLICABLE)
+
+    # 输入和输出都与上次成功执行时一致，直接跳过
+    digest = task.inputs_hash(ctx)
+    files = task.output_files(ctx)
+    if records and records.is_current(task.name, digest, files, task.current_state(ctx)):
+        return TaskResult(task.name, STATUS_UNCHANGED, time.time() - start)
+
+    if task.check and task.check(ctx):
+        if records:
+            records.record(task.name, digest, files, task.current_state(ctx))
+        return TaskResult(task.name, STATUS_SATISFIED, time.time() - start)
+
+    log_path = os.path.join(log_dir, f"{task.name}.log")
+    with open(log_path, "w") as log, tracing.span(task.name, "task", log=log_path) as span:
+        try:
+            task.action(ctx, log)
+        except Exception as e:
+            span.fail(error=str(e))
+            log.write(f"\n[!] {e}\n")
+            return TaskResult(task.name, STATUS_FAILED, time.time() - start, f"{e}，日志: {log_path}")
+    if records:
+        records.record(task.name, digest, task.output_files(ctx), task.current_state(ctx))
+    return TaskResult(task.name, STATUS_OK, time.time() - start, f"日志: {log_path}")
+
+def run_tasks(tasks, ctx, jobs, log_dir, records=None):
+    """依赖满足且资源锁空闲的任务并行执行，依赖失败的任务不再执行"""
+    pending = list(tasks)
+    results = {}
+    held_locks = set()
+    running = {}
+    print_lock = threading.Lock()
+
+    def report(result):
+        color = {
+            STATUS_OK: COLOR_GREEN, STATUS_SATISFIED: COLOR_CYAN, STATUS_UNCHANGED: COLOR_CYAN,
+            STATUS_NOT_APPLICABLE: COLOR_BLUE, STATUS_FAILED: COLOR_RED
+        }.get(result.status, COLOR_YELLOW)
+        with print_lock:
+            print(f"{color}[{result.status}] {result.name} ({result.elapsed:.1f}s) {result.detail}{COLOR_RESET}")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for task in list(pending):
+                dep_results = [results.get(dep) for dep in task.deps if dep in {t.name for t in tasks}]
+                if any(r and r.status in (STATUS_FAILED, STATUS_BLOCKED) for r in dep_results):
+                    pending.remove(task)
+                    results[task.name] = TaskResult(task.name, STATUS_BLOCKED, detail="依赖的任务失败")
+                    report(results[task.name])
+                    continue
+                if any(r is None for r in dep_results) or held_locks.intersection(task.locks):
+                    continue
+                pending.remove(task)
+                held_locks.update(task.locks)
+                with print_lock:
+                    print(f"{COLOR_YELLOW}[开始] {task.name}: {task.description}{COLOR_RESET}")
+                running[pool.submit(execute, task, ctx, log_dir, records)] = task
+
+            if not running:
+                # 没有可执行的任务（不应出现），剩余任务标记为未执行
+                for task in pending:
+                    results[task.name] = TaskResult(task.name, STATUS_BLOCKED, detail="无法满足依赖")
+                    report(results[task.name])
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                held_locks.difference_update(task.locks)
+                try:
+                    results[task.name] = future.result()
+                except Exception as e:
+                    results[task.name] = TaskResult(task.name, STATUS_FAILED, detail=str(e))
+                report(results[task.name])
+    return [results[task.name] for task in tasks]
+
+def print_summary(results, total):
+    print(f"\n{COLOR_CYAN}=== 执行结果 ==={COLOR_RESET}")
+    for result in results:
+        print(f"  {result.name:<16} {result.status:<6} {result.elapsed:>7.1f}s")
+    failed = [r for r in results if r.status in (STATUS_FAILED, STATUS_BLOCKED)]
+    color = COLOR_RED if failed else COLOR_GREEN
+    print(f"{color}共 {len(results)} 个任务，失败 {len(failed)} 个，总耗时 {total:.1f}s{COLOR_RESET}")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="按依赖关系并行执行初始化配置任务")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="要执行的预设任务组")
+    parser.add_argument("--tasks", help="要执行的任务，逗号分隔（会自动包含依赖）")
+    parser.add_argument("--hostname", default="", help="hostname 任务使用的主机名")
+    parser.add_argument("--vm-profile", choices=sorted(vm_tune.PROFILES), default="k8s",
+                        help="swap 任务使用的内存调优配置 (默认: k8s)")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="最大并行任务数 (默认: 4)")
+    parser.add_argument("--list", action="store_true", help="列出所有任务和预设")
+    parser.add_argument("--dry-run", action="store_true", help="只显示执行计划和检查结果，不做任何修改")
+    parser.add_argument("--refresh", action="store_true", help="忽略工具注册表缓存，重新探测")
+    parser.add_argument("--force", action="store_true", help="忽略执行记录，重新检查每个任务")
+    parser.add_argument("--trace", metavar="DIR", nargs="?", const="",
+                        help="记录每个任务的耗时（JSONL和Chrome trace），任务中调用的Python模块也一起记录")
+    args = parser.parse_args()
+    tracing.configure(args.trace, "provision")
+
+    if args.list:
+        for task in TASKS:
+            deps = f" (依赖: {', '.join(task.deps)})" if task.deps else ""
+            print(f"  {task.name:<16} {task.description}{deps}")
+        for name, task_names in sorted(PROFILES.items()):
+            print(f"  --profile {name}: {', '.join(task_names)}")
+        return
+
+    names = list(PROFILES[args.profile]) if args.profile else []
+    if args.tasks:
+        names += [name.strip() for name in args.tasks.split(",") if name.strip()]
+    if not names:
+        parser.error("请指定 --profile 或 --tasks")
+    try:
+        tasks = select_tasks(names)
+    except KeyError as e:
+        parser.error(f"未知的任务: {e.args[0]}")
+
+    toolreg.get_registry(refresh=args.refresh)
+    os_id, os_version = detect_os()
+    ctx = {"os_id": os_id, "os_version": os_version, "hostname": args.hostname, "vm_profile": args.vm_profile}
+    print(f"检测到系统: {os_id} {os_version}")
+
+    records = None if args.force else journal.Journal()
+    if args.dry_run:
+        for task in tasks:
+            if task.when and not task.when(ctx):
+                state = STATUS_NOT_APPLICABLE
+            elif records and records.is_current(task.name, task.inputs_hash(ctx), task.output_files(ctx),
+                                                task.current_state(ctx)):
+                state = STATUS_UNCHANGED
+            elif task.check and task.check(ctx):
+                state = STATUS_SATISFIED
+            else:
+                state = "待执行"
+            print(f"  {task.name:<16} {state:<6} {task.description}")
+        return
+
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 请使用root用户运行{COLOR_RESET}")
+        sys.exit(1)
+
+    log_dir = os.path.join(LOG_ROOT, f"provision_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"日志目录: {log_dir}\n")
+
+    start = time.time()
+    results = run_tasks(tasks, ctx, max(1, args.jobs), log_dir, records)
+    sys.exit(0 if print_summary(results, time.time() - start) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import argparse
+import math
+import os
+import random
+import re
+import sys
+
+VERSION = "1.0.0"
+
+# 彩虹色表的精度（一个正弦周期内的采样数）
+TABLE_SIZE = 1024
+TWO_PI = 2 * math.pi
+
+# 输入中已有的ANSI转义序列（与lolcat一致，着色前先去掉）
+ANSI_ESCAPE = re.compile(r"\x1b(?:\[[0-9;?]*[A-Za-z]|\][^\x07]*\x07|[()][0-9A-Za-z])")
+
+RESET = "\033[0m"
+
+def rgb_to_256(red, green, blue):
+    """将RGB映射到xterm 256色的6x6x6色立方"""
+    r6 = int(round(red / 255 * 5))
+    g6 = int(round(green / 255 * 5))
+    b6 = int(round(blue / 255 * 5))
+    return 16 + 36 * r6 + 6 * g6 + b6
+
+def build_color_table(truecolor=False):
+    """预先计算一个周期内所有相位对应的颜色转义序列"""
+    table = []
+    # 相同的转义序列复用同一个字符串对象，便于着色时按身份比较去重
+    seen = {}
+    for k in range(TABLE_SIZE):
+        phase = TWO_PI * k / TABLE_SIZE
+        # 与lolcat相同的彩虹公式：三个通道相位各差120度
+        red = int(math.sin(phase) * 127 + 128)
+        green = int(math.sin(phase + TWO_PI / 3) * 127 + 128)
+        blue = int(math.sin(phase + 2 * TWO_PI / 3) * 127 + 128)
+        if truecolor:
+            code = f"\033[38;2;{red};{green};{blue}m"
+        else:
+            code = f"\033[38;5;{rgb_to_256(red, green, blue)}m"
+        table.append(seen.setdefault(code, code))
+    return table
+
+class Rainbow:
+    """逐行彩虹着色器，参数含义与lolcat的 -F/-p/-S 相同"""
+
+    def __init__(self, freq=0.1, spread=3.0, seed=0, truecolor=False):
+        if spread < 0.1:
+            raise ValueError("spread 不能小于 0.1")
+        self.table = build_color_table(truecolor)
+        # lolcat中 seed 为0时随机选择起始偏移
+        self.offset = seed if seed else random.randint(0, 255)
+        scale = TABLE_SIZE / TWO_PI
+        self.line_step = freq * scale
+        self.char_step = freq / spread * scale
+
+    def colorize(self, line):
+        """为单行文本着色，返回带转义序列的字符串"""
+        newline = ""
+        if line.endswith("\n"):
+            line, newline = line[:-1], "\n"
+        line = ANSI_ESCAPE.sub("", line)
+
+        table = self.table
+        base = self.offset * self.line_step
+        step = self.char_step
+        parts = []
+        last = None
+        for i, char in enumerate(line):
+            color = table[int(base + i * step) % TABLE_SIZE]
+            # 相邻字符颜色相同时不重复输出转义序列
+            if color is not last:
+                parts.append(color)
+                last = color
+            parts.append(char)
+        self.offset += 1
+
+        if parts:
+            parts.append(RESET)
+        parts.append(newline)
+        return "".join(parts)
+
+    def stream(self, infile, outfile, flush=False):
+        """按行读取并输出着色结果，不缓存整个输入"""
+        for line in infile:
+            outfile.write(self.colorize(line))
+            if flush:
+                outfile.flush()
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="pylolcat",
+        description="纯Python实现的彩虹着色工具（兼容lolcat常用参数）"
+    )
+    parser.add_argument("files", nargs="*", default=["-"], help="输入文件，默认读取标准输入")
+    parser.add_argument("-p", "--spread", type=float, default=3.0, help="彩虹扩散度 (默认: 3.0)")
+    parser.add_argument("-F", "--freq", type=float, default=0.1, help="彩虹频率 (默认: 0.1)")
+    parser.add_argument("-S", "--seed", type=int, default=0, help="彩虹种子，0表示随机 (默认: 0)")
+    parser.add_argument("-t", "--truecolor", action="store_true", help="使用24位真彩色")
+    parser.add_argument("-f", "--force", action="store_true", help="即使输出不是终端也强制着色")
+    parser.add_argument("-v", "--version", action="version", version=f"pylolcat {VERSION}")
+    args = parser.parse_args()
+
+    if sys.stdin is not None and hasattr(sys.stdin, "reconfigure"):
+        sys.stdin.reconfigure(errors="replace")
+
+    is_tty = sys.stdout.isatty()
+    try:
+        rainbow = Rainbow(args.freq, args.spread, args.seed, args.truecolor)
+    except ValueError as e:
+        print(f"pylolcat: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        for path in args.files:
+            try:
+                infile = open_input(path)
+            except OSError as e:
+                print(f"pylolcat: {path}: {e.strerror}", file=sys.stderr)
+                continue
+            try:
+                if is_tty or args.force:
+                    rainbow.stream(infile, sys.stdout, flush=is_tty)
+                else:
+                    # 非终端输出时与lolcat一致，原样输出
+                    for line in infile:
+                        sys.stdout.write(line)
+            finally:
+                if infile is not sys.stdin:
+                    infile.close()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # 下游提前关闭管道（如 head），静默退出
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(0)
+    except KeyboardInterrupt:
+        sys.stdout.write(RESET)
+        sys.exit(130)
+
+if __name__ == "__main__":
+    main()
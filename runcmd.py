@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import collections
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+# 不保留完整输出时只保留最后这么多行，编译之类输出很多的命令不会占满内存
+TAIL_LINES = 200
+# 超时后先发SIGTERM，等待这么多秒仍未退出再发SIGKILL
+KILL_GRACE = 5
+# 命令退出后等待读取线程结束的时间，后台进程继承了管道时读不到EOF
+DRAIN_TIMEOUT = 2
+
+_print_lock = threading.Lock()
+# 正在运行的进程，run_many 被中断时统一终止
+_active = set()
+_active_lock = threading.Lock()
+
+class CommandError(subprocess.CalledProcessError):
+    """命令返回非0或超时，output/stderr 为最后若干行输出"""
+
+    def __init__(self, returncode, cmd, output=None, stderr=None, timeout=None):
+        super().__init__(returncode, cmd, output, stderr)
+        self.timeout = timeout
+
+    @property
+    def timed_out(self):
+        return self.timeout is not None
+
+    def __str__(self):
+        if self.timed_out:
+            return f"命令超时 ({self.timeout}s): {self.cmd}"
+        return f"命令执行失败 (返回码 {self.returncode}): {self.cmd}"
+
+class Result(subprocess.CompletedProcess):
+    """在 CompletedProcess 基础上记录耗时和是否超时"""
+
+    def __init__(self, args, returncode, stdout, stderr, duration, timeout=None, timed_out=False,
+                 stdout_bytes=0, stderr_bytes=0):
+        super().__init__(args, returncode, stdout, stderr)
+        self.duration = duration
+        self.timeout = timeout
+        self.timed_out = timed_out
+        # 命令输出的总字节数（保留的只是最后若干行）
+        self.stdout_bytes = stdout_bytes
+        self.stderr_bytes = stderr_bytes
+
+    def check_returncode(self):
+        if self.returncode != 0 or self.timed_out:
+            raise CommandError(self.returncode, self.args, self.stdout, self.stderr,
+                               self.timeout if self.timed_out else None)
+
+def split(cmd):
+    """字符串按shell规则拆分（不经过shell执行），列表原样返回"""
+    return shlex.split(cmd) if isinstance(cmd, str) else [str(arg) for arg in cmd]
+
+def format_command(stages):
+    # shlex.join 需要Python 3.8，Debian 10 等主机的python3为3.7
+    return " | ".join(" ".join(shlex.quote(arg) for arg in stage) for stage in stages)
+
+def _signal(proc, sig):
+    # 每条命令在独立的进程组中运行，make -j 之类派生的子进程一起终止
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def terminate(procs, grace=KILL_GRACE):
+    """先发SIGTERM，grace 秒后仍未退出的进程发SIGKILL"""
+    running = [proc for proc in procs if proc.poll() is None]
+    for proc in running:
+        _signal(proc, signal.SIGTERM)
+    deadline = time.monotonic() + grace
+    for proc in running:
+        try:
+            proc.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            _signal(proc, signal.SIGKILL)
+            proc.wait()
+
+def _read_lines(pipe, name, lines, sizes, emit):
+    with pipe:
+        for raw in iter(pipe.readline, b""):
+            sizes[name] += len(raw)
+            line = raw.decode("utf-8", "replace").rstrip("\n")
+            lines.append(line)
+            emit(name, line)
+
+def _write_input(pipe, data):
+    try:
+        with pipe:
+            pipe.write(data.encode() if isinstance(data, str) else data)
+    except BrokenPipeError:
+        pass
+
+def _join(lines):
+    return "\n".join(lines) + "\n" if lines else ""
+
+def run(*cmds, capture=False, echo=None, check=False, timeout=None, input=None,
+        cwd=None, env=None, tail=TAIL_LINES, on_line=None):
+    """执行一条命令，传入多条命令时用管道依次连接（不经过shell），返回 Result
+
+    capture 为True时保留完整的标准输出，否则只保留最后 tail 行；echo 默认在不捕获时实时输出每一行。
+    on_line(流名称, 行) 在每读到一行时调用。超时先发SIGTERM，KILL_GRACE 秒后发SIGKILL。
+    check 为True时命令失败、超时或找不到时抛出 CommandError。启用tracing时每条命令记录为一个span。
+    """
+    stages = [split(cmd) for cmd in cmds]
+    display = format_command(stages)
+    with tracing.span(display, "cmd", argv=stages) as span:
+        result = _execute(stages, display, capture, echo, timeout, input, cwd, env, tail, on_line)
+        span.set(returncode=result.returncode, stdout_bytes=result.stdout_bytes,
+                 stderr_bytes=result.stderr_bytes, timed_out=result.timed_out)
+        if result.returncode != 0 or result.timed_out:
+            span.fail()
+        if check:
+            result.check_returncode()
+        return result
+
+def _execute(stages, display, capture, echo, timeout, input, cwd, env, tail, on_line):
+    if echo is None:
+        echo = not capture
+    stdout_lines = collections.deque(maxlen=None if capture else tail)
+    stderr_lines = collections.deque(maxlen=tail)
+    sizes = {"stdout": 0, "stderr": 0}
+
+    def emit(name, line):
+        if echo:
+            with _print_lock:
+                print(line, file=sys.stderr if name == "stderr" else sys.stdout, flush=True)
+        if on_line:
+            on_line(name, line)
+
+    start = time.monotonic()
+    err_read, err_write = os.pipe()
+    procs = []
+    try:
+        for argv in stages:
+            if procs:
+                stdin = procs[-1].stdout
+            else:
+                stdin = subprocess.PIPE if input is not None else None
+            proc = subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE, stderr=err_write,
+                                    cwd=cwd, env=env, start_new_session=True)
+            if procs:
+                # 读端只留给下一条命令，下游提前退出时上游能收到SIGPIPE
+                procs[-1].stdout.close()
+            procs.append(proc)
+    except OSError as e:
+        terminate(procs)
+        if procs:
+            procs[-1].stdout.close()
+        os.close(err_read)
+        os.close(err_write)
+        return Result(display, 127, "", f"{e}\n", time.monotonic() - start, timeout)
+    os.close(err_write)
+
+    with _active_lock:
+        _active.update(procs)
+    threads = [
+        threading.Thread(target=_read_lines, args=(procs[-1].stdout, "stdout", stdout_lines, sizes, emit), daemon=True),
+        threading.Thread(target=_read_lines, args=(os.fdopen(err_read, "rb"), "stderr", stderr_lines, sizes, emit), daemon=True),
+    ]
+    if input is not None:
+        threads.append(threading.Thread(target=_write_input, args=(procs[0].stdin, input), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    timed_out = False
+    try:
+        for proc in procs:
+            remaining = None if timeout is None else max(0, start + timeout - time.monotonic())
+            proc.wait(timeout=remaining)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        terminate(procs)
+    except KeyboardInterrupt:
+        terminate(procs)
+        raise
+    finally:
+        with _active_lock:
+            _active.difference_update(procs)
+    drain_deadline = time.monotonic() + DRAIN_TIMEOUT
+    for thread in threads:
+        thread.join(max(0, drain_deadline - time.monotonic()))
+
+    # 与 pipefail 相同取最右边的非0返回码；上游因下游提前退出收到SIGPIPE不算失败
+    returncode = 0
+    for index, proc in enumerate(procs):
+        if proc.returncode and not (index < len(procs) - 1 and proc.returncode == -signal.SIGPIPE):
+            returncode = proc.returncode
+    return Result(display, returncode, _join(stdout_lines), _join(stderr_lines),
+                  time.monotonic() - start, timeout, timed_out, sizes["stdout"], sizes["stderr"])
+
+def run_many(commands, jobs=None, **kwargs):
+    """并发执行互不依赖的命令，按传入顺序返回结果；元组表示管道的各条命令
+
+    默认不实时输出，check 为True时等所有命令结束后抛出第一个 CommandError。
+    """
+    kwargs.setdefault("echo", False)
+
+    def run_one(command):
+        stages = command if isinstance(command, tuple) else (command,)
+        try:
+            return run(*stages, **kwargs)
+        except CommandError as e:
+            return e
+
+    pool = ThreadPoolExecutor(max_workers=jobs or len(commands) or 1)
+    try:
+        results = list(pool.map(run_one, commands))
+    except KeyboardInterrupt:
+        # 子进程在独立的进程组中，收不到终端的Ctrl-C
+        with _active_lock:
+            procs = list(_active)
+        terminate(procs)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+    errors = [result for result in results if isinstance(result, CommandError)]
+    if errors:
+        raise errors[0]
+    return results
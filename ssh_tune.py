@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import shutil
+import statistics
+import sys
+import time
+
+import runcmd
+import toolreg
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+# 命令超时时间（秒）
+COMMAND_TIMEOUT = 60
+
+SSHD_CONFIG = "/etc/ssh/sshd_config"
+SSH_CONFIG = "/etc/ssh/ssh_config"
+# sshd和ssh对同一配置项取第一次出现的值，文件名靠前才能覆盖其他drop-in
+SSHD_DROPIN = "/etc/ssh/sshd_config.d/10-init-scripts.conf"
+SSH_DROPIN = "/etc/ssh/ssh_config.d/10-init-scripts.conf"
+BACKUP_SUFFIX = ".ssh_tune.bak"
+# Include 从 OpenSSH 7.3 开始支持，更旧的版本直接修改主配置文件
+INCLUDE_VERSION = (7, 3)
+
+# 默认算法列表随发行版和安全更新变化，不写死列表；有AES-NI时AES-GCM比默认首选的chacha20更快，
+# 通过 "^" 前缀把它们排到默认列表前面（OpenSSH 7.9 开始支持），更旧的版本不修改算法
+PREPEND_VERSION = (7, 9)
+AES_CIPHERS = ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com"]
+
+def run(cmd, timeout=COMMAND_TIMEOUT):
+    """执行命令，标准错误追加到输出之后"""
+    result = runcmd.run(cmd, capture=True, timeout=timeout)
+    result.stdout += result.stderr
+    return result
+
+def find_sshd():
+    return toolreg.get_registry().lookup("sshd", candidates=("/usr/sbin/sshd",), version_args=None)
+
+def openssh_version():
+    """`ssh -V` 输出形如 OpenSSH_8.9p1，解析失败时返回 (0, 0)"""
+    ssh = toolreg.get_registry().lookup("ssh", version_args=("-V",))
+    if not ssh:
+        return (0, 0)
+    match = re.search(r"OpenSSH_(\d+)\.(\d+)", run([ssh, "-V"]).stdout)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+def supported(query):
+    """`ssh -Q cipher/kex/mac` 列出本机支持的算法"""
+    ssh = toolreg.get_registry().lookup("ssh", version_args=("-V",))
+    result = run([ssh, "-Q", query]) if ssh else None
+    if result is None or result.returncode != 0:
+        return None
+    return set(result.stdout.split())
+
+def prepend(preference, query):
+    """返回 "^算法,..."，只保留本机支持的算法，都不支持时返回None"""
+    available = supported(query)
+    if available is None:
+        return None
+    chosen = [name for name in preference if name in available]
+    return "^" + ",".join(chosen) if chosen else None
+
+def has_aes_ni():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            return re.search(r"^flags\s*:.*\baes\b", f.read(), re.M) is not None
+    except OSError:
+        return False
+
+def algorithms(version):
+    """只调整默认算法的顺序，不限制可用的算法；密钥交换和MAC保持默认"""
+    if version < PREPEND_VERSION or not has_aes_ni():
+        return {}
+    return {"Ciphers": prepend(AES_CIPHERS, "cipher")}
+
+# ==================== 生成配置 ====================
+
+def server_options(args, algos):
+    options = {
+        # 不对客户端地址做反向DNS解析，DNS不可达时每次登录会卡住数秒
+        "UseDNS": "no",
+        "GSSAPIAuthentication": "no",
+        # 自动化任务同时发起大量连接，默认 10:30:100 会随机拒绝未认证的连接
+        "MaxStartups": args.max_startups,
+        # 每个ControlMaster连接上复用的会话数
+        "MaxSessions": str(args.max_sessions),
+    }
+    options.update({key: value for key, value in algos.items() if value})
+    return options
+
+def client_options(args, algos):
+    options = {
+        "ControlMaster": "auto",
+        "ControlPath": "~/.ssh/cm-%C",
+        "ControlPersist": args.control_persist,
+        "GSSAPIAuthentication": "no",
+        "ServerAliveInterval": "30",
+    }
+    options.update({key: value for key, value in algos.items() if value})
+    return options
+
+def render(options, header):
+    lines = [f"# {header}，由 ssh_tune.py 生成，请勿手动修改"]
+    lines += [f"{key} {value}" for key, value in options.items()]
+    return "\n".join(lines) + "\n"
+
+def read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+def ensure_include(text, dropin_dir):
+    """在主配置文件开头加入 Include，放在开头保证drop-in中的配置优先生效"""
+    pattern = re.escape(dropin_dir) + r"/\*"
+    if re.search(r"^\s*Include\s+" + pattern, text, re.M | re.I):
+        return text
+    return f"Include {dropin_dir}/*.conf\n" + text
+
+def set_inline(text, options):
+    """不支持Include的旧版本：与init2.0.sh的 set_sshd_option 一样替换或追加配置项"""
+    for key, value in options.items():
+        line = f"{key} {value}"
+        pattern = r"^#?" + key + r"[ \t].*$"
+        if re.search(pattern, text, re.M):
+            text = re.sub(pattern, lambda m: line, text, count=1, flags=re.M)
+        else:
+            text = text.rstrip("\n") + "\n" + line + "\n"
+    return text
+
+def plan(args):
+    """返回 {文件: 新内容}，内容未变化的文件不在其中"""
+    version = openssh_version()
+    algos = algorithms(version)
+    use_include = version >= INCLUDE_VERSION
+    changes = {}
+
+    sshd_config = read(SSHD_CONFIG) or ""
+    if use_include:
+        changes[SSHD_DROPIN] = render(server_options(args, algos), "sshd连接调优")
+        changes[SSHD_CONFIG] = ensure_include(sshd_config, os.path.dirname(SSHD_DROPIN))
+    else:
+        changes[SSHD_CONFIG] = set_inline(sshd_config, server_options(args, algos))
+
+    if not args.no_client:
+        ssh_config = read(SSH_CONFIG) or ""
+        if use_include:
+            changes[SSH_DROPIN] = render(client_options(args, algos), "ssh客户端连接复用")
+            changes[SSH_CONFIG] = ensure_include(ssh_config, os.path.dirname(SSH_DROPIN))
+        else:
+            # 旧版本客户端不认识 ControlPersist/%C，写入后所有ssh命令都会报错
+            print(f"{COLOR_YELLOW}[提示] OpenSSH 版本过旧，不修改ssh客户端配置{COLOR_RESET}")
+    return {path: content for path, content in changes.items() if content != read(path)}
+
+# ==================== 握手耗时 ====================
+
+def sshd_port():
+    """从 `sshd -T` 读取实际监听的端口"""
+    sshd = find_sshd()
+    result = run([sshd, "-T"]) if sshd else None
+    if result is not None and result.returncode == 0:
+        match = re.search(r"^port (\d+)", result.stdout, re.M)
+        if match:
+            return int(match.group(1))
+    return 22
+
+def measure_handshake(port, count):
+    """连接本机 count 次，返回每次耗时（秒）和是否完成登录；没有免密登录时测到认证被拒绝为止"""
+    ssh = toolreg.get_registry().lookup("ssh", version_args=("-V",))
+    if not ssh:
+        return [], False
+    cmd = [
+        ssh, "-p", str(port),
+        "-o", "BatchMode=yes",
+        "-o", "ControlMaster=no", "-o", "ControlPath=none",
+        "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null",
+        "-o", "LogLevel=ERROR", "-o", "ConnectTimeout=10",
+        "localhost", "true",
+    ]
+    timings = []
+    logged_in = True
+    for _ in range(count):
+        start = time.perf_counter()
+        result = run(cmd, timeout=30)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0 and "Permission denied" not in result.stdout:
+            print(f"{COLOR_YELLOW}[提示] 无法连接本机sshd: {result.stdout.strip()}{COLOR_RESET}")
+            return [], False
+        logged_in = logged_in and result.returncode == 0
+        timings.append(elapsed)
+    return timings, logged_in
+
+def report(label, timings, logged_in):
+    if not timings:
+        return None
+    median = statistics.median(timings)
+    scope = "完整登录" if logged_in else "到认证被拒绝"
+    print(f"{label}: 中位数 {median * 1000:.0f} ms, 最小 {min(timings) * 1000:.0f} ms, "
+          f"最大 {max(timings) * 1000:.0f} ms（{len(timings)} 次，{scope}）")
+    return median
+
+# ==================== 应用配置 ====================
+
+def reload_sshd():
+    """sshd收到SIGHUP后重新读取配置，已建立的会话不受影响"""
+    for service in ("sshd", "ssh"):
+        if run(["systemctl", "reload", service]).returncode == 0:
+            return True
+    if os.path.exists("/etc/init.d/ssh"):
+        return run(["/etc/init.d/ssh", "reload"]).returncode == 0
+    return run(["service", "sshd", "reload"]).returncode == 0
+
+def apply(changes):
+    """写入新配置并用 `sshd -t` 校验，失败时恢复原文件
+
+    备份使用单独的后缀，不覆盖 init2.0.sh 等生成的 .bak；已有备份时保留第一次修改前的原文件。
+    """
+    backups = {path: read(path) for path in changes}
+    for path, content in changes.items():
+        if backups[path] is not None and not os.path.exists(path + BACKUP_SUFFIX):
+            shutil.copy2(path, path + BACKUP_SUFFIX)
+        write(path, content)
+
+    sshd = find_sshd()
+    result = run([sshd, "-t"]) if sshd else None
+    if result is None or result.returncode != 0:
+        for path, content in backups.items():
+            if content is None:
+                os.remove(path)
+            else:
+                write(path, content)
+        print(f"{COLOR_RED}[!] sshd -t 校验失败，已恢复原配置{COLOR_RESET}")
+        if result is not None:
+            print(result.stdout.strip())
+        return False
+    return True
+
+def check_effective(options):
+    """`sshd -T` 输出实际生效的配置，主配置中Include之前的同名配置项会覆盖drop-in"""
+    sshd = find_sshd()
+    result = run([sshd, "-T"]) if sshd else None
+    if result is None or result.returncode != 0:
+        return
+    effective = dict(line.split(" ", 1) for line in result.stdout.splitlines() if " " in line)
+    for key, value in options.items():
+        actual = effective.get(key.lower())
+        if actual is None:
+            continue
+        if value.startswith("^"):
+            # 前置的算法应排在实际列表的最前面
+            expected = value[1:].split(",")
+            if actual.split(",")[:len(expected)] != expected:
+                print(f"{COLOR_YELLOW}[提示] {key} 实际值为 {actual}，被其他配置覆盖{COLOR_RESET}")
+        elif actual.lower() != value.lower():
+            print(f"{COLOR_YELLOW}[提示] {key} 实际值为 {actual}，被其他配置覆盖{COLOR_RESET}")
+
+def main():
+    parser = argparse.ArgumentParser(description="sshd连接调优：关闭UseDNS/GSSAPI、调整MaxStartups/MaxSessions、有AES-NI时优先AES-GCM，并配置客户端连接复用")
+    parser.add_argument("--max-startups", default="100:30:200", help="未认证连接数限制 (默认: 100:30:200)")
+    parser.add_argument("--max-sessions", type=int, default=64, help="单个连接上的会话数 (默认: 64)")
+    parser.add_argument("--control-persist", default="10m", help="客户端主连接空闲保持时间 (默认: 10m)")
+    parser.add_argument("--no-client", action="store_true", help="不修改ssh客户端配置")
+    parser.add_argument("--bench-count", type=int, default=10, help="握手耗时测试次数，0表示不测试 (默认: 10)")
+    parser.add_argument("--dry-run", action="store_true", help="只显示将要写入的配置")
+    parser.add_argument("--refresh", action="store_true", help="忽略工具注册表缓存，重新探测")
+    args = parser.parse_args()
+
+    toolreg.get_registry(refresh=args.refresh)
+    if not find_sshd():
+        print(f"{COLOR_RED}[!] 未找到sshd{COLOR_RESET}")
+        sys.exit(1)
+
+    changes = plan(args)
+    if not changes:
+        print(f"{COLOR_GREEN}SSH 调优配置未变化{COLOR_RESET}")
+        return
+    for path, content in changes.items():
+        print(f"{COLOR_CYAN}==> {path}{COLOR_RESET}")
+        print(content if path.endswith(".conf") else "(加入 Include 或修改配置项)")
+    if args.dry_run:
+        return
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 请使用root用户运行{COLOR_RESET}")
+        sys.exit(1)
+
+    port = sshd_port()
+    before = report("调优前", *measure_handshake(port, args.bench_count)) if args.bench_count else None
+
+    if not apply(changes):
+        sys.exit(1)
+    if not reload_sshd():
+        print(f"{COLOR_RED}[!] sshd 重新加载失败{COLOR_RESET}")
+        sys.exit(1)
+    print(f"{COLOR_GREEN}SSH 调优配置已生效{COLOR_RESET}")
+    check_effective(server_options(args, algorithms(openssh_version())))
+
+    if args.bench_count:
+        # 等待sshd重新加载完成
+        time.sleep(1)
+        after = report("调优后", *measure_handshake(port, args.bench_count))
+        if before and after:
+            print(f"握手耗时变化: {(after - before) * 1000:+.0f} ms ({(after - before) / before * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
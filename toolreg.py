@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 状态目录，非root运行时回退到用户缓存目录
+STATE_DIR = os.environ.get("INIT_SCRIPTS_STATE_DIR", "/var/lib/init_scripts")
+USER_STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "init_scripts")
+REGISTRY_NAME = "tools.json"
+
+def state_path(name):
+    """返回状态目录中可写的文件路径，其他模块的状态文件也放在这里"""
+    for state_dir in (STATE_DIR, USER_STATE_DIR):
+        try:
+            os.makedirs(state_dir, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(state_dir, os.W_OK):
+            return os.path.join(state_dir, name)
+    return os.path.join(USER_STATE_DIR, name)
+
+def is_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+def probe_version(path, version_args):
+    """运行 `工具 --version` 之类的命令，取输出的第一行作为版本信息"""
+    if not version_args:
+        return ""
+    try:
+        result = subprocess.run(
+            [path] + list(version_args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    for line in result.stdout.splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+class ToolRegistry:
+    """工具路径注册表：每个工具只完整探测一次，之后通过stat校验复用结果"""
+
+    def __init__(self, path=None, refresh=False):
+        self.path = path or state_path(REGISTRY_NAME)
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._checked = set()
+        self._tools = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._tools = data.get("tools", {})
+        except (OSError, ValueError):
+            self._tools = {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".tools-", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"tools": self._tools}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 状态文件只是缓存，写入失败不影响主流程
+            pass
+
+    def _still_valid(self, entry):
+        """通过mtime和inode判断缓存的路径是否仍指向同一个文件"""
+        try:
+            st = os.stat(entry["path"])
+        except (OSError, KeyError):
+            return False
+        return (
+            st.st_mtime_ns == entry.get("mtime_ns")
+            and st.st_ino == entry.get("inode")
+            and os.access(entry["path"], os.X_OK)
+        )
+
+    def _resolve(self, name, candidates, finder):
+        path = shutil.which(name)
+        if path:
+            return path
+        for pattern in candidates:
+            matches = sorted(glob.glob(os.path.expanduser(pattern))) if "*" in pattern else [pattern]
+            for match in matches:
+                if is_executable(match):
+                    return match
+        if finder:
+            path = finder()
+            if path and is_executable(path):
+                return path
+        return None
+
+    def lookup(self, name, candidates=(), finder=None, version_args=("--version",)):
+        """返回工具的绝对路径，找不到时返回None（未找到的结果不缓存）"""
+        with self._lock:
+            entry = self._tools.get(name)
+            # --refresh 时每个工具在本进程内重新探测一次
+            if self.refresh and name not in self._checked:
+                entry = None
+            if entry and (name in self._checked or self._still_valid(entry)):
+                self._checked.add(name)
+                return entry["path"]
+
+            path = self._resolve(name, candidates, finder)
+            if not path:
+                self._tools.pop(name, None)
+                self._checked.discard(name)
+                return None
+
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            self._tools[name] = {
+                "path": path,
+                "version": probe_version(path, version_args),
+                "mtime_ns": st.st_mtime_ns,
+                "inode": st.st_ino,
+                "resolved_at": int(time.time())
+            }
+            self._checked.add(name)
+            self._save()
+            return path
+
+    def version(self, name):
+        entry = self._tools.get(name)
+        return entry.get("version", "") if entry else ""
+
+    def forget(self, name):
+        """工具被重新安装或卸载后调用，下次查询时重新探测"""
+        with self._lock:
+            self._checked.discard(name)
+            if self._tools.pop(name, None) is not None:
+                self._save()
+
+    def entries(self):
+        return dict(self._tools)
+
+_registry = None
+
+def get_registry(refresh=False):
+    """返回进程内共享的注册表实例"""
+    global _registry
+    if _registry is None or refresh:
+        _registry = ToolRegistry(refresh=refresh)
+    return _registry
+
+def main():
+    parser = argparse.ArgumentParser(description="查询或刷新工具路径注册表")
+    parser.add_argument("tools", nargs="*", help="要查询的工具名，留空则列出已注册的工具")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存，重新探测")
+    args = parser.parse_args()
+
+    registry = get_registry(refresh=args.refresh)
+    if not args.tools:
+        for name, entry in sorted(registry.entries().items()):
+            print(f"{name:<16} {entry['path']:<40} {entry.get('version', '')}")
+        return
+
+    missing = False
+    for name in args.tools:
+        path = registry.lookup(name)
+        if path:
+            print(f"{name:<16} {path:<40} {registry.version(name)}")
+        else:
+            print(f"{name:<16} 未找到")
+            missing = True
+    sys.exit(1 if missing else 0)
+
+if __name__ == "__main__":
+    main()
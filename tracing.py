@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import atexit
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 通过 --trace 或环境变量启用；环境变量会传给子进程，init2.0.sh 调用的Python模块也一起记录
+TRACE_ENV = "INIT_TRACE"
+TOP_ENV = "INIT_TRACE_TOP"
+LOG_ROOT = "/var/log/init_scripts"
+USER_LOG_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "init_scripts")
+TOP_N = 10
+# span名称的最大长度，完整命令记录在 argv 中
+NAME_LIMIT = 80
+
+class Span:
+    """一个步骤或一条命令，set() 记录返回码、输出字节数等附加信息"""
+
+    def __init__(self, span_id, parent, name, category, args):
+        self.id = span_id
+        self.parent = parent
+        self.name = name if len(name) <= NAME_LIMIT else name[:NAME_LIMIT - 3] + "..."
+        self.category = category
+        self.args = args
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        # get_native_id 从Python 3.8开始提供
+        self.tid = getattr(threading, "get_native_id", threading.get_ident)()
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def fail(self, **args):
+        self.status = "error"
+        self.set(**args)
+
+class _NullSpan:
+    def set(self, **args):
+        pass
+
+    def fail(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    """把span追加写入JSONL，退出时写出Chrome trace_event文件并打印最慢的操作"""
+
+    def __init__(self, directory, name, top=TOP_N):
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"{name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{os.getpid()}")
+        self.jsonl_path = f"{prefix}.jsonl"
+        self.chrome_path = f"{prefix}.trace.json"
+        self.top = top
+        self.name = name
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._jsonl = open(self.jsonl_path, "a", buffering=1)
+        atexit.register(self.close)
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def begin(self, name, category, args):
+        stack = self._stack()
+        span = Span(next(self._ids), stack[-1].id if stack else None, name, category, args)
+        stack.append(span)
+        return span
+
+    def end(self, span, perf_start):
+        span.duration = time.perf_counter() - perf_start
+        self._stack().remove(span)
+        record = {
+            "id": span.id, "parent": span.parent, "name": span.name, "cat": span.category,
+            "start": round(span.start, 6), "duration": round(span.duration, 6),
+            "status": span.status, "pid": os.getpid(), "tid": span.tid, "args": span.args,
+        }
+        with self._lock:
+            self.spans.append(span)
+            self._jsonl.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def write_chrome(self):
+        """Chrome trace_event 格式，可在 chrome://tracing 或 Perfetto 中打开"""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": self.name}}]
+        for span in self.spans:
+            events.append({
+                "name": span.name, "cat": span.category, "ph": "X",
+                "ts": int(span.start * 1e6), "dur": int(span.duration * 1e6),
+                "pid": pid, "tid": span.tid, "args": dict(span.args, status=span.status),
+            })
+        with open(self.chrome_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+    def print_top(self):
+        if not self.spans or not self.top:
+            return
+        slowest = sorted(self.spans, key=lambda span: span.duration, reverse=True)[:self.top]
+        print(f"\n==== 最慢的 {len(slowest)} 个操作 ====", file=sys.stderr)
+        for span in slowest:
+            flag = "" if span.status == "ok" else f" ({span.status})"
+            print(f"{span.duration:9.2f}s  [{span.category}] {span.name}{flag}", file=sys.stderr)
+        print(f"trace文件: {self.chrome_path}\n详细记录: {self.jsonl_path}", file=sys.stderr)
+
+    def close(self):
+        with self._lock:
+            if self._jsonl.closed:
+                return
+            self._jsonl.close()
+        if not self.spans:
+            # 没有记录任何操作（如 --list、--dry-run）时不留下空文件
+            os.remove(self.jsonl_path)
+            return
+        self.write_chrome()
+        self.print_top()
+
+_tracer = None
+_configured = False
+_config_lock = threading.Lock()
+
+def _writable_root():
+    for root in (LOG_ROOT, USER_LOG_ROOT):
+        try:
+            os.makedirs(root, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(root, os.W_OK):
+            return root
+    return USER_LOG_ROOT
+
+def configure(directory=None, name=None, top=None):
+    """根据 --trace 参数启用记录：None 时按环境变量决定，空字符串或"1"使用默认目录"""
+    global _tracer, _configured
+    with _config_lock:
+        if _configured:
+            return _tracer
+        _configured = True
+        if directory is None:
+            directory = os.environ.get(TRACE_ENV, "")
+            if directory.lower() in ("", "0", "off", "no"):
+                return None
+        if directory in ("", "1", "on", "yes"):
+            directory = os.path.join(_writable_root(), "trace")
+        directory = os.path.abspath(directory)
+        # 子进程继承环境变量后写入同一目录
+        os.environ[TRACE_ENV] = directory
+        if top is None:
+            top = int(os.environ.get(TOP_ENV, TOP_N))
+        if not name:
+            script = sys.argv[0] if sys.argv and sys.argv[0] not in ("", "-c") else "python"
+            name = os.path.splitext(os.path.basename(script))[0]
+        _tracer = Tracer(directory, name, top)
+        return _tracer
+
+def get_tracer():
+    return _tracer if _configured else configure()
+
+@contextlib.contextmanager
+def span(name, category="step", **args):
+    """记录一个步骤的耗时，未启用时不做任何事"""
+    tracer = get_tracer()
+    if tracer is None:
+        yield _NULL_SPAN
+        return
+    current = tracer.begin(name, category, args)
+    perf_start = time.perf_counter()
+    try:
+        yield current
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            current.fail(exit_code=e.code)
+        raise
+    except BaseException as e:
+        current.fail(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        tracer.end(current, perf_start)
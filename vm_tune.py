@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import toolreg
+
+# 颜色代码
+COLOR_RED = "\033[1;31m"
+COLOR_GREEN = "\033[1;32m"
+COLOR_YELLOW = "\033[1;33m"
+COLOR_CYAN = "\033[1;36m"
+COLOR_RESET = "\033[0m"
+
+SYSCTL_DROPIN = "/etc/sysctl.d/90-init-scripts-vm.conf"
+THP_TMPFILES = "/etc/tmpfiles.d/90-init-scripts-thp.conf"
+THP_DIR = "/sys/kernel/mm/transparent_hugepage"
+ZRAM_UNIT = "/etc/systemd/system/init-scripts-zram.service"
+SWAPFILE = "/swapfile"
+BENCH_NAME = "vm_bench.json"
+
+GiB = 1024 ** 3
+MiB = 1024 ** 2
+
+# 调优配置：swap 为 off/zram/file，swap_size 为内存的比例（上限 swap_max），sysctl 写入 sysctl.d
+PROFILES = {
+    "k8s": {
+        "description": "Kubernetes节点：禁用swap（kubelet要求），放宽连接和文件句柄限制",
+        "swap": "off",
+        "thp": "madvise",
+        "sysctl": {
+            "vm.swappiness": 0,
+            "vm.overcommit_memory": 1,
+            "vm.panic_on_oom": 0,
+            "vm.max_map_count": 262144,
+            "vm.dirty_ratio": 20,
+            "vm.dirty_background_bytes": 64 * MiB,
+            "kernel.panic": 10,
+            "fs.file-max": 2097152,
+            "fs.inotify.max_user_watches": 524288,
+            "fs.inotify.max_user_instances": 8192,
+            "net.core.somaxconn": 32768,
+            "net.ipv4.tcp_max_syn_backlog": 8192,
+        },
+    },
+    "database": {
+        "description": "数据库：小容量swap文件兜底，尽量不换出，关闭透明大页，平滑脏页回写",
+        "swap": "file",
+        "swap_size": 0.25,
+        "swap_max": 4 * GiB,
+        "thp": "never",
+        "sysctl": {
+            "vm.swappiness": 1,
+            "vm.dirty_ratio": 10,
+            "vm.dirty_background_bytes": 64 * MiB,
+            "vm.zone_reclaim_mode": 0,
+            "vm.max_map_count": 262144,
+            "fs.file-max": 2097152,
+            "fs.aio-max-nr": 1048576,
+            "net.core.somaxconn": 4096,
+            "net.ipv4.tcp_max_syn_backlog": 4096,
+        },
+    },
+    "build": {
+        "description": "编译机：zram压缩swap承接内存峰值，允许更多脏页缓存",
+        "swap": "zram",
+        "swap_size": 0.5,
+        "swap_max": 16 * GiB,
+        "thp": "madvise",
+        "sysctl": {
+            "vm.swappiness": 100,
+            "vm.page-cluster": 0,
+            "vm.dirty_ratio": 40,
+            "vm.dirty_background_bytes": 256 * MiB,
+            "vm.vfs_cache_pressure": 50,
+            "fs.file-max": 2097152,
+            "fs.inotify.max_user_watches": 1048576,
+            "net.core.somaxconn": 4096,
+        },
+    },
+}
+
+def read_text(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def run(cmd, check=True):
+    return subprocess.run(cmd, check=check, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+def meminfo():
+    """/proc/meminfo 的各项，单位为字节"""
+    return {m.group(1): int(m.group(2)) * 1024
+            for m in re.finditer(r"^(\w+):\s+(\d+)", read_text("/proc/meminfo"), re.M)}
+
+def mem_total():
+    return meminfo().get("MemTotal", 0)
+
+def mem_available():
+    """3.14 之前的内核没有 MemAvailable，按 MemFree+Buffers+Cached 估算"""
+    info = meminfo()
+    if "MemAvailable" in info:
+        return info["MemAvailable"]
+    return info.get("MemFree", 0) + info.get("Buffers", 0) + info.get("Cached", 0)
+
+def swap_size(profile):
+    """按MB取整，dd回退创建的文件大小与之一致，重复执行时不会重建"""
+    return min(int(mem_total() * profile["swap_size"]), profile["swap_max"]) // MiB * MiB
+
+def active_swaps():
+    """返回 /proc/swaps 中的设备列表"""
+    return [line.split()[0] for line in read_text("/proc/swaps").splitlines()[1:] if line.strip()]
+
+def has_systemd():
+    return os.path.isdir("/run/systemd/system") and bool(toolreg.get_registry().lookup("systemctl", version_args=None))
+
+# ==================== sysctl 和透明大页 ====================
+
+def render_sysctl(name):
+    lines = [f"# 由 vm_tune.py 生成，配置: {name}"]
+    lines += [f"{key} = {value}" for key, value in PROFILES[name]["sysctl"].items()]
+    return "\n".join(lines) + "\n"
+
+def apply_sysctl(name):
+    write_file(SYSCTL_DROPIN, render_sysctl(name))
+    # 个别参数在旧内核或容器中不存在，逐项报告而不是整体失败
+    result = run(["sysctl", "-p", SYSCTL_DROPIN], check=False)
+    for line in result.stdout.splitlines():
+        if "cannot stat" in line or "permission denied" in line.lower():
+            print(f"{COLOR_YELLOW}[跳过] {line.strip()}{COLOR_RESET}")
+    print(f"已写入 {SYSCTL_DROPIN}")
+
+def thp_mode():
+    match = re.search(r"\[(\w+)\]", read_text(f"{THP_DIR}/enabled"))
+    return match.group(1) if match else None
+
+def apply_thp(mode):
+    if not os.path.isdir(THP_DIR):
+        print(f"{COLOR_YELLOW}[跳过] 内核不支持透明大页{COLOR_RESET}")
+        return
+    # defrag 为 madvise 时只有申请大页的程序会同步整理内存，避免全局卡顿
+    defrag = "madvise" if mode != "never" else "never"
+    write_file(THP_TMPFILES, f"w {THP_DIR}/enabled - - - - {mode}\nw {THP_DIR}/defrag - - - - {defrag}\n")
+    for name, value in (("enabled", mode), ("defrag", defrag)):
+        try:
+            with open(f"{THP_DIR}/{name}", "w") as f:
+                f.write(value)
+        except OSError as e:
+            print(f"{COLOR_YELLOW}[跳过] 无法设置 {THP_DIR}/{name}: {e}{COLOR_RESET}")
+    print(f"透明大页: {mode}，开机由 {THP_TMPFILES} 设置")
+
+# ==================== swap ====================
+
+def comment_fstab_swap():
+    """注释 /etc/fstab 中生效的swap行（与原 set_swap 行为一致）"""
+    content = read_text("/etc/fstab")
+    updated = re.sub(r"^([^#\n]*\sswap\s)", r"#\1", content, flags=re.M)
+    if updated != content:
+        shutil.copy2("/etc/fstab", "/etc/fstab.bak")
+        write_file("/etc/fstab", updated)
+
+def disable_zram():
+    if os.path.exists(ZRAM_UNIT):
+        run(["systemctl", "disable", "--now", os.path.basename(ZRAM_UNIT)], check=False)
+        os.remove(ZRAM_UNIT)
+        run(["systemctl", "daemon-reload"], check=False)
+    if "/dev/zram0" in active_swaps():
+        run(["swapoff", "/dev/zram0"], check=False)
+
+def swap_off():
+    comment_fstab_swap()
+    disable_zram()
+    run(["swapoff", "-a"], check=False)
+    print("swap 已禁用")
+
+def swap_file(size):
+    disable_zram()
+    current = os.path.getsize(SWAPFILE) if os.path.exists(SWAPFILE) else 0
+    if current != size:
+        if SWAPFILE in active_swaps():
+            run(["swapoff", SWAPFILE])
+        if os.path.exists(SWAPFILE):
+            os.remove(SWAPFILE)
+        # fallocate 在部分文件系统上生成的文件不能用作swap，失败时回退到dd
+        if run(["fallocate", "-l", str(size), SWAPFILE], check=False).returncode != 0:
+            run(["dd", "if=/dev/zero", f"of={SWAPFILE}", "bs=1M", f"count={size // MiB}"])
+        os.chmod(SWAPFILE, 0o600)
+        run(["mkswap", SWAPFILE])
+    if SWAPFILE not in active_swaps():
+        run(["swapon", SWAPFILE])
+    fstab = read_text("/etc/fstab")
+    if not re.search(rf"^{re.escape(SWAPFILE)}\s", fstab, re.M):
+        with open("/etc/fstab", "a") as f:
+            f.write(f"{SWAPFILE} none swap sw 0 0\n")
+    print(f"swap 文件: {SWAPFILE} ({size // MiB}MB)")
+
+def zram_algorithm():
+    """优先zstd（压缩率高），其次lz4（速度快）"""
+    available = read_text("/sys/block/zram0/comp_algorithm").replace("[", "").replace("]", "").split()
+    for algorithm in ("zstd", "lz4"):
+        if algorithm in available:
+            return algorithm
+    return None
+
+def zram_script(size, algorithm):
+    """开机时创建zram设备的命令，压缩算法必须在设置 disksize 之前指定"""
+    steps = ["modprobe zram num_devices=1"]
+    if algorithm:
+        steps.append(f"echo {algorithm} > /sys/block/zram0/comp_algorithm")
+    steps += [f"echo {size} > /sys/block/zram0/disksize", "mkswap /dev/zram0", "swapon -p 100 /dev/zram0"]
+    return " && ".join(steps)
+
+def swap_zram(size):
+    # 原有的磁盘swap会与zram竞争，一并关闭
+    comment_fstab_swap()
+    for device in active_swaps():
+        run(["swapoff", device], check=False)
+    if "/dev/zram0" in active_swaps():
+        run(["swapoff", "/dev/zram0"], check=False)
+    if os.path.exists("/sys/block/zram0"):
+        run(["sh", "-c", "echo 1 > /sys/block/zram0/reset"], check=False)
+    run(["modprobe", "zram", "num_devices=1"], check=False)
+    algorithm = zram_algorithm()
+    script = zram_script(size, algorithm)
+
+    if has_systemd():
+        write_file(ZRAM_UNIT, f"""[Unit]
+Description=zram swap (init_scripts vm_tune)
+After=local-fs.target
+
+[Service]
+Type=oneshot
+RemainAfterExit=yes
+ExecStart=/bin/sh -c '{script}'
+ExecStop=/bin/sh -c 'swapoff /dev/zram0; echo 1 > /sys/block/zram0/reset'
+
+[Install]
+WantedBy=multi-user.target
+""")
+        run(["systemctl", "daemon-reload"])
+        # oneshot服务再次应用时仍处于active状态，enable --now 不会重新执行，上面已经拆除了zram0，必须restart
+        run(["systemctl", "enable", os.path.basename(ZRAM_UNIT)])
+        run(["systemctl", "restart", os.path.basename(ZRAM_UNIT)])
+    else:
+        print(f"{COLOR_YELLOW}[提示] 没有systemd，zram只在本次开机有效{COLOR_RESET}")
+        run(["sh", "-c", script])
+    print(f"zram swap: /dev/zram0 ({size // MiB}MB, {algorithm or '默认算法'})")
+
+def apply_profile(name, size=None):
+    profile = PROFILES[name]
+    print(f"{COLOR_CYAN}应用调优配置 {name}: {profile['description']}{COLOR_RESET}")
+    if profile["swap"] == "off":
+        swap_off()
+    elif profile["swap"] == "file":
+        swap_file(size or swap_size(profile))
+    else:
+        swap_zram(size or swap_size(profile))
+    apply_sysctl(name)
+    apply_thp(profile["thp"])
+
+def is_applied(name):
+    """sysctl drop-in、swap和透明大页都与配置一致时返回True"""
+    profile = PROFILES[name]
+    if read_text(SYSCTL_DROPIN) != render_sysctl(name):
+        return False
+    if os.path.isdir(THP_DIR) and thp_mode() != profile["thp"]:
+        return False
+    swaps = active_swaps()
+    return {
+        "off": not swaps,
+        "file": SWAPFILE in swaps,
+        "zram": "/dev/zram0" in swaps,
+    }[profile["swap"]]
+
+# ==================== 基准测试 ====================
+
+def read_vmstat():
+    stats = {}
+    for line in read_text("/proc/vmstat").splitlines():
+        key, _, value = line.partition(" ")
+        if key in ("pswpin", "pswpout", "pgmajfault", "allocstall_normal", "allocstall_movable"):
+            stats[key] = int(value)
+    return stats
+
+# 在子进程中分配并逐页写入内存，oom_score_adj=1000 保证OOM时优先结束测试进程
+PRESSURE_CHILD = """
+import sys, time
+try:
+    with open("/proc/self/oom_score_adj", "w") as f:
+        f.write("1000")
+except OSError:
+    pass
+size, chunk = int(sys.argv[1]), 64 * 1024 * 1024
+blocks = []
+start = time.perf_counter()
+while size > 0:
+    block = bytearray(min(chunk, size))
+    for i in range(0, len(block), 4096):
+        block[i] = 1
+    blocks.append(block)
+    size -= len(block)
+# 再读一遍，被换出的页需要换入
+touch = time.perf_counter()
+total = 0
+for block in blocks:
+    for i in range(0, len(block), 4096):
+        total += block[i]
+print(touch - start, time.perf_counter() - touch)
+"""
+
+def bench_memory(pressure):
+    """分配 MemAvailable*pressure 的内存，测量分配和回读速度以及换页次数"""
+    size = int(mem_available() * pressure)
+    before = read_vmstat()
+    result = subprocess.run([sys.executable, "-c", PRESSURE_CHILD, str(size)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    after = read_vmstat()
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+    if result.returncode != 0:
+        return {"size_mb": size // MiB, "oom": True, **delta}
+    alloc, reread = (float(x) for x in result.stdout.split())
+    return {
+        "size_mb": size // MiB,
+        "oom": False,
+        "alloc_mb_s": size / MiB / max(alloc, 1e-6),
+        "reread_mb_s": size / MiB / max(reread, 1e-6),
+        **delta,
+    }
+
+def bench_fsync(directory, seconds):
+    """4KB写+fsync的次数/秒，以及64MB缓冲写入再fsync的吞吐"""
+    fd, path = tempfile.mkstemp(prefix="vm-bench-", dir=directory)
+    try:
+        block = os.urandom(4096)
+        count = 0
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        while time.perf_counter() < deadline:
+            os.write(fd, block)
+            os.fsync(fd)
+            count += 1
+        fsync_ops = count / (time.perf_counter() - start)
+
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        chunk = os.urandom(MiB)
+        start = time.perf_counter()
+        for _ in range(64):
+            os.write(fd, chunk)
+        buffered = time.perf_counter() - start
+        os.fsync(fd)
+        total = time.perf_counter() - start
+        return {"fsync_ops": fsync_ops, "buffered_mb_s": 64 / max(buffered, 1e-6), "flushed_mb_s": 64 / max(total, 1e-6)}
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+def run_bench(directory, seconds, pressure):
+    print(f"基准测试: fsync ({directory}, {seconds}s)，内存压力 (MemAvailable x {pressure})")
+    result = {"time": int(time.time()), "swap": active_swaps(), "thp": thp_mode()}
+    result.update(bench_fsync(directory, seconds))
+    result.update(bench_memory(pressure))
+    return result
+
+BENCH_FIELDS = [
+    ("fsync_ops", "fsync 次数/秒", True),
+    ("buffered_mb_s", "缓冲写入 MB/s", True),
+    ("flushed_mb_s", "写入+fsync MB/s", True),
+    ("alloc_mb_s", "内存分配 MB/s", True),
+    ("reread_mb_s", "内存回读 MB/s", True),
+    ("pswpout", "换出页数", False),
+    ("pswpin", "换入页数", False),
+    ("pgmajfault", "主缺页数", False),
+]
+
+def format_cell(result, key):
+    if result.get("oom") and key in ("alloc_mb_s", "reread_mb_s"):
+        return "OOM"
+    value = result.get(key)
+    return "-" if value is None else f"{value:.1f}"
+
+def print_bench(results):
+    """results 为 [(标签, 结果)]，多于一组时显示相对第一组的变化"""
+    print(f"\n{COLOR_CYAN}=== 基准测试结果 ==={COLOR_RESET}")
+    print(f"  {'指标':<18}" + "".join(f"{label:>14}" for label, _ in results) + ("      变化" if len(results) > 1 else ""))
+    for key, title, higher_better in BENCH_FIELDS:
+        values = [r.get(key) for _, r in results]
+        cells = "".join(f"{format_cell(r, key):>14}" for _, r in results)
+        change = ""
+        if len(values) > 1 and values[0] and values[-1] is not None:
+            ratio = (values[-1] - values[0]) / values[0] * 100
+            better = ratio > 0 if higher_better else ratio < 0
+            change = f"{COLOR_GREEN if better else COLOR_RED}{ratio:>+9.1f}%{COLOR_RESET}"
+        print(f"  {title:<18}{cells}{change}")
+
+def save_bench(label, result):
+    path = toolreg.state_path(BENCH_NAME)
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    saved[label] = result
+    write_file(path, json.dumps(saved, indent=2, ensure_ascii=False))
+
+def print_status():
+    print(f"swap: {', '.join(active_swaps()) or '无'}")
+    print(f"透明大页: {thp_mode() or '不支持'}")
+    for key in ("vm.swappiness", "vm.dirty_ratio", "vm.dirty_background_bytes", "fs.file-max", "net.core.somaxconn"):
+        value = read_text(f"/proc/sys/{key.replace('.', '/')}").strip()
+        print(f"{key} = {value or '-'}")
+    applied = [name for name in PROFILES if is_applied(name)]
+    print(f"当前配置: {', '.join(applied) or '未应用'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="内存和VM调优（swap/zram、sysctl、透明大页）及效果测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="列出调优配置")
+    subparsers.add_parser("status", help="显示当前设置")
+
+    def add_bench_options(p):
+        p.add_argument("--dir", default="/var/tmp", help="fsync测试目录 (默认: /var/tmp)")
+        p.add_argument("--seconds", type=float, default=2.0, help="fsync测试时长 (默认: 2)")
+        p.add_argument("--pressure", type=float, default=0.9, help="内存压力测试分配 MemAvailable 的倍数 (默认: 0.9)")
+
+    apply_parser = subparsers.add_parser("apply", help="应用调优配置")
+    apply_parser.add_argument("--profile", "-p", choices=sorted(PROFILES), required=True)
+    apply_parser.add_argument("--swap-size", type=int, help="swap大小，MB（默认按内存比例计算）")
+    apply_parser.add_argument("--bench", action="store_true", help="应用前后各运行一次基准测试并对比")
+    add_bench_options(apply_parser)
+
+    bench_parser = subparsers.add_parser("bench", help="只运行基准测试")
+    bench_parser.add_argument("--save", metavar="LABEL", help="保存结果，便于与之后的测试对比")
+    bench_parser.add_argument("--compare", metavar="LABEL", help="与之前保存的结果对比")
+    add_bench_options(bench_parser)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, profile in PROFILES.items():
+            print(f"  {name:<10} {profile['description']}")
+        return
+    if args.command == "status":
+        print_status()
+        return
+    if args.command == "bench":
+        result = run_bench(args.dir, args.seconds, args.pressure)
+        results = [("本次", result)]
+        if args.compare:
+            try:
+                with open(toolreg.state_path(BENCH_NAME), "r") as f:
+                    results.insert(0, (args.compare, json.load(f)[args.compare]))
+            except (OSError, ValueError, KeyError):
+                print(f"{COLOR_RED}[!] 没有保存的测试结果: {args.compare}{COLOR_RESET}")
+                sys.exit(1)
+        if args.save:
+            save_bench(args.save, result)
+        print_bench(results)
+        return
+
+    if os.geteuid() != 0:
+        print(f"{COLOR_RED}[!] 请使用root用户运行{COLOR_RESET}")
+        sys.exit(1)
+    before = run_bench(args.dir, args.seconds, args.pressure) if args.bench else None
+    apply_profile(args.profile, args.swap_size * MiB if args.swap_size else None)
+    if before:
+        after = run_bench(args.dir, args.seconds, args.pressure)
+        save_bench(f"{args.profile}-before", before)
+        save_bench(f"{args.profile}-after", after)
+        print_bench([("应用前", before), ("应用后", after)])
+
+if __name__ == "__main__":
+    main()